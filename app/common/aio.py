@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """在独立线程中运行的事件循环
+
+    异步 HTTP 客户端（连接池）只能绑定在一个事件循环上。所有网络请求都提交到
+    这个循环执行，机器人的事件循环通过 submit() 等待结果，调度器等同步代码
+    通过 run_sync() 阻塞等待结果，从而共享同一个连接池。
+    """
+
+    def __init__(self, name="background-loop"):
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """获取（必要时启动）后台事件循环"""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+
+                    def _run():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(ready.set)
+                        loop.run_forever()
+
+                    self._thread = threading.Thread(target=_run, name=self.name, daemon=True)
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+                    logger.info(f"后台事件循环已启动: {self.name}")
+        return self._loop
+
+    def in_loop_thread(self):
+        """当前是否运行在后台循环线程中"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def run_sync(self, coro, timeout=None):
+        """在后台循环中执行协程并阻塞等待结果（供同步代码调用）"""
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("不能在后台事件循环线程中同步等待协程，请改用 await")
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return future.result(timeout)
+
+    async def submit(self, coro):
+        """在后台循环中执行协程，并在当前事件循环中等待结果"""
+        if self.in_loop_thread():
+            return await coro
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return await asyncio.wrap_future(future)
+
+    def stop(self):
+        """停止后台事件循环"""
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+# 全局共享的后台 I/O 事件循环
+background_loop = BackgroundLoop("io-loop")
@@ -0,0 +1,68 @@
+"""
+增量 JSON 字段解析器
+逐段输入模型流式输出的 JSON 文本，顶层对象中的字符串字段一结束就返回，无需等待整个 JSON 完成
+"""
+
+import json
+
+
+class JsonFieldStream:
+    """从流式 JSON 文本中提取已完成的顶层字符串字段
+
+    - feed(chunk): 输入新的文本片段，返回本次新完成的 {字段名: 值}
+    - fields: 目前已完成的全部顶层字符串字段
+    只跟踪顶层对象中值为字符串的字段，数组、嵌套对象等其他值会被跳过；
+    文本不是合法 JSON（如带有代码块标记）时只是不会返回字段，不会抛出异常。
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._token = []
+        self._key = None
+        # 下一个顶层字符串是键还是值
+        self._expect_key = True
+
+    def feed(self, chunk):
+        completed = {}
+        for char in chunk:
+            if self._in_string:
+                self._token.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._finish_string(completed)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._token = [char]
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+            elif self._depth == 1:
+                if char == ":":
+                    self._expect_key = False
+                elif char == ",":
+                    self._expect_key = True
+                    self._key = None
+        return completed
+
+    def _finish_string(self, completed):
+        try:
+            value = json.loads("".join(self._token))
+        except ValueError:
+            return
+        if self._expect_key:
+            self._key = value
+        elif self._key is not None:
+            self.fields[self._key] = value
+            completed[self._key] = value
+            self._key = None
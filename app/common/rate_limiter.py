@@ -0,0 +1,136 @@
+"""
+带优先级的令牌桶限流器
+按固定速率发放令牌，等待中的请求按优先级（数值越小越优先）、同优先级按先来后到获得令牌；
+收到服务端限流响应时可整体暂停发放令牌
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+
+# 优先级：交互式操作 > 普通调用 > 后台任务
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "交互",
+    PRIORITY_NORMAL: "普通",
+    PRIORITY_BACKGROUND: "后台"
+}
+
+
+class PriorityRateLimiter:
+    """异步令牌桶
+
+    - rate: 每秒发放的令牌数
+    - burst: 桶容量，空闲后允许的突发请求数
+    所有 acquire() 必须在同一个事件循环中调用。
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer = None
+
+        # 统计信息
+        self.granted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_time = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.max_wait = 0.0
+        self.throttled = 0
+
+    async def acquire(self, priority=PRIORITY_NORMAL):
+        """等待一个令牌"""
+        start = time.monotonic()
+        if not self._waiters and self._take_token(start):
+            self._record(priority, 0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._schedule(start)
+        await future
+        self._record(priority, time.monotonic() - start)
+
+    def pause(self, seconds):
+        """服务端要求等待（如 HTTP 429 的 Retry-After）时，在 seconds 秒内暂停发放令牌"""
+        now = time.monotonic()
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = 0.0
+        self._updated = now
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._schedule(now)
+
+    def _refill(self, now):
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def _take_token(self, now):
+        if now < self._paused_until:
+            return False
+        self._refill(now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def _schedule(self, now):
+        """在下一个令牌可用时唤醒等待者"""
+        if self._timer is not None or not self._waiters:
+            return
+        self._refill(now)
+        delay = max(self._paused_until - now, (1 - self._tokens) / self.rate, 0.0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def _dispatch(self):
+        self._timer = None
+        now = time.monotonic()
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # 等待者已被取消
+                heapq.heappop(self._waiters)
+                continue
+            if not self._take_token(now):
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+        self._schedule(now)
+
+    def _record(self, priority, waited):
+        self.granted[priority] = self.granted.get(priority, 0) + 1
+        self.wait_time[priority] = self.wait_time.get(priority, 0.0) + waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def queue_depth(self):
+        """{优先级: 等待中的请求数}"""
+        depth = {priority: 0 for priority in PRIORITY_NAMES}
+        for priority, _, future in list(self._waiters):
+            if not future.done():
+                depth[priority] = depth.get(priority, 0) + 1
+        return depth
+
+    def stats(self):
+        """返回限流统计信息"""
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "queue_depth": self.queue_depth(),
+            "granted": dict(self.granted),
+            "avg_wait": {
+                priority: (self.wait_time[priority] / count) if count else 0.0
+                for priority, count in self.granted.items()
+            },
+            "max_wait": self.max_wait,
+            "throttled": self.throttled
+        }
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(*parts):
+    """根据多个组成部分生成稳定的缓存键 (sha256)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SQLiteCache:
+    """基于本地 SQLite 文件的持久化键值缓存
+
+    - 过期淘汰：每条记录写入时记录过期时间，读取时忽略已过期的记录
+    - 容量淘汰：条目数超过 max_entries 时按最近访问时间淘汰（LRU）
+    - 统计：记录命中/未命中次数
+    值以 JSON 形式保存，可在多个线程中使用。
+    """
+
+    def __init__(self, path, table, ttl, max_entries):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_last_access ON {table} (last_access)")
+
+    def get(self, key):
+        """读取缓存，未命中或已过期返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，并按需淘汰过期和最久未访问的记录"""
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, payload, now, expires_at, now)
+            )
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _evict(self, now):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY last_access LIMIT ?)",
+                (overflow,)
+            )
+            logger.info(f"缓存 {self.table} 已淘汰 {overflow} 条最久未访问的记录")
+
+    def stats(self):
+        """返回缓存统计信息"""
+        with self._lock:
+            size = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0
+        }
+
+    def close(self):
+        self._conn.close()
@@ -52,12 +52,88 @@ SCRAPER_TECH_ENDPOINT = os.getenv('SCRAPER_TECH_ENDPOINT', 'https://api.scraper.
 # 注意：密钥必须放在 .env 中进行统一管理，不再在代码中提供默认值
 SCRAPER_TECH_KEY = os.getenv('SCRAPER_TECH_KEY', '')
 
+# 推文数据源对冲请求：当前数据源超过该延迟仍未返回时同时请求下一个数据源
+TWITTER_HEDGE_DELAY = float(os.getenv('TWITTER_HEDGE_DELAY', '3'))  # 样本不足时的对冲延迟（秒）
+TWITTER_HEDGE_PERCENTILE = float(os.getenv('TWITTER_HEDGE_PERCENTILE', '0.9'))  # 对冲延迟取数据源最近成功延迟的该分位数
+# 推文数据源健康状态：连续失败达到阈值后暂停使用，冷却时间每次加倍
+TWITTER_PROVIDER_FAILURE_THRESHOLD = int(os.getenv('TWITTER_PROVIDER_FAILURE_THRESHOLD', '3'))
+TWITTER_PROVIDER_COOLDOWN = float(os.getenv('TWITTER_PROVIDER_COOLDOWN', '60'))  # 初始冷却时间（秒）
+# 官方 API v2 批量查询：等待窗口内并发请求的推文ID合并为一次 get_tweets 请求
+TWITTER_BATCH_LINGER = float(os.getenv('TWITTER_BATCH_LINGER', '0.3'))  # 合并窗口（秒）
+TWITTER_BATCH_MAX_SIZE = int(os.getenv('TWITTER_BATCH_MAX_SIZE', '100'))  # 每批最多推文数（API 上限100）
+# 推文串展开（需官方 API）：补充作者在同一会话中的后续推文、回复和引用的推文，合并为一篇内容分析
+TWEET_THREAD_EXPANSION_ENABLED = os.getenv('TWEET_THREAD_EXPANSION_ENABLED', 'false').lower() == 'true'
+TWEET_THREAD_MAX_DEPTH = int(os.getenv('TWEET_THREAD_MAX_DEPTH', '3'))  # 沿回复/引用关系最多展开的层数
+TWEET_THREAD_MAX_TWEETS = int(os.getenv('TWEET_THREAD_MAX_TWEETS', '20'))  # 合并的推文数上限（含原推文）
+TWEET_THREAD_MAX_CHARS = int(os.getenv('TWEET_THREAD_MAX_CHARS', '8000'))  # 合并后的内容长度上限（字符）
+
 # DeepSeek API 配置常量
 DEEPSEEK_API_TIMEOUT = int(os.getenv('DEEPSEEK_API_TIMEOUT', '60'))  # API请求超时时间，默认60秒
 DEEPSEEK_API_MAX_RETRIES = int(os.getenv('DEEPSEEK_API_MAX_RETRIES', '3'))  # API请求最大重试次数，默认3次
 DEEPSEEK_API_RETRY_DELAY = int(os.getenv('DEEPSEEK_API_RETRY_DELAY', '5'))  # API请求重试初始延迟时间，默认5秒
+DEEPSEEK_TIMEOUT_MIN = float(os.getenv('DEEPSEEK_TIMEOUT_MIN', '15'))  # 自适应超时的下限（秒），上限为 DEEPSEEK_API_TIMEOUT
+DEEPSEEK_TIMEOUT_MULTIPLIER = float(os.getenv('DEEPSEEK_TIMEOUT_MULTIPLIER', '2'))  # 自适应超时 = 同档提示词最近请求延迟的 p95 × 该倍数
+DEEPSEEK_BREAKER_THRESHOLD = int(os.getenv('DEEPSEEK_BREAKER_THRESHOLD', '5'))  # 连续失败多少次后熔断
+DEEPSEEK_BREAKER_COOLDOWN = float(os.getenv('DEEPSEEK_BREAKER_COOLDOWN', '30'))  # 熔断后多少秒发送探测请求
+DEEPSEEK_STREAM_ENABLED = os.getenv('DEEPSEEK_STREAM_ENABLED', 'true').lower() == 'true'  # 流式接收分析结果，标题和摘要生成后即更新状态消息
 RAPIDAPI_KEY = os.getenv('RAPIDAPI_KEY', '')
 
+# DeepSeek 分析结果缓存配置
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'  # 是否启用分析结果缓存
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'data/llm_cache.db')  # 缓存数据库文件路径
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))  # 缓存有效期（秒），默认7天
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))  # 最大缓存条目数，超出后淘汰最久未访问的记录
+
+# 推文数据和短链接展开结果缓存配置（按推文ID / 短链接缓存，重复发送的推文不再请求数据源）
+TWEET_CACHE_ENABLED = os.getenv('TWEET_CACHE_ENABLED', 'true').lower() == 'true'  # 是否启用推文和短链接缓存
+TWEET_CACHE_PATH = os.getenv('TWEET_CACHE_PATH', 'data/tweet_cache.db')  # 缓存数据库文件路径
+TWEET_CACHE_TTL = int(os.getenv('TWEET_CACHE_TTL', str(24 * 3600)))  # 推文数据有效期（秒），默认1天
+TWEET_CACHE_MAX_ENTRIES = int(os.getenv('TWEET_CACHE_MAX_ENTRIES', '5000'))  # 最多缓存的推文数
+SHORT_LINK_CACHE_TTL = int(os.getenv('SHORT_LINK_CACHE_TTL', str(30 * 24 * 3600)))  # 短链接展开结果有效期（秒），默认30天
+SHORT_LINK_CACHE_MAX_ENTRIES = int(os.getenv('SHORT_LINK_CACHE_MAX_ENTRIES', '20000'))  # 最多缓存的短链接数
+
+# Notion API 连接配置
+NOTION_API_TIMEOUT = float(os.getenv('NOTION_API_TIMEOUT', '30'))  # 单次请求超时时间，默认30秒
+NOTION_HTTP2 = os.getenv('NOTION_HTTP2', 'false').lower() == 'true'  # 是否启用HTTP/2（需安装 httpx[http2]）
+NOTION_MAX_CONNECTIONS = int(os.getenv('NOTION_MAX_CONNECTIONS', '10'))  # 连接池最大连接数
+NOTION_ENTRY_CACHE_SIZE = int(os.getenv('NOTION_ENTRY_CACHE_SIZE', '500'))  # 单个条目缓存的最大条目数
+NOTION_ENTRY_CACHE_TTL = int(os.getenv('NOTION_ENTRY_CACHE_TTL', '300'))  # 单个条目缓存有效期（秒），默认5分钟
+NOTION_QUERY_PAGE_SIZE = int(os.getenv('NOTION_QUERY_PAGE_SIZE', '100'))  # 分页查询每页条目数，最大100
+NOTION_RATE_LIMIT = float(os.getenv('NOTION_RATE_LIMIT', '3'))  # 每秒最多发出的请求数，Notion 限制约为3次/秒
+NOTION_RATE_BURST = int(os.getenv('NOTION_RATE_BURST', '3'))  # 空闲后允许的突发请求数
+NOTION_RATE_LIMIT_MAX_RETRIES = int(os.getenv('NOTION_RATE_LIMIT_MAX_RETRIES', '3'))  # 收到 429 后的最大重试次数
+NOTION_BULK_CONCURRENCY = int(os.getenv('NOTION_BULK_CONCURRENCY', '5'))  # 批量更新时同时进行的请求数（速率仍受限流控制）
+NOTION_BULK_MAX_ATTEMPTS = int(os.getenv('NOTION_BULK_MAX_ATTEMPTS', '3'))  # 批量更新中单个页面的最大尝试次数
+NOTION_WRITE_BEHIND_ENABLED = os.getenv('NOTION_WRITE_BEHIND_ENABLED', 'false').lower() == 'true'  # 是否启用属性修改写入缓冲，启用后修改立即返回、合并后写入
+NOTION_WRITE_BEHIND_DELAY = float(os.getenv('NOTION_WRITE_BEHIND_DELAY', '3'))  # 写入缓冲合并窗口（秒）
+
+# 链接处理并发配置
+LINK_PROCESSOR_WORKERS = int(os.getenv('LINK_PROCESSOR_WORKERS', '4'))  # 链接处理线程池大小，默认4个
+LINK_CONCURRENCY = int(os.getenv('LINK_CONCURRENCY', '3'))  # 同时处理的链接数，作为 INGEST_WORKERS 的默认值，默认3个
+TWO_PHASE_SAVE = os.getenv('TWO_PHASE_SAVE', 'false').lower() == 'true'  # 抓取后立即创建页面，DeepSeek 分析结果稍后补充
+
+# 持久化处理队列配置
+INGEST_QUEUE_PATH = os.getenv('INGEST_QUEUE_PATH', 'data/ingest_queue.db')  # 队列数据库文件路径
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(LINK_CONCURRENCY)))  # 后台 worker 数量，默认与 LINK_CONCURRENCY 相同
+INGEST_MAX_ATTEMPTS = int(os.getenv('INGEST_MAX_ATTEMPTS', '5'))  # 单个任务最大执行次数，超过后移入死信表
+INGEST_RETRY_BASE_DELAY = int(os.getenv('INGEST_RETRY_BASE_DELAY', '10'))  # 重试初始延迟秒数，每次重试加倍
+INGEST_RETENTION = int(os.getenv('INGEST_RETENTION', str(7 * 24 * 3600)))  # 已完成/失败任务的保留时间（秒），默认7天；失败任务在死信表中长期保留
+
+# 打卡日志配置
+CHECK_IN_LOG_PATH = os.getenv('CHECK_IN_LOG_PATH', 'data/check_in_log.db')  # 打卡事件日志文件路径，打卡次数以日志为准
+
+# 链接去重配置
+SEEN_URL_SYNC_INTERVAL = int(os.getenv('SEEN_URL_SYNC_INTERVAL', '3600'))  # 已保存链接索引从 Notion 全量同步的间隔（秒），默认1小时
+
+# Notion 本地副本配置
+NOTION_REPLICA_ENABLED = os.getenv('NOTION_REPLICA_ENABLED', 'true').lower() == 'true'  # 是否启用本地副本，启用后读操作从本地读取
+NOTION_REPLICA_PATH = os.getenv('NOTION_REPLICA_PATH', 'data/notion_replica.db')  # 本地副本数据库文件路径
+NOTION_REPLICA_SYNC_INTERVAL = int(os.getenv('NOTION_REPLICA_SYNC_INTERVAL', '60'))  # 增量同步间隔（秒），默认1分钟
+NOTION_REPLICA_FULL_SYNC_INTERVAL = int(os.getenv('NOTION_REPLICA_FULL_SYNC_INTERVAL', '3600'))  # 全量同步间隔（秒），用于清理在其他客户端删除的条目
+
+# 搜索配置
+SEARCH_INDEX_ENABLED = os.getenv('SEARCH_INDEX_ENABLED', 'true').lower() == 'true'  # 是否在内存中建立全文搜索索引，关闭后搜索由 Notion 服务端筛选
+
 # 记录重要配置信息
 logger = logging.getLogger(__name__)
 logger.info("======== 系统配置信息 ========")
@@ -65,6 +141,24 @@ logger.info(f"DeepSeek API 超时设置: {DEEPSEEK_API_TIMEOUT}秒")
 logger.info(f"DeepSeek API 最大重试次数: {DEEPSEEK_API_MAX_RETRIES}次")
 logger.info(f"DeepSeek API 重试初始延迟: {DEEPSEEK_API_RETRY_DELAY}秒")
 logger.info(f"DeepSeek API 重试初始延迟: {DEEPSEEK_API_RETRY_DELAY}秒")
+logger.info(f"DeepSeek 自适应超时: {DEEPSEEK_TIMEOUT_MIN}-{DEEPSEEK_API_TIMEOUT}秒 (p95 × {DEEPSEEK_TIMEOUT_MULTIPLIER})")
+logger.info(f"DeepSeek 熔断: 连续失败 {DEEPSEEK_BREAKER_THRESHOLD} 次, 冷却 {DEEPSEEK_BREAKER_COOLDOWN}秒")
+logger.info(f"DeepSeek 流式输出: {'已启用' if DEEPSEEK_STREAM_ENABLED else '未启用'}")
+logger.info(f"Notion API 超时设置: {NOTION_API_TIMEOUT}秒, HTTP/2: {'启用' if NOTION_HTTP2 else '未启用'}")
+logger.info(f"Notion API 限流: 每秒 {NOTION_RATE_LIMIT} 次, 突发 {NOTION_RATE_BURST} 次, 429 最多重试 {NOTION_RATE_LIMIT_MAX_RETRIES} 次")
+logger.info(f"Notion 写入缓冲: {'已启用' if NOTION_WRITE_BEHIND_ENABLED else '未启用'} (合并窗口 {NOTION_WRITE_BEHIND_DELAY}秒)")
+logger.info(f"Notion 批量更新: 并发 {NOTION_BULK_CONCURRENCY}, 单页最多尝试 {NOTION_BULK_MAX_ATTEMPTS} 次")
+logger.info(
+    f"推文缓存: {'已启用' if TWEET_CACHE_ENABLED else '未启用'} (推文有效期 {TWEET_CACHE_TTL}秒, 最多 {TWEET_CACHE_MAX_ENTRIES} 条; "
+    f"短链接有效期 {SHORT_LINK_CACHE_TTL}秒, 最多 {SHORT_LINK_CACHE_MAX_ENTRIES} 条)"
+)
+logger.info(f"DeepSeek 分析缓存: {'已启用' if LLM_CACHE_ENABLED else '未启用'} (有效期 {LLM_CACHE_TTL}秒, 最多 {LLM_CACHE_MAX_ENTRIES} 条)")
+logger.info(f"链接处理线程池大小: {LINK_PROCESSOR_WORKERS}, 两阶段保存: {'已启用' if TWO_PHASE_SAVE else '未启用'}")
+logger.info(f"处理队列: {INGEST_QUEUE_PATH}, worker 数量 {INGEST_WORKERS}, 最大执行次数 {INGEST_MAX_ATTEMPTS}, 已结束任务保留 {INGEST_RETENTION}秒")
+logger.info(f"打卡日志: {CHECK_IN_LOG_PATH}")
+logger.info(f"已保存链接索引同步间隔: {SEEN_URL_SYNC_INTERVAL}秒")
+logger.info(f"Notion 本地副本: {'已启用' if NOTION_REPLICA_ENABLED else '未启用'} (增量同步间隔 {NOTION_REPLICA_SYNC_INTERVAL}秒, 全量同步间隔 {NOTION_REPLICA_FULL_SYNC_INTERVAL}秒)")
+logger.info(f"搜索方式: {'本地全文索引' if SEARCH_INDEX_ENABLED else 'Notion 服务端筛选'}")
 if SCRAPER_TECH_KEY:
     logger.info("Twitter 数据获取模式: Scraper.tech (通过代理接口)")
     if RAPIDAPI_KEY:
@@ -73,4 +167,11 @@ else:
     logger.info(f"Twitter API 启用状态: {'已启用' if CAN_USE_TWITTER_API else '未启用'}")
     if not CAN_USE_TWITTER_API and USE_TWITTER_API:
         logger.warning("Twitter API 已启用但配置不完整")
+logger.info(f"推文数据源对冲: 初始延迟 {TWITTER_HEDGE_DELAY}秒, 之后取延迟 p{TWITTER_HEDGE_PERCENTILE * 100:.0f}")
+logger.info(f"推文数据源冷却: 连续失败 {TWITTER_PROVIDER_FAILURE_THRESHOLD} 次后暂停 {TWITTER_PROVIDER_COOLDOWN}秒起")
+logger.info(f"推文批量查询: 合并窗口 {TWITTER_BATCH_LINGER}秒, 每批最多 {TWITTER_BATCH_MAX_SIZE} 条")
+logger.info(
+    f"推文串展开: {'已启用' if TWEET_THREAD_EXPANSION_ENABLED else '未启用'} "
+    f"(最多 {TWEET_THREAD_MAX_DEPTH} 层, {TWEET_THREAD_MAX_TWEETS} 条推文, {TWEET_THREAD_MAX_CHARS} 字)"
+)
 logger.info("==============================")
@@ -0,0 +1,175 @@
+"""
+打卡事件日志 - 基于本地 SQLite 文件的只追加日志
+打卡次数以日志为准（同一条目每天记录一次），汇总后异步同步到 Notion 的'打卡次数'属性；
+连续打卡天数、历史记录等统计直接从日志计算，无需读取 Notion
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS check_ins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    page_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (page_id, day)
+);
+CREATE TABLE IF NOT EXISTS check_in_pages (
+    page_id TEXT PRIMARY KEY,
+    baseline INTEGER NOT NULL DEFAULT 0,
+    synced_count INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL
+);
+"""
+
+
+class CheckInLog:
+    """打卡事件日志
+
+    打卡次数 = 基数（第一次在本机打卡时 Notion 中已有的次数）+ 日志中的打卡天数；
+    synced_count 记录最近一次成功写入 Notion 的次数，与打卡次数不一致的条目等待同步。
+    可在多个线程中使用。
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def has_page(self, page_id):
+        """条目是否已有打卡基数"""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM check_in_pages WHERE page_id = ?", (page_id,)).fetchone()
+        return row is not None
+
+    def record(self, page_id, baseline=0, day=None):
+        """追加一次打卡，同一条目同一天只记录一次；返回 (是否新记录, 当前打卡次数)
+
+        baseline 仅在条目第一次打卡时使用，应为 Notion 中已有的打卡次数
+        """
+        day = day or date.today().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO check_in_pages (page_id, baseline, synced_count) VALUES (?, ?, ?)",
+                (page_id, baseline, baseline)
+            )
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO check_ins (page_id, day, created_at) VALUES (?, ?, ?)",
+                (page_id, day, time.time())
+            )
+            count = self._count_locked(page_id)
+            self._conn.execute("COMMIT")
+        return cursor.rowcount > 0, count
+
+    def _count_locked(self, page_id):
+        row = self._conn.execute(
+            "SELECT p.baseline + (SELECT COUNT(*) FROM check_ins c WHERE c.page_id = p.page_id) AS count "
+            "FROM check_in_pages p WHERE p.page_id = ?",
+            (page_id,)
+        ).fetchone()
+        return row["count"] if row else None
+
+    def count(self, page_id):
+        """条目的打卡次数，未在本机打过卡返回 None"""
+        with self._lock:
+            return self._count_locked(page_id)
+
+    def counts(self, page_ids):
+        """{页面ID: 打卡次数}，只包含在本机打过卡的条目"""
+        page_ids = list(page_ids)
+        if not page_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in page_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.page_id, p.baseline + COUNT(c.id) AS count FROM check_in_pages p "
+                "LEFT JOIN check_ins c ON c.page_id = p.page_id "
+                f"WHERE p.page_id IN ({placeholders}) GROUP BY p.page_id",
+                page_ids
+            ).fetchall()
+        return {row["page_id"]: row["count"] for row in rows}
+
+    # ---------------- 同步到 Notion ----------------
+
+    def unsynced(self, page_ids=None):
+        """[(页面ID, 打卡次数)]：打卡次数与最近一次写入 Notion 的次数不一致的条目"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.page_id, p.baseline + COUNT(c.id) AS count, p.synced_count FROM check_in_pages p "
+                "LEFT JOIN check_ins c ON c.page_id = p.page_id GROUP BY p.page_id"
+            ).fetchall()
+        wanted = set(page_ids) if page_ids is not None else None
+        return [
+            (row["page_id"], row["count"]) for row in rows
+            if row["count"] != row["synced_count"] and (wanted is None or row["page_id"] in wanted)
+        ]
+
+    def mark_synced(self, page_id, count):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE check_in_pages SET synced_count = ?, synced_at = ? WHERE page_id = ?",
+                (count, time.time(), page_id)
+            )
+
+    # ---------------- 统计 ----------------
+
+    def history(self, page_id, days=None):
+        """条目的打卡日期（ISO 字符串，降序），days 指定时只返回最近 days 天内的记录"""
+        sql = "SELECT day FROM check_ins WHERE page_id = ?"
+        params = [page_id]
+        if days:
+            sql += " AND day > ?"
+            params.append((date.today() - timedelta(days=days)).isoformat())
+        with self._lock:
+            rows = self._conn.execute(sql + " ORDER BY day DESC", params).fetchall()
+        return [row["day"] for row in rows]
+
+    def stats(self, page_id):
+        """条目的打卡统计 {"count", "streak", "longest_streak", "last_day", "last_30_days"}
+
+        streak 为截至今天的连续打卡天数（今天尚未打卡时截至昨天）
+        """
+        days = [date.fromisoformat(day) for day in self.history(page_id)]
+        today = date.today()
+
+        streak = 0
+        if days and (today - days[0]).days <= 1:
+            streak = 1
+            for newer, older in zip(days, days[1:]):
+                if (newer - older).days != 1:
+                    break
+                streak += 1
+
+        longest = 0
+        run = 0
+        previous = None
+        for day in days:
+            run = run + 1 if previous is not None and (previous - day).days == 1 else 1
+            longest = max(longest, run)
+            previous = day
+
+        return {
+            "count": self.count(page_id) or 0,
+            "streak": streak,
+            "longest_streak": longest,
+            "last_day": days[0].isoformat() if days else None,
+            "last_30_days": sum(1 for day in days if (today - day).days < 30)
+        }
+
+    def close(self):
+        self._conn.close()
@@ -3,17 +3,25 @@ import json
 import requests
 import logging
 import asyncio
-import aiohttp
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
 from app.config import (
     DEEPSEEK_API_KEY, 
     HAS_TWITTER_CONFIG, 
     CAN_USE_TWITTER_API,
     DEEPSEEK_API_TIMEOUT, 
-    DEEPSEEK_API_MAX_RETRIES,
-    DEEPSEEK_API_RETRY_DELAY,
-    RAPIDAPI_KEY
+    DEEPSEEK_STREAM_ENABLED,
+    LINK_PROCESSOR_WORKERS,
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL,
+    LLM_CACHE_MAX_ENTRIES
 )
+from app.common.sqlite_cache import SQLiteCache, make_cache_key
+from app.common.json_stream import JsonFieldStream
+from app.services.llm_client import DeepSeekClient, LLMTimeoutError, LLMConnectionError, CircuitOpenError
+from app.core.url_index import is_short_link, resolve_short_url
 
 # 不再进行网页模拟访问与UA伪装
 
@@ -42,15 +50,53 @@ def get_twitter_instructions():
 
 MAX_CONTENT_LENGTH = 10000  # 大文本最大长度
 
+# 提示词版本：修改分析提示词或结果结构时递增，使旧的缓存结果失效
+PROMPT_VERSION = "1"
+
+def normalize_content(text):
+    """规范化待分析内容（合并空白字符），用于生成缓存键"""
+    return re.sub(r'\s+', ' ', text or '').strip()
+
+def _stream_parser(on_partial):
+    """DeepSeek 流式输出的回调：边接收边解析已完成的字段并调用 on_partial"""
+    state = {}
+
+    def on_delta(text):
+        if text is None:
+            # 新的一次请求，重新解析
+            state["parser"] = JsonFieldStream()
+            return
+        completed = state["parser"].feed(text)
+        if completed:
+            on_partial(completed)
+
+    return on_delta
+
+
 class ContentProcessor:
     def __init__(self):
         self.api_key = DEEPSEEK_API_KEY
-        self.api_endpoint = "https://api.deepseek.com/v1/chat/completions"
+        self.model = "deepseek-chat"
+        # DeepSeek 异步客户端：连接池、退避重试、熔断和自适应超时
+        self.llm_client = DeepSeekClient(self.api_key, model=self.model)
+        
+        # DeepSeek 分析结果缓存（按内容哈希、提示词版本和模型区分）
+        self.llm_cache = SQLiteCache(
+            LLM_CACHE_PATH,
+            "llm_results",
+            ttl=LLM_CACHE_TTL,
+            max_entries=LLM_CACHE_MAX_ENTRIES
+        ) if LLM_CACHE_ENABLED else None
         
         # API调用配置
-        self.api_timeout = DEEPSEEK_API_TIMEOUT  # 秒
-        self.max_retries = DEEPSEEK_API_MAX_RETRIES
-        self.retry_delay = DEEPSEEK_API_RETRY_DELAY  # 初始延迟秒数
+        self.api_timeout = DEEPSEEK_API_TIMEOUT  # 单次请求的最长超时（秒）
+        
+        # 链接处理线程池：抓取内部使用阻塞的 requests 和 time.sleep，
+        # 由 fetch_link_content_async 等方法放到有界线程池中执行，避免阻塞机器人的事件循环
+        self._executor = ThreadPoolExecutor(
+            max_workers=LINK_PROCESSOR_WORKERS,
+            thread_name_prefix="link-processor"
+        )
         
     def _get_twitter_content_via_api(self, url):
         """使用Twitter API直接获取推文内容（如果配置了API）"""
@@ -78,7 +124,7 @@ class ContentProcessor:
             return None
     
     def _fetch_webpage_content(self, url, max_length=MAX_CONTENT_LENGTH):
-        """仅通过官方 Twitter API 或 RapidAPI 获取推文数据；不再抓取网页。"""
+        """仅通过 Twitter API 模块获取推文数据；不再抓取网页。"""
         try:
             is_twitter = "twitter.com" in url or "x.com" in url
             if not is_twitter:
@@ -90,83 +136,12 @@ class ContentProcessor:
                     "source": url.split("//")[-1].split("/")[0] if "//" in url else url
                 }
 
-            # 1) 尝试使用 Twitter API 模块 (含 Scraper.tech 备用)
+            # Twitter API 模块在官方 API、Scraper.tech 和 RapidAPI 之间对冲请求
             if HAS_TWEEPY:
                 api_result = self._get_twitter_content_via_api(url)
                 if api_result:
                     return api_result
 
-            # 2) RapidAPI 兜底（需 RAPIDAPI_KEY 且能提取ID）
-            twitter_id = None
-            username = None
-            if "/status/" in url:
-                parts = url.split('/')
-                try:
-                    status_index = parts.index("status")
-                except ValueError:
-                    status_index = -1
-                if status_index > 0 and status_index + 1 < len(parts):
-                    username = parts[status_index - 1]
-                    twitter_id = parts[status_index + 1].split("?")[0]
-
-            if RAPIDAPI_KEY and twitter_id and twitter_id.isalnum():
-                rapidapi_url = "https://twitter-api45.p.rapidapi.com/tweet.php"
-                rapidapi_headers = {
-                    "x-rapidapi-key": RAPIDAPI_KEY,
-                    "x-rapidapi-host": "twitter-api45.p.rapidapi.com"
-                }
-                rapidapi_querystring = {"id": twitter_id}
-                resp = requests.get(rapidapi_url, headers=rapidapi_headers, params=rapidapi_querystring, timeout=20)
-                if resp.status_code == 200:
-                    try:
-                        data = resp.json()
-                        tweet_text = data.get('display_text', '') or data.get('text', '') or ""
-                        user_info = data.get('author', {}) if isinstance(data.get('author', {}), dict) else {}
-                        if not user_info and isinstance(data.get('user', {}), dict):
-                            user_info = data.get('user', {})
-                        user_name = user_info.get('screen_name', '') or ""
-                        user_display_name = user_info.get('name', '') or ""
-
-                        hashtags = []
-                        entities = data.get('entities', {}) if isinstance(data.get('entities', {}), dict) else {}
-                        if 'hashtags' in entities and entities['hashtags']:
-                            for tag in entities['hashtags']:
-                                if isinstance(tag, dict) and 'text' in tag:
-                                    hashtags.append(tag['text'])
-
-                        # 计算完整推文链接（用于缺失或替代）
-                        full_url = url
-                        try:
-                            if user_name and twitter_id:
-                                full_url = f"https://twitter.com/{user_name}/status/{twitter_id}"
-                            elif twitter_id:
-                                full_url = f"https://twitter.com/i/web/status/{twitter_id}"
-                        except Exception:
-                            pass
-
-                        title = (
-                            f"{user_display_name} (@{user_name}): {tweet_text[:30] + ('...' if len(tweet_text) > 30 else '')}"
-                            if user_display_name and user_name else (tweet_text[:30] + ('...' if len(tweet_text) > 30 else '')) or "Twitter推文"
-                        )
-
-                        return {
-                            "title": title,
-                            "content": tweet_text,
-                            "url": full_url or url,
-                            "source": f"Twitter (@{user_name})" if user_name else "Twitter",
-                            "extracted_tags": hashtags or [],
-                            "tweet_meta": {
-                                "platform": "Twitter" if "twitter.com" in url else "X",
-                                "author": user_display_name or "",
-                                "username": user_name or "",
-                                "date": data.get('created_at', '') or "",
-                                "tags": hashtags or [],
-                                "via": "RapidAPI"
-                            }
-                        }
-                    except Exception as e:
-                        logger.error(f"解析RapidAPI返回数据时出错: {str(e)}")
-
             # Twitter 获取失败
             return {
                 "title": "获取失败",
@@ -220,43 +195,48 @@ class ContentProcessor:
                 'source': url.split('//')[-1].split('/')[0]
             }
 
-    async def fetch_webpage_content_async(self, url, session, max_length=MAX_CONTENT_LENGTH):
-        """异步方式抓取网页内容（非x.com）"""
-        try:
-            async with session.get(url, timeout=15) as resp:
-                text = await resp.text()
-                soup = BeautifulSoup(text, 'html.parser')
-                title = soup.title.string.strip() if soup.title and soup.title.string else '未知标题'
-                content = soup.get_text(separator='\n', strip=True)
-                if len(content) > max_length:
-                    content = content[:max_length]
-                return {
-                    'title': title,
-                    'content': content,
-                    'url': url,
-                    'source': url.split('//')[-1].split('/')[0]
-                }
-        except Exception as e:
-            return {
-                'title': '获取失败',
-                'content': f'无法获取内容: {str(e)}',
-                'url': url,
-                'source': url.split('//')[-1].split('/')[0]
-            }
-
-    async def batch_fetch_webpages(self, urls, max_length=MAX_CONTENT_LENGTH):
-        """批量异步抓取网页内容（非x.com）"""
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.fetch_webpage_content_async(url, session, max_length) for url in urls]
-            return await asyncio.gather(*tasks)
+    def shutdown(self):
+        """关闭链接处理线程池"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
     def process_link(self, url):
-        """处理链接并返回结构化内容（支持x.com和普通网页）"""
+        """处理链接并返回结构化内容（支持x.com和普通网页，同步接口，不能在后台事件循环线程中调用）"""
+        webpage_data = self.fetch_link_content(url)
+        return self.analyze_content(url, webpage_data)
+
+    def fetch_link_content(self, url):
+        """抓取链接的原始内容：推文走 Twitter API 模块，其他链接走网页抓取
+
+        Twitter API 模块获取失败时返回 None
+        """
         is_twitter = "twitter.com" in url or "x.com" in url or "nitter" in url
         # 只要安装了 tweepy 库，就尝试使用 twitter_api 模块处理
         # 该模块内部会自动判断使用官方 API 还是 Scraper.tech 备用
         if is_twitter and HAS_TWEEPY:
-            webpage_data = self._get_twitter_content_via_api(url)
+            return self._get_twitter_content_via_api(url)
+        # 普通网页抓取
+        return self.fetch_webpage_content(url)
+
+    async def resolve_url_async(self, url):
+        """展开 t.co 等短链接（在线程池中执行），其他链接原样返回"""
+        if not is_short_link(url):
+            return url
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, resolve_short_url, url)
+
+    async def fetch_link_content_async(self, url):
+        """异步抓取链接的原始内容：在线程池中运行 fetch_link_content，不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.fetch_link_content, url)
+
+    def analyze_content(self, url, webpage_data, on_partial=None):
+        """分析已抓取的内容（同步接口）：在后台事件循环中执行 analyze_content_async 并阻塞等待结果"""
+        return self.llm_client.run_sync(self.analyze_content_async(url, webpage_data, on_partial))
+
+    def check_fetched_content(self, url, webpage_data):
+        """检查抓取结果是否足以进行分析：不足时返回表示错误的结构化结果，否则返回 None"""
+        is_twitter = "twitter.com" in url or "x.com" in url or "nitter" in url
+        if is_twitter and HAS_TWEEPY:
             if not webpage_data:
                 logger.error(f"无法通过Twitter API/Scraper获取内容: {url}")
                 return {
@@ -269,8 +249,6 @@ class ContentProcessor:
                     "original_url": url
                 }
         else:
-            # 普通网页抓取
-            webpage_data = self.fetch_webpage_content(url)
             if not webpage_data.get("content") or len(webpage_data["content"]) < 10:
                 logger.warning(f"网页内容不足或为空: {url}")
                 return {
@@ -297,6 +275,19 @@ class ContentProcessor:
                 "source": webpage_data.get("source", url.split("//")[-1].split("/")[0] if "//" in url else url),
                 "original_url": url
             }
+        return None
+
+    async def analyze_content_async(self, url, webpage_data, on_partial=None):
+        """检查抓取结果并使用 DeepSeek 分析，返回结构化内容
+
+        DeepSeek 请求由异步客户端执行，这里直接等待，不占用链接处理线程池的线程
+        on_partial(fields): 流式输出时，每当 title、summary 等顶层字符串字段生成完毕就以 {字段: 值} 调用（在当前事件循环中）
+        """
+        insufficient = self.check_fetched_content(url, webpage_data)
+        if insufficient is not None:
+            return insufficient
+        loop = asyncio.get_running_loop()
+        emit = functools.partial(loop.call_soon_threadsafe, on_partial) if on_partial else None
         
         # 使用DeepSeek API分析内容
         # 检查是否是X.com (Twitter)链接
@@ -345,6 +336,10 @@ class ContentProcessor:
                 if tweet_meta.get('mentions'):
                     twitter_info += f"\n推文提及: @{' @'.join(tweet_meta['mentions'])}"
                 
+                # 添加推文串信息（内容已合并回复、后续和引用的推文）
+                if tweet_meta.get('thread'):
+                    twitter_info += f"\n推文串: 内容合并了 {tweet_meta['thread']['tweets']} 条相关推文（前文、后续推文和引用的推文），请作为一个整体分析"
+                
                 # 添加日期信息
                 if tweet_meta.get('date'):
                     twitter_info += f"\n推文日期: {tweet_meta['date']}"
@@ -391,13 +386,8 @@ class ContentProcessor:
         """
         
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
             payload = {
-                "model": "deepseek-chat",
+                "model": self.model,
                 "messages": [
                     {"role": "user", "content": prompt}
                 ],
@@ -405,50 +395,22 @@ class ContentProcessor:
                 "response_format": {"type": "json_object"}  # 要求模型返回JSON格式
             }
             
-            # 添加重试机制
-            max_retries = DEEPSEEK_API_MAX_RETRIES
-            retry_delay = DEEPSEEK_API_RETRY_DELAY  # 初始延迟时间
-            success = False
-            last_error = None
-            
-            for retry in range(max_retries):
-                if retry > 0:
-                    logger.warning(f"DeepSeek API请求失败，正在进行第{retry}次重试 (延迟{retry_delay}秒): {str(last_error) if last_error else '未知错误'}")
-                    import time
-                    time.sleep(retry_delay)
-                    # 增加重试延迟
-                    retry_delay *= 2
-                
-                try:
-                    logger.info(f"正在发送请求到DeepSeek API分析内容{' (重试)' if retry > 0 else ''}")
-                    response = requests.post(
-                        self.api_endpoint,
-                        headers=headers,
-                        json=payload,
-                        timeout=DEEPSEEK_API_TIMEOUT  # 使用配置的超时时间
-                    )
-                    response.raise_for_status()
-                    success = True
-                    break
-                except requests.exceptions.Timeout as e:
-                    last_error = e
-                    logger.warning(f"DeepSeek API请求超时 (已用{retry+1}/{max_retries}次重试): {str(e)}")
-                    if retry == max_retries - 1:  # 如果是最后一次重试
-                        raise  # 重新抛出当前异常
-                except requests.exceptions.RequestException as e:
-                    last_error = e
-                    logger.warning(f"DeepSeek API请求异常 (已用{retry+1}/{max_retries}次重试): {str(e)}")
-                    if retry == max_retries - 1:  # 如果是最后一次重试
-                        raise  # 重新抛出当前异常
-            
-            if not success:
-                # 如果没有成功且没有抛出异常，创建一个新的异常
-                raise requests.exceptions.RequestException("DeepSeek API请求失败，所有重试均未成功")
-            
-            result = response.json()
-            content = result.get("choices", [{}])[0].get("message", {}).get("content", "{}")
+            # 先查询分析结果缓存，命中时跳过 API 请求和重试
+            cache_key = make_cache_key(
+                PROMPT_VERSION,
+                self.model,
+                "tweet" if is_twitter else "web",
+                normalize_content(content_to_analyze)
+            )
+            # 缓存读写是本地 SQLite 操作，放到线程池中执行，不阻塞事件循环
+            content = await loop.run_in_executor(None, self.llm_cache.get, cache_key) if self.llm_cache else None
+            from_cache = content is not None
+            if from_cache:
+                logger.info("命中DeepSeek分析缓存，跳过API请求")
+            else:
+                content = await self._request_analysis(payload, emit)
             
-            logger.info(f"收到DeepSeek API响应，尝试解析JSON内容")
+            logger.info(f"收到DeepSeek{'缓存' if from_cache else ' API'}响应，尝试解析JSON内容")
             
             # 预处理返回的内容，移除可能包含的代码块标记
             if "```json" in content:
@@ -459,6 +421,8 @@ class ContentProcessor:
             # 尝试解析返回的JSON
             try:
                 parsed_data = json.loads(content)
+                if self.llm_cache and not from_cache:
+                    await loop.run_in_executor(None, self.llm_cache.set, cache_key, content)
                 # 添加原始URL信息和来源
                 parsed_data["original_url"] = webpage_data["url"]
                 if not parsed_data.get("source") or parsed_data["source"] == "来源网站名称":
@@ -529,25 +493,29 @@ class ContentProcessor:
                 logger.warning(f"API返回的不是有效JSON，尝试从文本中提取: {str(e)}")
                 return self._extract_data_from_text(content, webpage_data["url"])
                 
-        except requests.exceptions.Timeout as e:
+        except LLMTimeoutError as e:
             logger.error(f"处理链接内容失败 - DeepSeek API 请求超时: {str(e)}")
             # 记录当前的超时配置
-            logger.info(f"当前 API 超时设置: {self.api_timeout}秒，建议适当增加 DEEPSEEK_API_TIMEOUT 值")
+            logger.info(f"本次 API 超时: {e.timeout:.0f}秒 (上限 {self.api_timeout}秒)，建议适当增加 DEEPSEEK_API_TIMEOUT 值")
             
             return {
                 "title": webpage_data.get("title", "处理超时"),
-                "summary": f"DeepSeek API 请求超时 ({self.api_timeout}秒)。这可能是由于网络问题或 API 服务器负载过高导致的。请稍后重试或考虑增加 DEEPSEEK_API_TIMEOUT 环境变量的值。",
-                "key_points": ["API 请求超时", f"已尝试 {self.max_retries} 次重试", "可能是网络问题或服务器负载高"],
+                "summary": f"DeepSeek API 请求超时 ({e.timeout:.0f}秒)。这可能是由于网络问题或 API 服务器负载过高导致的。请稍后重试或考虑增加 DEEPSEEK_API_TIMEOUT 环境变量的值。",
+                "key_points": ["API 请求超时", f"共发送 {e.attempts} 次请求均未完成", "可能是网络问题或服务器负载高"],
                 "tags": ["API超时", "处理错误", webpage_data.get("source", "未知来源")],
                 "related_links": [],
                 "source": webpage_data.get("source", url.split("//")[-1].split("/")[0] if "//" in url else url),
                 "original_url": url
             }
-        except requests.exceptions.ConnectionError as e:
+        except LLMConnectionError as e:
             logger.error(f"处理链接内容失败 - DeepSeek API 连接错误: {str(e)}")
-            # 尝试检查 API 连接
-            connection_status, error_details = self._check_api_connection()
-            connection_message = "API 连接测试:" + ("成功" if connection_status else f"失败 ({error_details})")
+            if isinstance(e, CircuitOpenError):
+                # 熔断中，恢复由熔断器的探测请求负责，不再单独测试连接
+                connection_message = f"API 连续失败，已暂停请求，{e.retry_in:.0f}秒后自动恢复尝试"
+            else:
+                # 尝试检查 API 连接
+                connection_status, error_details = await self._check_api_connection()
+                connection_message = "API 连接测试:" + ("成功" if connection_status else f"失败 ({error_details})")
             
             return {
                 "title": webpage_data.get("title", "连接失败"),
@@ -590,47 +558,18 @@ class ContentProcessor:
                 "original_url": url
             }
     
-    def _check_api_connection(self):
+    async def _request_analysis(self, payload, on_partial=None):
+        """发送分析请求到DeepSeek API（重试、熔断和超时由 DeepSeek 客户端处理），返回模型输出的文本内容
+
+        提供 on_partial 且启用流式输出时以流式模式请求，边接收边解析已完成的字段
+        """
+        on_delta = _stream_parser(on_partial) if on_partial and DEEPSEEK_STREAM_ENABLED else None
+        return await self.llm_client.complete(payload, on_delta)
+
+    async def _check_api_connection(self):
         """检查 DeepSeek API 连接状态"""
         try:
-            test_headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.api_key}"
-            }
-            
-            # 使用一个简单的请求测试连接
-            test_payload = {
-                "model": "deepseek-chat",
-                "messages": [
-                    {"role": "user", "content": "Hello"}
-                ],
-                "max_tokens": 5
-            }
-            
-            logger.info("正在测试 DeepSeek API 连接...")
-            response = requests.post(
-                self.api_endpoint,
-                headers=test_headers,
-                json=test_payload,
-                timeout=10  # 使用较短的超时时间进行测试
-            )
-            
-            if response.status_code == 200:
-                logger.info("✅ DeepSeek API 连接正常")
-                return True, "连接正常"
-            else:
-                error_msg = f"API 返回非200状态码: {response.status_code}"
-                logger.warning(f"⚠️ DeepSeek API 连接测试失败: {error_msg}")
-                return False, error_msg
-                
-        except requests.exceptions.Timeout:
-            error_msg = "API 请求超时"
-            logger.warning(f"⚠️ DeepSeek API 连接超时")
-            return False, error_msg
-        except requests.exceptions.ConnectionError:
-            error_msg = "无法连接到 API 服务器"
-            logger.warning(f"⚠️ DeepSeek API 连接错误: {error_msg}")
-            return False, error_msg
+            return await self.llm_client.check_connection()
         except Exception as e:
             error_msg = f"未知错误: {str(e)}"
             logger.warning(f"⚠️ DeepSeek API 连接测试出现异常: {error_msg}")
@@ -0,0 +1,326 @@
+"""
+持久化链接处理队列 - 基于本地 SQLite 文件
+提供多个异步 worker、至少一次执行语义、指数退避重试、死信表以及启动时恢复
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from app.config import (
+    INGEST_QUEUE_PATH,
+    INGEST_WORKERS,
+    INGEST_MAX_ATTEMPTS,
+    INGEST_RETRY_BASE_DELAY,
+    INGEST_RETENTION
+)
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 最长重试间隔（秒）
+MAX_RETRY_DELAY = 600
+# 运行期间清理过期任务的最小间隔（秒）
+PRUNE_INTERVAL = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    chat_id INTEGER,
+    message_id INTEGER,
+    position INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_run_at REAL NOT NULL,
+    last_error TEXT,
+    result TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_next ON jobs (status, next_run_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_message ON jobs (chat_id, message_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs (status, updated_at);
+CREATE TABLE IF NOT EXISTS dead_letters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    chat_id INTEGER,
+    message_id INTEGER,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    result TEXT,
+    failed_at REAL NOT NULL
+);
+"""
+
+
+class IngestQueue:
+    def __init__(self, path=INGEST_QUEUE_PATH, workers=INGEST_WORKERS, max_attempts=INGEST_MAX_ATTEMPTS,
+                 retry_base_delay=INGEST_RETRY_BASE_DELAY, retention=INGEST_RETENTION):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.retention = retention
+        self._last_prune = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        self._tasks = []
+        self._wakeup = None
+        self._handler = None
+        self._on_complete = None
+
+    # ---------------- 任务读写 ----------------
+
+    def enqueue(self, urls, chat_id=None, message_id=None):
+        """将一组链接加入队列（同一条状态消息），返回任务ID列表"""
+        now = time.time()
+        job_ids = []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for position, url in enumerate(urls):
+                cursor = self._conn.execute(
+                    "INSERT INTO jobs (url, chat_id, message_id, position, status, next_run_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, chat_id, message_id, position, JOB_PENDING, now, now, now)
+                )
+                job_ids.append(cursor.lastrowid)
+            self._conn.execute("COMMIT")
+        logger.info(f"已加入处理队列: {len(job_ids)} 个任务 {job_ids}")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_ids
+
+    def attach_message(self, job_ids, chat_id, message_id):
+        """为任务关联用于回报结果的状态消息"""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET chat_id = ?, message_id = ? WHERE id = ?",
+                [(chat_id, message_id, job_id) for job_id in job_ids]
+            )
+
+    def get_job(self, job_id):
+        """获取单个任务"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def get_message_jobs(self, chat_id, message_id):
+        """获取关联到同一条状态消息的所有任务（按链接顺序）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE chat_id = ? AND message_id = ? ORDER BY position",
+                (chat_id, message_id)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def get_dead_letters(self, limit=20):
+        """获取最近的死信任务"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM dead_letters ORDER BY failed_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def stats(self):
+        """各状态的任务数量"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+            dead = self._conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        counts = {row["status"]: row["n"] for row in rows}
+        counts["dead_letters"] = dead
+        return counts
+
+    def prune(self):
+        """删除结束超过 retention 秒的已完成和失败任务（失败任务在死信表中保留），返回删除的数量"""
+        now = time.time()
+        with self._lock:
+            self._last_prune = now
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JOB_DONE, JOB_FAILED, now - self.retention)
+            )
+        if cursor.rowcount:
+            logger.info(f"已清理 {cursor.rowcount} 个过期的已结束任务")
+        return cursor.rowcount
+
+    def recover(self):
+        """将上次运行中断时仍在执行的任务重新置为待处理（至少一次语义），并清理过期的已结束任务"""
+        self.prune()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (JOB_PENDING, time.time(), JOB_RUNNING)
+            )
+        if cursor.rowcount:
+            logger.info(f"已恢复 {cursor.rowcount} 个中断的任务")
+        return cursor.rowcount
+
+    def _claim(self):
+        """领取一个到期的待处理任务，返回 (任务, 下一个任务到期的等待秒数)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = ? AND next_run_at <= ? ORDER BY next_run_at, id LIMIT 1",
+                (JOB_PENDING, now)
+            ).fetchone()
+            if row:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (JOB_RUNNING, now, row["id"])
+                )
+                self._conn.execute("COMMIT")
+                job = self._row_to_job(row)
+                job["attempts"] += 1
+                job["status"] = JOB_RUNNING
+                return job, 0
+            upcoming = self._conn.execute(
+                "SELECT MIN(next_run_at) FROM jobs WHERE status = ?", (JOB_PENDING,)
+            ).fetchone()[0]
+            self._conn.execute("COMMIT")
+        return None, (max(0.0, upcoming - now) if upcoming is not None else None)
+
+    def _complete(self, job, result):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (JOB_DONE, json.dumps(result, ensure_ascii=False), time.time(), job["id"])
+            )
+
+    def _retry(self, job, error, result=None):
+        """安排重试，返回 True；超过最大次数则移入死信表并返回 False"""
+        now = time.time()
+        with self._lock:
+            if job["attempts"] < self.max_attempts:
+                delay = min(MAX_RETRY_DELAY, self.retry_base_delay * (2 ** (job["attempts"] - 1)))
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, next_run_at = ?, last_error = ?, result = ?, updated_at = ? WHERE id = ?",
+                    (JOB_PENDING, now + delay, error, json.dumps(result, ensure_ascii=False) if result else None, now, job["id"])
+                )
+                logger.warning(f"任务 #{job['id']} 第{job['attempts']}次执行失败，{delay}秒后重试: {error}")
+                return True
+        self._fail(job, error, result)
+        return False
+
+    def _fail(self, job, error, result=None):
+        """标记任务失败并写入死信表"""
+        now = time.time()
+        payload = json.dumps(result, ensure_ascii=False) if result else None
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, last_error = ?, result = ?, updated_at = ? WHERE id = ?",
+                (JOB_FAILED, error, payload, now, job["id"])
+            )
+            self._conn.execute(
+                "INSERT INTO dead_letters (job_id, url, chat_id, message_id, attempts, last_error, result, failed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], job["url"], job["chat_id"], job["message_id"], job["attempts"], error, payload, now)
+            )
+            self._conn.execute("COMMIT")
+        logger.error(f"任务 #{job['id']} 已移入死信表 (共执行{job['attempts']}次): {error}")
+
+    async def checkpoint(self, job, result):
+        """任务执行中保存中间结果（如两阶段保存中已创建的页面），重试时通过 job["result"] 取回"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET result = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), time.time(), job["id"])
+            )
+        if self._on_complete:
+            try:
+                await self._on_complete(self.get_job(job["id"]))
+            except Exception as e:
+                logger.warning(f"回报任务 #{job['id']} 进度失败: {str(e)}")
+
+    @staticmethod
+    def _row_to_job(row):
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job.get("result") else None
+        return job
+
+    # ---------------- worker ----------------
+
+    async def start(self, handler, on_complete=None):
+        """启动 worker
+
+        handler(job) -> 结果字典，结果中 status 为 "error" 且 retryable 为真时会重试；
+        on_complete(job) 在任务完成、进入重试、最终失败或保存中间结果后被调用
+        """
+        self._handler = handler
+        self._on_complete = on_complete
+        self._wakeup = asyncio.Event()
+        self.recover()
+        self._tasks = [
+            asyncio.create_task(self._worker(index), name=f"ingest-worker-{index}")
+            for index in range(self.workers)
+        ]
+        logger.info(f"处理队列已启动: {self.workers} 个 worker, 队列状态 {self.stats()}")
+
+    async def stop(self):
+        """停止 worker；未完成的任务保留为运行中，下次启动时恢复"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def close(self):
+        self._conn.close()
+
+    async def _worker(self, index):
+        while True:
+            self._wakeup.clear()
+            job, wait_seconds = self._claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait_seconds if wait_seconds is not None else 60)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # 唤醒其他空闲 worker，检查是否还有待处理任务
+            self._wakeup.set()
+            await self._run_job(job)
+
+    async def _run_job(self, job):
+        try:
+            result = await self._handler(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"执行任务 #{job['id']} 时出错: {str(e)}")
+            result = {"url": job["url"], "status": "error", "error": str(e), "retryable": True}
+
+        if result.get("status") != "error":
+            self._complete(job, result)
+        elif result.get("retryable"):
+            self._retry(job, result.get("error") or "未知错误", result)
+        else:
+            self._fail(job, result.get("error") or "未知错误", result)
+
+        if self._on_complete:
+            try:
+                await self._on_complete(self.get_job(job["id"]))
+            except Exception as e:
+                logger.warning(f"回报任务 #{job['id']} 结果失败: {str(e)}")
+
+        # 长时间运行时定期清理，不只在启动时
+        if time.time() - self._last_prune >= PRUNE_INTERVAL:
+            self.prune()
@@ -0,0 +1,220 @@
+"""
+链接处理流水线 - 去重 -> 抓取 -> DeepSeek 分析 -> 保存到 Notion
+每个链接由处理队列的 worker 独立执行（并发数即 worker 数量）；
+两阶段保存模式下抓取完成后立即创建页面，分析结果随后补充到该页面
+"""
+
+import logging
+from app.config import TWO_PHASE_SAVE
+
+logger = logging.getLogger(__name__)
+
+# 处理结果中表示出错的关键词和标签
+ERROR_KEYWORDS = ["API请求超时", "处理超时", "连接失败", "处理失败", "无法获取"]
+ERROR_TAGS = ["API超时", "处理错误", "连接错误", "访问失败"]
+# 表示内容本身无法获取的标签，重试也无济于事
+PERMANENT_ERROR_TAGS = ["访问失败", "内容缺失"]
+
+# 流水线阶段
+STAGE_PENDING = "pending"
+STAGE_FETCHING = "fetching"
+STAGE_ANALYZING = "analyzing"
+STAGE_SAVING = "saving"
+STAGE_ENRICHING = "enriching"
+
+# 最终状态
+STATUS_SAVED = "saved"
+STATUS_DUPLICATE = "duplicate"
+STATUS_ERROR = "error"
+
+
+def has_processing_error(processed_data):
+    """检查处理结果是否包含错误相关关键词或特殊错误标记"""
+    # 检查标题、摘要和标签中是否包含错误关键词
+    if any(keyword in processed_data.get('title', '') for keyword in ERROR_KEYWORDS) or \
+       any(keyword in processed_data.get('summary', '') for keyword in ERROR_KEYWORDS) or \
+       any(error_tag in processed_data.get('tags', []) for error_tag in ERROR_TAGS):
+        return True
+
+    # 特别检查关键点中是否包含明确的错误信息
+    key_points = processed_data.get('key_points', [])
+    if key_points and any("错误" in point or "失败" in point or "API" in point for point in key_points):
+        return True
+
+    return False
+
+
+def _error_result(result, processed_data):
+    """分析结果包含错误时的处理结果"""
+    result["error"] = processed_data.get('summary', '处理过程中出现错误')
+    result["error_stage"] = "analyze"
+    result["retryable"] = not any(tag in processed_data.get('tags', []) for tag in PERMANENT_ERROR_TAGS)
+    return result
+
+
+class LinkPipeline:
+    def __init__(self, content_processor, notion_manager, two_phase=TWO_PHASE_SAVE):
+        self.content_processor = content_processor
+        self.notion_manager = notion_manager
+        self.two_phase = two_phase
+
+    async def process(self, url, webpage_data=None, on_stage=None, draft=None, on_draft=None, on_partial=None):
+        """处理单个链接，返回结果字典
+
+        结果格式:
+        {
+            "url": 原始链接,
+            "status": "saved" / "duplicate" / "error",
+            "data": DeepSeek 结构化结果,
+            "page_id": 新建页面ID (saved；两阶段保存时出错也会包含),
+            "draft": 页面已创建但分析结果尚未写入 (两阶段保存),
+            "existing": {"id", "title"} (duplicate),
+            "error": 错误信息 (error),
+            "error_stage": "analyze" / "save" (error),
+            "retryable": 错误是否可重试 (error)
+        }
+
+        两阶段保存：draft 为上一次执行已创建页面时的结果，此时跳过去重和创建页面，
+        直接补充分析结果；on_draft(result) 在页面创建后、分析开始前被调用
+
+        on_partial(fields): DeepSeek 流式输出时，标题、摘要等字段生成后立即被调用（同步函数）
+        """
+        if self.two_phase or draft:
+            return await self._process_two_phase(url, webpage_data, on_stage, draft, on_draft, on_partial)
+
+        async def report(stage):
+            if on_stage:
+                await on_stage(stage)
+
+        result = {"url": url, "status": STATUS_ERROR}
+        # 短链接展开后的链接作为条目的链接保存，之后发送短链接或展开后的链接都能识别为重复
+        link = url
+        try:
+            if webpage_data is None:
+                # 1) 去重：在抓取和调用 DeepSeek 之前按规范化链接检查是否已保存
+                link = await self.content_processor.resolve_url_async(url)
+                existing = await self.notion_manager.find_entry_by_link_async(link)
+                if existing:
+                    result["status"] = STATUS_DUPLICATE
+                    result["existing"] = existing
+                    return result
+
+                # 2) 抓取
+                await report(STAGE_FETCHING)
+                webpage_data = await self.content_processor.fetch_link_content_async(link)
+
+            # 3) DeepSeek 分析
+            await report(STAGE_ANALYZING)
+            processed_data = await self.content_processor.analyze_content_async(link, webpage_data, on_partial=on_partial)
+            result["data"] = processed_data
+            if has_processing_error(processed_data):
+                # 处理过程出现错误，不保存到Notion
+                return _error_result(result, processed_data)
+
+            # 保存前再检查一次，避免分析期间同一链接已被其他任务保存
+            existing = await self.notion_manager.find_entry_by_link_async(processed_data.get('original_url'))
+            if existing:
+                result["status"] = STATUS_DUPLICATE
+                result["existing"] = existing
+                return result
+
+            # 4) 保存到Notion
+            await report(STAGE_SAVING)
+            save_result = await self.notion_manager.add_content_to_database_async(processed_data)
+            if save_result["success"]:
+                result["status"] = STATUS_SAVED
+                result["page_id"] = save_result["page_id"]
+            else:
+                result["error"] = save_result.get('error', '未知错误')
+                result["error_stage"] = "save"
+                result["retryable"] = True
+            return result
+
+        except Exception as e:
+            logger.error(f"处理链接时出错: {url}, {str(e)}")
+            result["error"] = str(e)
+            result["error_stage"] = "analyze"
+            result["retryable"] = True
+            return result
+
+    async def _process_two_phase(self, url, webpage_data, on_stage, draft, on_draft, on_partial=None):
+        """两阶段保存：抓取 -> 立即创建页面（状态'处理中'）-> DeepSeek 分析 -> 补充摘要、标签和关键点
+
+        DeepSeek 不可用时链接已经保存在 Notion 中，重试时沿用已创建的页面
+        """
+        async def report(stage):
+            if on_stage:
+                await on_stage(stage)
+
+        result = {"url": url, "status": STATUS_ERROR}
+        try:
+            if draft is None:
+                # 与单阶段保存一致，页面保存短链接展开后的链接
+                link = url
+                if webpage_data is None:
+                    link = await self.content_processor.resolve_url_async(url)
+                    existing = await self.notion_manager.find_entry_by_link_async(link)
+                    if existing:
+                        result["status"] = STATUS_DUPLICATE
+                        result["existing"] = existing
+                        return result
+                    await report(STAGE_FETCHING)
+                    webpage_data = await self.content_processor.fetch_link_content_async(link)
+
+                # 内容不足时不创建页面，与单阶段保存一致
+                insufficient = self.content_processor.check_fetched_content(link, webpage_data)
+                if insufficient is not None:
+                    result["data"] = insufficient
+                    return _error_result(result, insufficient)
+
+                existing = await self.notion_manager.find_entry_by_link_async(link)
+                if existing:
+                    result["status"] = STATUS_DUPLICATE
+                    result["existing"] = existing
+                    return result
+
+                await report(STAGE_SAVING)
+                save_result = await self.notion_manager.create_draft_page_async(link, webpage_data)
+                if not save_result["success"]:
+                    result["error"] = save_result.get('error', '未知错误')
+                    result["error_stage"] = "save"
+                    result["retryable"] = True
+                    return result
+                draft = {
+                    "url": url,
+                    "status": STATUS_SAVED,
+                    "page_id": save_result["page_id"],
+                    "draft": True,
+                    "data": {"title": save_result["title"], "source": webpage_data.get("source") or link, "original_url": link}
+                }
+                if on_draft:
+                    await on_draft(draft)
+
+            result.update({"page_id": draft["page_id"], "draft": True, "data": draft.get("data")})
+            link = (draft.get("data") or {}).get("original_url") or url
+            if webpage_data is None:
+                # 重试或进程重启后需要重新抓取内容
+                await report(STAGE_FETCHING)
+                webpage_data = await self.content_processor.fetch_link_content_async(link)
+
+            await report(STAGE_ANALYZING)
+            processed_data = await self.content_processor.analyze_content_async(link, webpage_data, on_partial=on_partial)
+            if has_processing_error(processed_data):
+                return _error_result(result, processed_data)
+
+            await report(STAGE_ENRICHING)
+            enrich_result = await self.notion_manager.enrich_page_async(draft["page_id"], processed_data)
+            if not enrich_result["success"]:
+                result["error"] = enrich_result.get('error', '未知错误')
+                result["error_stage"] = "save"
+                result["retryable"] = True
+                return result
+
+            return {"url": url, "status": STATUS_SAVED, "page_id": draft["page_id"], "data": processed_data}
+
+        except Exception as e:
+            logger.error(f"处理链接时出错: {url}, {str(e)}")
+            result["error"] = str(e)
+            result["error_stage"] = "analyze"
+            result["retryable"] = True
+            return result
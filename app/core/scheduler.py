@@ -1,7 +1,10 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime
 import re
+import threading
 from app.services.notion_service import NotionManager
+from app.services.notion_transport import notion_priority
+from app.common.rate_limiter import PRIORITY_BACKGROUND
 from app.config import TELEGRAM_BOT_TOKEN,TARGET_CHAT_ID
 from telegram import Bot
 
@@ -12,12 +15,23 @@ def escape_markdown(text):
     # Telegram Markdown V1 需要转义 _ * [ ] ( ) ~ ` > # + - = | { } . !
     return re.sub(r'([_\*\[\]()~`>#+\-=|{}.!])', r'\\\1', str(text))
 
-# 初始化 Notion 管理器和 Telegram Bot
-notion_manager = NotionManager()
+# Telegram Bot；Notion 管理器在第一次执行任务时创建
 bot = Bot(token=TELEGRAM_BOT_TOKEN)
+_notion_manager = None
+_notion_manager_lock = threading.Lock()
+
+def get_notion_manager():
+    """调度器使用的 Notion 管理器：只读取 Notion，不打开机器人正在使用的本地副本和打卡日志"""
+    global _notion_manager
+    with _notion_manager_lock:
+        if _notion_manager is None:
+            _notion_manager = NotionManager(local_state=False)
+        return _notion_manager
 
 def check_and_notify():
-    entries = notion_manager.get_reminder_entries()
+    # 调度器运行在后台线程中，使用 NotionManager 的同步接口，请求排在交互操作之后
+    with notion_priority(PRIORITY_BACKGROUND):
+        entries = get_notion_manager().get_reminder_entries()
     if entries:
         msg = "以下内容还未打卡，请及时完成：\n"
         for entry in entries:
@@ -0,0 +1,283 @@
+"""
+本地全文搜索索引 - 倒排索引 + BM25 排序
+中文等 CJK 文本按相邻二字切分（bigram，另外索引单字以支持单字查询），英文和数字按单词切分，
+覆盖标题、摘要、标签、关键点和来源，随写操作和同步增量更新
+"""
+
+import heapq
+import logging
+import math
+import re
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 各字段的词频权重
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "key_points": 1.0,
+    "summary": 1.0,
+    "source": 0.5
+}
+
+# 中日韩统一表意文字（含扩展A、兼容区）、日文假名、韩文音节
+CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af]+')
+WORD_PATTERN = re.compile(r'[a-z0-9]+(?:[\'._-][a-z0-9]+)*')
+
+
+def tokenize(text):
+    """将文本切分为词项：CJK 连续片段按二字切分（单字片段保留单字），其他按英文单词和数字切分"""
+    if not text:
+        return []
+    text = text.lower()
+    tokens = []
+    for segment in CJK_PATTERN.findall(text):
+        if len(segment) == 1:
+            tokens.append(segment)
+        else:
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    tokens.extend(WORD_PATTERN.findall(CJK_PATTERN.sub(" ", text)))
+    return tokens
+
+
+class _IndexData:
+    """倒排索引的数据部分；全量重建时在锁外建立新的一份，再整体替换"""
+
+    def __init__(self, avg_len=None):
+        # 词项 -> {页面ID: 已按 BM25 饱和并做长度归一化的词频}，查询时只需乘以 idf
+        self.postings = {}
+        self.doc_terms = {}
+        self.doc_len = {}
+        self.docs = {}
+        self.total_len = 0.0
+        # 全量重建时使用全部条目的平均长度；增量添加时使用添加时的平均长度，下次重建时校正
+        self.avg_len = avg_len
+
+    def add(self, entry, weights=None):
+        page_id = entry.get("id")
+        if not page_id:
+            return
+        if weights is None:
+            weights, length = _entry_weights(entry)
+        else:
+            weights, length = weights
+        self.total_len += length
+        avg_len = self.avg_len or self.total_len / (len(self.docs) + 1) or 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_len)
+        postings = self.postings
+        saturation = BM25_K1 + 1
+        for token, tf in weights.items():
+            bucket = postings.get(token)
+            if bucket is None:
+                postings[token] = {page_id: tf * saturation / (tf + norm)}
+            else:
+                bucket[page_id] = tf * saturation / (tf + norm)
+        self.doc_terms[page_id] = list(weights)
+        self.doc_len[page_id] = length
+        self.docs[page_id] = {
+            "id": page_id,
+            "title": entry.get("title"),
+            "summary": entry.get("summary"),
+            "status": entry.get("status"),
+            "key_points": entry.get("key_points")
+        }
+
+    def remove(self, page_id):
+        terms = self.doc_terms.pop(page_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            postings = self.postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(page_id, None)
+            if not postings:
+                del self.postings[token]
+        self.total_len -= self.doc_len.pop(page_id, 0.0)
+        self.docs.pop(page_id, None)
+
+
+def _entry_weights(entry):
+    """按字段权重累加的词频 ({词项: 词频}, 条目长度)
+
+    多字 CJK 片段中的单字也作为词项索引，用于单字查询（单字片段已由切分得到），这些单字不计入条目长度
+    """
+    weights = {}
+    chars = {}
+    get = weights.get
+    get_char = chars.get
+    for field, weight in FIELD_WEIGHTS.items():
+        value = entry.get(field)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = " ".join(value)
+        value = value.lower()
+        tokens = []
+        field_chars = []
+        for segment in CJK_PATTERN.findall(value):
+            if len(segment) == 1:
+                tokens.append(segment)
+            else:
+                tokens.extend([segment[i:i + 2] for i in range(len(segment) - 1)])
+                field_chars.extend(segment)
+        tokens.extend(WORD_PATTERN.findall(CJK_PATTERN.sub(" ", value)))
+        for token, count in Counter(tokens).items():
+            weights[token] = get(token, 0.0) + count * weight
+        for char, count in Counter(field_chars).items():
+            chars[char] = get_char(char, 0.0) + count * weight
+    length = sum(weights.values())
+    for char, tf in chars.items():
+        weights[char] = get(char, 0.0) + tf
+    return weights, length
+
+
+def _with_key_points(entry, docs):
+    # 关键点保存在页面正文中，同步得到的条目不含关键点，沿用本机保存时记录的关键点
+    if entry.get("key_points") is None and entry.get("id") in docs:
+        return dict(entry, key_points=docs[entry["id"]].get("key_points"))
+    return entry
+
+
+class SearchIndex:
+    def __init__(self):
+        self._data = _IndexData()
+        self._lock = threading.Lock()
+        # 全量重建期间发生的增删，替换索引前重放到新索引上
+        self._pending = None
+        self._load_lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self):
+        return len(self._data.docs)
+
+    def load(self, entries):
+        """用全量条目重建索引；条目未提供 key_points 时沿用索引中已有的关键点
+
+        新索引在锁外建立，只在替换时短暂持有锁，重建期间搜索和增量更新不受影响
+        """
+        with self._load_lock:
+            with self._lock:
+                previous = self._data.docs
+                self._pending = []
+            try:
+                # 先计算全部条目的词频和平均长度，再按平均长度计算各条目的归一化词频
+                weighted = []
+                total_len = 0.0
+                for entry in entries:
+                    if entry.get("id"):
+                        entry = _with_key_points(entry, previous)
+                        weights = _entry_weights(entry)
+                        total_len += weights[1]
+                        weighted.append((entry, weights))
+                data = _IndexData(avg_len=total_len / len(weighted) if weighted and total_len else None)
+                for entry, weights in weighted:
+                    data.remove(entry["id"])
+                    data.add(entry, weights)
+            except BaseException:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                for action, value in self._pending:
+                    if action == "add":
+                        data.remove(value["id"])
+                        data.add(value)
+                    else:
+                        data.remove(value)
+                self._pending = None
+                self._data = data
+                self.ready = True
+        logger.info(f"搜索索引已建立: {len(data.docs)} 个条目, {len(data.postings)} 个词项")
+
+    def add(self, entry):
+        """新增或更新一个条目（条目字典需包含 id，可包含 title/summary/tags/key_points/source/status）"""
+        with self._lock:
+            entry = _with_key_points(entry, self._data.docs)
+            self._data.remove(entry["id"])
+            self._data.add(entry)
+            if self._pending is not None:
+                self._pending.append(("add", entry))
+
+    def remove(self, page_id):
+        with self._lock:
+            self._data.remove(page_id)
+            if self._pending is not None:
+                self._pending.append(("remove", page_id))
+
+    def search(self, query, offset=0, limit=10):
+        """BM25 排序搜索，返回 (匹配总数, [{"id", "title", "summary", "status", "score"}])
+
+        多个词项时只对可能进入前 offset + limit 名的条目计算完整得分（MaxScore 剪枝），结果与逐条计分一致
+        """
+        count = offset + limit
+        with self._lock:
+            data = self._data
+            doc_count = len(data.docs)
+            # [(倒排列表, idf)]
+            terms = []
+            for term in set(tokenize(query)):
+                postings = data.postings.get(term)
+                if postings:
+                    terms.append((postings, math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))))
+            if not terms:
+                return 0, []
+
+            if len(terms) == 1:
+                postings, idf = terms[0]
+                total = len(postings)
+                top = [(page_id, idf * postings[page_id]) for page_id in _top_postings(postings, count)]
+            else:
+                total = len(set().union(*(postings for postings, _ in terms)))
+                top = _top_documents(terms, count)
+            results = [
+                {"id": page_id, "title": data.docs[page_id]["title"], "summary": data.docs[page_id]["summary"],
+                 "status": data.docs[page_id]["status"], "score": score}
+                for page_id, score in top[offset:]
+            ]
+        return total, results
+
+
+def _top_postings(postings, count):
+    """倒排列表中归一化词频最高的 count 个页面ID（先找出第 count 大的词频，只对不低于它的条目排序）"""
+    if count <= 0:
+        return []
+    weights = heapq.nlargest(count, postings.values())
+    minimum = weights[-1]
+    top = [(weight, page_id) for page_id, weight in postings.items() if weight >= minimum]
+    return [page_id for _, page_id in heapq.nlargest(count, top)]
+
+
+def _top_documents(terms, count):
+    """多个词项 [(倒排列表, idf)] 的前 count 名 [(页面ID, 得分)]"""
+    def score(page_id):
+        return sum(idf * postings.get(page_id, 0.0) for postings, idf in terms)
+
+    # 各词项得分的上界
+    bounds = [(postings, idf, idf * max(postings.values())) for postings, idf in terms]
+    # 用上界最高的词项排名靠前的条目的完整得分，估计第 count 名得分的下界
+    postings = max(bounds, key=lambda item: item[2])[0]
+    candidates = set(_top_postings(postings, count))
+    seed_scores = heapq.nlargest(count, map(score, candidates))
+    threshold = seed_scores[-1] if len(seed_scores) >= count else 0.0
+
+    # 按上界从低到高累加：累加值低于下界的词项不必遍历，只包含这些词项的条目不可能进入前 count 名；
+    # 其余词项中，只需要该词项得分不低于 下界 - 其他词项上界之和 的条目
+    bound_total = sum(bound for _, _, bound in bounds)
+    prefix = 0.0
+    for postings, idf, bound in sorted(bounds, key=lambda item: item[2]):
+        prefix += bound
+        if prefix < threshold:
+            continue
+        minimum = (threshold - (bound_total - bound)) / idf
+        if minimum <= 0:
+            candidates.update(postings)
+        else:
+            candidates.update([page_id for page_id, weight in postings.items() if weight >= minimum])
+    return heapq.nlargest(count, ((page_id, score(page_id)) for page_id in candidates), key=lambda item: item[1])
@@ -0,0 +1,71 @@
+"""
+标签索引 - 在内存中维护 标签 -> 条目数量 / 条目ID 的映射
+启动时从数据库结构中的标签选项和一次全量扫描建立，之后随写操作和同步增量更新
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TagIndex:
+    def __init__(self):
+        self._tag_pages = {}
+        self._page_tags = {}
+        self._options = []
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def load(self, entries, options=None):
+        """用全量条目 [(页面ID, 标签列表)] 重建索引，options 为数据库中定义的标签选项"""
+        with self._lock:
+            self._tag_pages = {}
+            self._page_tags = {}
+            if options is not None:
+                self._options = list(options)
+            for page_id, tags in entries:
+                self._set_locked(page_id, tags)
+            self.ready = True
+        logger.info(f"标签索引已建立: {len(self._tag_pages)} 个标签, {len(self._page_tags)} 个条目")
+
+    def set_options(self, options):
+        """更新数据库中定义的标签选项，options 为 None 时保持不变"""
+        if options is None:
+            return
+        with self._lock:
+            self._options = list(options)
+
+    def set_entry_tags(self, page_id, tags):
+        """更新单个条目的标签"""
+        with self._lock:
+            self._set_locked(page_id, tags)
+
+    def remove_entry(self, page_id):
+        """条目被删除时移除其标签"""
+        with self._lock:
+            self._set_locked(page_id, [])
+
+    def _set_locked(self, page_id, tags):
+        old_tags = self._page_tags.pop(page_id, set())
+        new_tags = set(tags or [])
+        for tag in old_tags - new_tags:
+            pages = self._tag_pages.get(tag)
+            if pages is not None:
+                pages.discard(page_id)
+                if not pages:
+                    del self._tag_pages[tag]
+        for tag in new_tags - old_tags:
+            self._tag_pages.setdefault(tag, set()).add(page_id)
+        if new_tags:
+            self._page_tags[page_id] = new_tags
+
+    def counts(self):
+        """[(标签, 条目数量)]，按数量降序、标签名升序"""
+        with self._lock:
+            return sorted(((tag, len(pages)) for tag, pages in self._tag_pages.items()), key=lambda item: (-item[1], item[0]))
+
+    def unused_options(self):
+        """数据库中已定义、但还没有条目使用的标签选项（排序）"""
+        with self._lock:
+            return sorted(set(self._options) - set(self._tag_pages))
@@ -0,0 +1,220 @@
+"""
+链接规范化与已保存链接索引
+- Twitter/X 链接按推文ID规范化，其他网页去除跟踪参数
+- SeenUrlIndex 在内存中维护 规范化链接 -> 条目 的映射，从 Notion 同步，用于在抓取之前去重
+"""
+
+import logging
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+from app.common.sqlite_cache import SQLiteCache
+from app.config import TWEET_CACHE_ENABLED, TWEET_CACHE_PATH, SHORT_LINK_CACHE_TTL, SHORT_LINK_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# Twitter/X 及其常见镜像域名
+TWITTER_HOSTS = {
+    "twitter.com", "x.com", "mobile.twitter.com", "mobile.x.com",
+    "fxtwitter.com", "vxtwitter.com", "fixupx.com", "fixvx.com", "nitter.net"
+}
+SHORT_LINK_HOSTS = {"t.co"}
+
+TWEET_PATH_PATTERN = re.compile(r'^/(?:[^/]+|i(?:/web)?)/status(?:es)?/(\d+)')
+
+# 网页链接中需要去除的跟踪参数（只包含明确用于跟踪的参数名；ref、from、source 等通用参数名
+# 在很多网站上是有效的内容参数，去掉会把不同的链接误判为重复）
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "yclid",
+    "ref_src", "spm", "share_source", "share_medium", "share_from",
+    "_hsenc", "_hsmi", "vero_id"
+}
+TRACKING_PREFIXES = ("utm_",)
+# 只在特定网站上表示跟踪的参数：域名 -> 参数名
+HOST_TRACKING_PARAMS = {
+    "youtube.com": {"si"},
+    "m.youtube.com": {"si"},
+    "music.youtube.com": {"si"},
+    "youtu.be": {"si"},
+    "open.spotify.com": {"si"},
+}
+
+# 短链接展开结果缓存：短链接指向的地址不会改变，长期缓存，重复的短链接不再发出请求
+# 首次展开短链接时才创建，导入模块时不创建数据库文件
+_short_link_cache = None
+_short_link_cache_lock = threading.Lock()
+
+
+def _normalize_host(host):
+    host = (host or "").lower().rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    return host
+
+
+def is_twitter_host(host):
+    host = _normalize_host(host)
+    return host in TWITTER_HOSTS or host.startswith("nitter.")
+
+
+def extract_tweet_id(url):
+    """从 Twitter/X（含镜像）链接中提取推文ID，不是推文链接时返回 None"""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return None
+    if not is_twitter_host(parts.hostname):
+        return None
+    match = TWEET_PATH_PATTERN.match(parts.path)
+    return match.group(1) if match else None
+
+
+def canonicalize_url(url):
+    """规范化链接，用于判断是否重复
+
+    - 推文链接统一为 https://x.com/i/status/<推文ID>
+    - 其他链接：小写域名、去掉 www、默认端口、片段和跟踪参数，查询参数排序，去掉末尾斜杠
+    - t.co 短链接需要先用 resolve_short_url 展开，否则只做基本规范化
+    """
+    if not url:
+        return url
+    url = url.strip()
+
+    tweet_id = extract_tweet_id(url)
+    if tweet_id:
+        return f"https://x.com/i/status/{tweet_id}"
+
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url
+    if not parts.scheme or not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower()
+    host = _normalize_host(parts.hostname)
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    host_params = HOST_TRACKING_PARAMS.get(host, ())
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and key.lower() not in host_params
+        and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    # http 与 https 视为同一链接
+    if scheme == "http":
+        scheme = "https"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+def get_short_link_cache(create=True):
+    """返回短链接缓存，未启用缓存时返回 None；create=False 时不创建尚未使用的缓存"""
+    global _short_link_cache
+    if not TWEET_CACHE_ENABLED:
+        return None
+    with _short_link_cache_lock:
+        if _short_link_cache is None and create:
+            _short_link_cache = SQLiteCache(
+                TWEET_CACHE_PATH,
+                "short_links",
+                ttl=SHORT_LINK_CACHE_TTL,
+                max_entries=SHORT_LINK_CACHE_MAX_ENTRIES
+            )
+        return _short_link_cache
+
+
+def is_short_link(url):
+    try:
+        return _normalize_host(urlsplit(url.strip()).hostname) in SHORT_LINK_HOSTS
+    except ValueError:
+        return False
+
+
+def resolve_short_url(url, timeout=10):
+    """展开 t.co 等短链接（阻塞网络请求，结果缓存在短链接缓存中），失败时返回原链接"""
+    if not is_short_link(url):
+        return url
+    key = url.strip()
+    short_link_cache = get_short_link_cache()
+    if short_link_cache is not None:
+        cached = short_link_cache.get(key)
+        if cached:
+            return cached
+    try:
+        response = requests.head(url, allow_redirects=True, timeout=timeout)
+    except Exception as e:
+        logger.warning(f"展开短链接失败: {str(e)}")
+        return url
+    resolved = response.url or url
+    if short_link_cache is not None and resolved != url:
+        short_link_cache.set(key, resolved)
+    return resolved
+
+
+class SeenUrlIndex:
+    """已保存链接的内存索引：规范化链接 -> {"id", "title"}
+
+    从 Notion 全量同步一次后即可在本地判断链接是否重复，
+    新增和删除条目时由 NotionManager 同步更新。可在多个线程中使用。
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._page_urls = {}
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def lookup(self, url):
+        """查找链接对应的已保存条目"""
+        canonical = canonicalize_url(url)
+        with self._lock:
+            return self._entries.get(canonical)
+
+    def add(self, url, page_id, title=None):
+        """记录一个已保存的链接；条目的链接改变时移除旧链接"""
+        if not url or not page_id:
+            return
+        canonical = canonicalize_url(url)
+        with self._lock:
+            _add(self._entries, self._page_urls, canonical, page_id, title)
+
+    def remove_page(self, page_id):
+        """条目被删除时移除对应链接"""
+        with self._lock:
+            canonical = self._page_urls.pop(page_id, None)
+            if canonical and self._entries.get(canonical, {}).get("id") == page_id:
+                del self._entries[canonical]
+
+    def load(self, entries):
+        """用全量条目列表 [{"id", "title", "url"}] 重建索引（建好后整体替换）"""
+        entries_by_url = {}
+        page_urls = {}
+        for entry in entries:
+            if entry.get("url") and entry.get("id"):
+                _add(entries_by_url, page_urls, canonicalize_url(entry["url"]), entry["id"], entry.get("title"))
+        with self._lock:
+            self._entries = entries_by_url
+            self._page_urls = page_urls
+        self.ready = True
+        logger.info(f"已保存链接索引已同步: {len(entries_by_url)} 条")
+
+
+def _add(entries, page_urls, canonical, page_id, title):
+    previous = page_urls.get(page_id)
+    if previous and previous != canonical and entries.get(previous, {}).get("id") == page_id:
+        del entries[previous]
+    entries[canonical] = {"id": page_id, "title": title}
+    page_urls[page_id] = canonical
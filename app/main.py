@@ -1,5 +1,8 @@
+import asyncio
+import functools
 import logging
 import re
+from datetime import date
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, BotCommand
 from telegram.ext import (
     Application,
@@ -10,9 +13,26 @@ from telegram.ext import (
     filters
 )
 
-from app.config import TELEGRAM_BOT_TOKEN
+from app.config import TELEGRAM_BOT_TOKEN, SEARCH_INDEX_ENABLED
 from app.core.content_processor import ContentProcessor
+from app.core.pipeline import (
+    LinkPipeline,
+    STATUS_SAVED,
+    STATUS_DUPLICATE,
+    STATUS_ERROR
+)
+from app.core.job_queue import IngestQueue, JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED
+from app.core.url_index import get_short_link_cache
 from app.services.notion_service import NotionManager
+from app.services.notion_transport import notion_priority
+from app.common.rate_limiter import PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, PRIORITY_NAMES
+from app.services.notion_filters import EntryFilter, TAG_MODE_ALL, TAG_MODE_ANY, SORT_OPTIONS, DATE_PRESETS
+
+# Twitter API 模块依赖 tweepy（可选）
+try:
+    from app.services.twitter_service import twitter_api
+except ImportError:
+    twitter_api = None
 
 def escape_markdown(text):
     """转义 Telegram Markdown V1 特殊字符"""
@@ -31,10 +51,20 @@ logger = logging.getLogger(__name__)
 # 初始化处理器
 content_processor = ContentProcessor()
 notion_manager = NotionManager()
+link_pipeline = LinkPipeline(content_processor, notion_manager)
+ingest_queue = IngestQueue()
+# 后台定期同步 Notion 本地副本的任务
+notion_sync_task = None
 
 # 状态选项
 STATUS_OPTIONS = ["未处理", "进行中", "已完成", "已放弃"]
 
+# 搜索结果每页条目数
+SEARCH_PAGE_SIZE = 8
+
+# 高级筛选中"是/否/不限"类条件的切换顺序
+FILTER_BOOL_CYCLE = [None, True, False]
+
 # 今日是否打卡选项
 CHECK_IN_OPTIONS = ["是", "否"]
 
@@ -46,6 +76,7 @@ MAIN_MENU_OPTIONS = [
     {"text": "📝 添加新内容", "callback": "menu_add_content"},
     {"text": "🏷️ 查看标签", "callback": "menu_tags"},
     {"text": "🔍 搜索内容", "callback": "menu_search"},
+    {"text": "🔎 高级筛选", "callback": "menu_filter"},
     {"text": "📊 最近添加", "callback": "menu_recent"},
     {"text": "✅ 打卡管理", "callback": "menu_checkin"},
     {"text": "⚙️ 设置", "callback": "menu_settings"},
@@ -68,6 +99,8 @@ HELP_MESSAGE = """
 /checkcount - 查看打卡次数
 /recent - 显示最近添加的条目
 /search - 搜索条目
+/filter - 按标签、状态、时间等组合筛选条目
+/stats - 查看运行统计
 
 *基本使用:*
 1. 使用 /menu 命令打开主菜单，选择需要的功能
@@ -77,11 +110,21 @@ HELP_MESSAGE = """
 
 *提示:*
 - 链接处理可能需要几秒钟时间
+- 一条消息中包含多个链接时会同时处理，进度汇总在同一条消息中
+- 链接会进入后台处理队列，机器人重启后未完成的任务会自动继续
 - 您可以随时添加新标签或删除条目
 - 摘要内容将自动从链接中提取
 - 主菜单提供所有功能的快捷入口
 """
 
+def interactive(handler):
+    """用户操作触发的 Notion 请求优先于后台处理队列和同步任务"""
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        with notion_priority(PRIORITY_INTERACTIVE):
+            return await handler(update, context)
+    return wrapper
+
 async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """显示主菜单"""
     # 创建主菜单按钮 - 使用ReplyKeyboardMarkup代替InlineKeyboardMarkup
@@ -136,112 +179,482 @@ async def my_menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """处理 /mymenu 命令，"我的菜单"的快捷方式"""
     await show_main_menu(update, context)
 
-async def process_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """处理消息中的链接"""
-    # 检测链接
-    url_pattern = r'https?://\S+'
-    message_text = update.message.text
-    urls = re.findall(url_pattern, message_text)
+def _tag_keyboard(tag_counts):
+    """标签筛选按钮（每行两个），按钮上显示各标签的条目数量"""
+    keyboard = []
+    for i in range(0, len(tag_counts), 2):
+        keyboard.append([
+            InlineKeyboardButton(f"{tag} ({count})", callback_data=f"filter_tag:{tag}")
+            for tag, count in tag_counts[i:i + 2]
+        ])
+    return keyboard
+
+async def _render_search_page(keyword, page):
+    """渲染一页搜索结果，返回 (消息文本, 按钮)；没有结果时按钮为 None"""
+    result = await notion_manager.search_entries_async(
+        keyword,
+        offset=page * SEARCH_PAGE_SIZE,
+        limit=SEARCH_PAGE_SIZE
+    )
+    escaped_keyword = escape_markdown(keyword)
+    if not result["entries"]:
+        return f"没有找到包含 '{escaped_keyword}' 的条目。", None
     
-    if not urls:
-        await update.message.reply_text("请发送有效的URL链接。")
-        return
+    if result["total"] is not None:
+        total_pages = (result["total"] + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+        message_text = f"*搜索 '{escaped_keyword}' 的结果:* 共 {result['total']} 条，第 {page + 1}/{total_pages} 页\n\n"
+    else:
+        # 服务端筛选时总数未知
+        message_text = f"*搜索 '{escaped_keyword}' 的结果:* 第 {page + 1} 页\n\n"
     
-    # 处理第一个检测到的链接
-    url = urls[0]
+    keyboard = []
+    for entry in result["entries"]:
+        title = escape_markdown(entry["title"] or "无标题")
+        status = escape_markdown(entry["status"] or "未知状态")
+        
+        # 添加条目信息
+        message_text += f"• *{title}* ({status})\n"
+        
+        # 为每个条目添加一个按钮
+        keyboard.append([InlineKeyboardButton(
+            f"{title[:20]}...",
+            callback_data=f"show_entry:{entry['id']}"
+        )])
     
-    # 告知用户正在处理
-    processing_message = await update.message.reply_text(
-        f"正在处理链接: {url}\n这可能需要一点时间，请稍候..."
+    # 翻页按钮
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f"search_page:{page - 1}"))
+    if result["has_more"]:
+        navigation.append(InlineKeyboardButton("下一页 ➡️", callback_data=f"search_page:{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+    return message_text, InlineKeyboardMarkup(keyboard)
+
+def _get_entry_filter(context):
+    """当前用户正在编辑的筛选条件"""
+    entry_filter = context.user_data.get("entry_filter")
+    if entry_filter is None:
+        entry_filter = EntryFilter()
+        context.user_data["entry_filter"] = entry_filter
+    return entry_filter
+
+def _next_option(options, current):
+    """在选项列表中切换到下一个值"""
+    index = options.index(current) if current in options else -1
+    return options[(index + 1) % len(options)]
+
+def _bool_label(value):
+    return "不限" if value is None else ("是" if value else "否")
+
+def _render_filter_panel(entry_filter):
+    """渲染高级筛选面板，返回 (消息文本, 按钮)"""
+    if entry_filter.date_preset:
+        date_label = DATE_PRESETS[entry_filter.date_preset][0]
+    elif entry_filter.added_after or entry_filter.added_before:
+        date_label = "自定义"
+    else:
+        date_label = "不限"
+    mode_label = "全部满足" if entry_filter.tag_mode == TAG_MODE_ALL else "任一满足"
+    keyboard = [
+        [InlineKeyboardButton(f"🏷️ 标签 ({len(entry_filter.tags)})", callback_data="fl_tags"),
+         InlineKeyboardButton(f"标签关系: {mode_label}", callback_data="fl_mode")],
+        [InlineKeyboardButton(f"状态: {entry_filter.status or '不限'}", callback_data="fl_status"),
+         InlineKeyboardButton(f"提醒: {_bool_label(entry_filter.reminder)}", callback_data="fl_reminder")],
+        [InlineKeyboardButton(f"今日打卡: {_bool_label(entry_filter.check_in)}", callback_data="fl_checkin"),
+         InlineKeyboardButton(f"添加时间: {date_label}", callback_data="fl_date")],
+        [InlineKeyboardButton(f"排序: {SORT_OPTIONS[entry_filter.sort][0]}", callback_data="fl_sort"),
+         InlineKeyboardButton("📅 自定义时间", callback_data="fl_date_input")],
+        [InlineKeyboardButton("🔍 查看结果", callback_data="fl_run:0"),
+         InlineKeyboardButton("重置", callback_data="fl_reset")]
+    ]
+    message_text = (
+        "*高级筛选*\n\n"
+        f"{escape_markdown(entry_filter.describe())}\n\n"
+        "点击按钮修改筛选条件，然后查看结果。"
+    )
+    return message_text, InlineKeyboardMarkup(keyboard)
+
+async def _render_filter_tags(entry_filter):
+    """渲染标签多选列表，已选中的标签带 ✅"""
+    tag_counts = await notion_manager.get_tag_counts_async()
+    buttons = [
+        InlineKeyboardButton(
+            f"{'✅ ' if tag in entry_filter.tags else ''}{tag} ({count})",
+            callback_data=f"fl_tag:{tag}"
+        )
+        for tag, count in tag_counts
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([InlineKeyboardButton("完成", callback_data="fl_panel")])
+    message_text = "*选择标签*\n\n点击标签选中或取消，可以选择多个标签。"
+    if not tag_counts:
+        message_text = "目前没有可用的标签。"
+    return message_text, InlineKeyboardMarkup(keyboard)
+
+async def _render_filter_results(entry_filter, page):
+    """渲染一页筛选结果，返回 (消息文本, 按钮)"""
+    result = await notion_manager.query_entries_async(
+        entry_filter,
+        offset=page * SEARCH_PAGE_SIZE,
+        limit=SEARCH_PAGE_SIZE
     )
+    back_button = [InlineKeyboardButton("修改筛选", callback_data="fl_panel")]
+    if not result["entries"]:
+        return "没有符合条件的条目。", InlineKeyboardMarkup([back_button])
     
-    try:
-        # 处理链接内容
-        processed_data = content_processor.process_link(url)
-        
-        # 检查处理结果是否包含错误相关关键词或特殊错误标记
-        has_error = False
-        error_keywords = ["API请求超时", "处理超时", "连接失败", "处理失败", "无法获取"]
+    if result["total"] is not None:
+        total_pages = (result["total"] + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+        message_text = f"*筛选结果:* 共 {result['total']} 条，第 {page + 1}/{total_pages} 页\n\n"
+    else:
+        # 服务端筛选时总数未知
+        message_text = f"*筛选结果:* 第 {page + 1} 页\n\n"
+    
+    keyboard = []
+    for entry in result["entries"]:
+        title = escape_markdown(entry["title"] or "无标题")
+        status = escape_markdown(entry["status"] or "未知状态")
+        message_text += f"• *{title}* ({status})\n"
+        keyboard.append([InlineKeyboardButton(
+            f"{title[:20]}...",
+            callback_data=f"show_entry:{entry['id']}"
+        )])
+    
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ 上一页", callback_data=f"fl_run:{page - 1}"))
+    if result["has_more"]:
+        navigation.append(InlineKeyboardButton("下一页 ➡️", callback_data=f"fl_run:{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+    keyboard.append(back_button)
+    return message_text, InlineKeyboardMarkup(keyboard)
+
+async def _handle_filter_callback(query, context, data):
+    """处理高级筛选面板上的按钮"""
+    action = data[0]
+    entry_filter = _get_entry_filter(context)
+    
+    if action == "fl_tags":
+        message_text, reply_markup = await _render_filter_tags(entry_filter)
+    elif action == "fl_tag" and len(data) > 1:
+        # 标签名中可能包含冒号
+        entry_filter.toggle_tag(":".join(data[1:]))
+        message_text, reply_markup = await _render_filter_tags(entry_filter)
+    elif action == "fl_run":
+        page = int(data[1]) if len(data) > 1 else 0
+        message_text, reply_markup = await _render_filter_results(entry_filter, page)
+    elif action == "fl_date_input":
+        context.user_data["expecting_filter_dates"] = True
+        message_text = (
+            "请输入添加时间范围，格式: 2024-01-01~2024-03-31\n"
+            "任一端可以留空，例如 2024-01-01~ 表示该日期之后"
+        )
+        reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("返回", callback_data="fl_panel")]])
+    else:
+        if action == "fl_mode":
+            entry_filter.tag_mode = TAG_MODE_ANY if entry_filter.tag_mode == TAG_MODE_ALL else TAG_MODE_ALL
+        elif action == "fl_status":
+            entry_filter.status = _next_option([None] + STATUS_OPTIONS, entry_filter.status)
+        elif action == "fl_reminder":
+            entry_filter.reminder = _next_option(FILTER_BOOL_CYCLE, entry_filter.reminder)
+        elif action == "fl_checkin":
+            entry_filter.check_in = _next_option(FILTER_BOOL_CYCLE, entry_filter.check_in)
+        elif action == "fl_date":
+            entry_filter.set_date_preset(_next_option([None] + list(DATE_PRESETS), entry_filter.date_preset))
+        elif action == "fl_sort":
+            entry_filter.sort = _next_option(list(SORT_OPTIONS), entry_filter.sort)
+        elif action == "fl_reset":
+            entry_filter = EntryFilter()
+            context.user_data["entry_filter"] = entry_filter
+        context.user_data["expecting_filter_dates"] = False
+        message_text, reply_markup = _render_filter_panel(entry_filter)
+    
+    await query.edit_message_text(
+        message_text,
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+def _parse_date_range(text):
+    """解析 "开始~结束" 格式的日期范围，返回 (开始, 结束) ISO 字符串，格式错误时抛出 ValueError"""
+    if "~" not in text:
+        raise ValueError("缺少分隔符 ~")
+    start, end = (part.strip() for part in text.split("~", 1))
+    start = date.fromisoformat(start).isoformat() if start else None
+    end = date.fromisoformat(end).isoformat() if end else None
+    if start and end and start > end:
+        raise ValueError("开始日期晚于结束日期")
+    return start, end
+
+def _entry_action_keyboard(page_id):
+    """新保存条目的后续操作按钮"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("更改状态", callback_data=f"status:{page_id}")],
+        [InlineKeyboardButton("添加标签", callback_data=f"add_tag:{page_id}")],
+        [InlineKeyboardButton("删除", callback_data=f"delete:{page_id}")]
+    ])
+
+async def _render_link_result(edit_text, result):
+    """将单个链接的处理结果更新到状态消息中，edit_text 为编辑消息的协程函数"""
+    processed_data = result.get("data") or {}
+
+    if result["status"] == STATUS_DUPLICATE:
+        existing = result["existing"]
+        title_existing = escape_markdown(existing.get('title') or '无标题')
+        url_existing = processed_data.get('original_url') or result["url"]
+        keyboard = [[InlineKeyboardButton("查看已存在的条目", callback_data=f"show_entry:{existing['id']}")]]
+        await edit_text(
+            f"ℹ️ 该链接已存在，不重复添加。\n\n*标题:* {title_existing}\n*链接:* {url_existing}",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode='Markdown'
+        )
+        return
+
+    if result["status"] == STATUS_SAVED:
+        # 构建响应消息
+        title = escape_markdown(processed_data['title'])
+        tags = escape_markdown(', '.join(processed_data['tags']))
+        source = escape_markdown(processed_data['source'])
+        summary = escape_markdown(processed_data['summary'][:200])
         
-        # 检查标题、摘要和标签中是否包含错误关键词
-        if any(keyword in processed_data.get('title', '') for keyword in error_keywords) or \
-           any(keyword in processed_data.get('summary', '') for keyword in error_keywords) or \
-           any(error_tag in processed_data.get('tags', []) for error_tag in ["API超时", "处理错误", "连接错误", "访问失败"]):
-            has_error = True
+        response = (
+            f"✅ 内容已成功保存到Notion!\n\n"
+            f"*标题:* {title}\n"
+            f"*标签:* {tags}\n"
+            f"*来源:* {source}\n\n"
+            f"*摘要:*\n{summary}...\n"
+        )
         
-        # 特别检查关键点中是否包含明确的错误信息
-        key_points = processed_data.get('key_points', [])
-        if key_points and any("错误" in point or "失败" in point or "API" in point for point in key_points):
-            has_error = True
-            
-        if has_error:
-            # 如果处理过程出现错误，不保存到Notion，直接显示错误信息
-            error_summary = escape_markdown(processed_data.get('summary', '处理过程中出现错误'))
-            error_message = (
-                f"❌ 处理链接时遇到问题，内容未保存到Notion\n\n"
-                f"*原因:* {error_summary}\n\n"
-                f"请稍后再试，或尝试其他链接。"
+        # 更新或发送新消息，附带后续操作按钮
+        await edit_text(
+            response,
+            reply_markup=_entry_action_keyboard(result['page_id']),
+            parse_mode='Markdown'
+        )
+        return
+
+    error_msg = escape_markdown(result.get('error') or '处理过程中出现错误')
+    if result.get("page_id"):
+        # 两阶段保存：页面已创建，只是分析结果未能写入
+        await edit_text(
+            f"⚠️ 链接已保存到Notion，但内容分析失败\n\n"
+            f"*原因:* {error_msg}\n\n"
+            f"条目状态保持为'处理中'，可以稍后手动补充摘要和标签。",
+            reply_markup=_entry_action_keyboard(result['page_id']),
+            parse_mode='Markdown'
+        )
+    elif result.get("error_stage") == "save":
+        await edit_text(
+            f"❌ 保存到Notion时出错: {error_msg}\n\n请稍后再试。"
+        )
+    else:
+        # 如果处理过程出现错误，不保存到Notion，直接显示错误信息
+        await edit_text(
+            f"❌ 处理链接时遇到问题，内容未保存到Notion\n\n"
+            f"*原因:* {error_msg}\n\n"
+            f"请稍后再试，或尝试其他链接。",
+            parse_mode='Markdown'
+        )
+
+# 队列任务状态的显示文本
+JOB_STATE_TEXT = {
+    JOB_PENDING: "⏳ 排队中",
+    JOB_RUNNING: "🤖 处理中",
+}
+
+# 多链接汇总消息的最小编辑间隔（秒），避免触发 Telegram 限流
+BATCH_EDIT_INTERVAL = 1.5
+_batch_last_edit = {}
+
+# 流式分析过程中更新状态消息的最小间隔（秒）
+STREAM_EDIT_INTERVAL = 1.5
+
+def _format_job_ids(jobs):
+    """格式化任务ID，例如 #3 或 #3-#10"""
+    ids = [job["id"] for job in jobs]
+    return f"#{ids[0]}" if len(ids) == 1 else f"#{ids[0]}-#{ids[-1]}"
+
+def _format_batch_status(jobs):
+    """生成多链接处理的汇总状态消息（纯文本）和操作按钮"""
+    finished = sum(1 for job in jobs if job["status"] in (JOB_DONE, JOB_FAILED))
+    header = (f"正在处理 {len(jobs)} 个链接 ({finished}/{len(jobs)} 已完成)" if finished < len(jobs)
+              else f"{len(jobs)} 个链接已处理完成")
+    lines = [f"{header}\n任务 {_format_job_ids(jobs)}"]
+    keyboard = []
+    for index, job in enumerate(jobs, start=1):
+        url = job["url"]
+        result = job.get("result") or {}
+        data = result.get("data") or {}
+        if job["status"] == JOB_DONE and result.get("status") == STATUS_SAVED:
+            lines.append(f"{index}. ✅ {data.get('title') or url}")
+            keyboard.append([InlineKeyboardButton(f"{index}. 查看条目", callback_data=f"show_entry:{result['page_id']}")])
+        elif job["status"] == JOB_DONE and result.get("status") == STATUS_DUPLICATE:
+            existing = result["existing"]
+            lines.append(f"{index}. ℹ️ 已存在: {existing.get('title') or url}")
+            keyboard.append([InlineKeyboardButton(f"{index}. 查看已存在的条目", callback_data=f"show_entry:{existing['id']}")])
+        elif job["status"] == JOB_FAILED and result.get("page_id"):
+            reason = (job.get("last_error") or "处理失败")[:100]
+            lines.append(f"{index}. ⚠️ 已保存，分析失败: {data.get('title') or url}\n    原因: {reason}")
+            keyboard.append([InlineKeyboardButton(f"{index}. 查看条目", callback_data=f"show_entry:{result['page_id']}")])
+        elif job["status"] == JOB_FAILED:
+            reason = (job.get("last_error") or "处理失败")[:100]
+            lines.append(f"{index}. ❌ {url}\n    原因: {reason}")
+        elif result.get("draft"):
+            lines.append(f"{index}. 📝 已保存，分析中: {data.get('title') or url}")
+            keyboard.append([InlineKeyboardButton(f"{index}. 查看条目", callback_data=f"show_entry:{result['page_id']}")])
+        elif job["status"] == JOB_PENDING and job["attempts"] > 0:
+            lines.append(f"{index}. 🔁 等待重试 (已尝试{job['attempts']}次) {url}")
+        else:
+            lines.append(f"{index}. {JOB_STATE_TEXT.get(job['status'], '⏳ 处理中')} {url}")
+    return "\n".join(lines), (InlineKeyboardMarkup(keyboard) if keyboard else None)
+
+async def _report_jobs(bot, chat_id, message_id):
+    """根据队列中的任务状态更新对应的状态消息"""
+    jobs = ingest_queue.get_message_jobs(chat_id, message_id)
+    if not jobs:
+        return
+    edit_text = functools.partial(bot.edit_message_text, chat_id=chat_id, message_id=message_id)
+
+    if len(jobs) == 1:
+        job = jobs[0]
+        if job["status"] == JOB_DONE or job["status"] == JOB_FAILED:
+            result = job.get("result") or {"url": job["url"], "status": STATUS_ERROR}
+            if job["status"] == JOB_FAILED:
+                result["error"] = job.get("last_error") or result.get("error")
+            await _render_link_result(edit_text, result)
+        elif job["status"] == JOB_PENDING and job["attempts"] > 0:
+            reason = escape_markdown(job.get("last_error") or "未知错误")
+            draft = (job.get("result") or {}).get("draft")
+            await edit_text(
+                f"🔁 {'链接已保存到Notion，分析' if draft else '处理链接'}暂时失败，将自动重试 "
+                f"(任务 #{job['id']}, 已尝试{job['attempts']}次)\n\n"
+                f"*原因:* {reason}",
+                parse_mode='Markdown',
+                reply_markup=_entry_action_keyboard(job["result"]["page_id"]) if draft else None
             )
-            await processing_message.edit_text(error_message, parse_mode='Markdown')
-            return
-        
-        # 内容处理成功，先检查是否已存在相同链接
-        existing = notion_manager.find_entry_by_link(processed_data.get('original_url'))
-        if existing:
-            title_existing = escape_markdown(existing.get('title') or '无标题')
-            url_existing = processed_data.get('original_url')
-            keyboard = [[InlineKeyboardButton("查看已存在的条目", callback_data=f"show_entry:{existing['id']}")]]
-            await processing_message.edit_text(
-                f"ℹ️ 该链接已存在，不重复添加。\n\n*标题:* {title_existing}\n*链接:* {url_existing}",
-                reply_markup=InlineKeyboardMarkup(keyboard),
+        elif job["status"] == JOB_RUNNING and (job.get("result") or {}).get("draft"):
+            # 两阶段保存：页面已创建，分析结果稍后补充
+            title = escape_markdown((job["result"].get("data") or {}).get("title") or job["url"])
+            await edit_text(
+                f"✅ 链接已保存到Notion，正在后台分析内容...\n\n*标题:* {title}",
+                reply_markup=_entry_action_keyboard(job["result"]["page_id"]),
                 parse_mode='Markdown'
             )
-            return
-        
-        # 未重复，保存到Notion
-        result = notion_manager.add_content_to_database(processed_data)
-        
-        if result["success"]:
-            # 构建响应消息
-            title = escape_markdown(processed_data['title'])
-            tags = escape_markdown(', '.join(processed_data['tags']))
-            source = escape_markdown(processed_data['source'])
-            summary = escape_markdown(processed_data['summary'][:200])
-            
-            response = (
-                f"✅ 内容已成功保存到Notion!\n\n"
-                f"*标题:* {title}\n"
-                f"*标签:* {tags}\n"
-                f"*来源:* {source}\n\n"
-                f"*摘要:*\n{summary}...\n"
-            )
-            
-            # 创建内联键盘用于后续操作
-            keyboard = [
-                [InlineKeyboardButton("更改状态", callback_data=f"status:{result['page_id']}")],
-                [InlineKeyboardButton("添加标签", callback_data=f"add_tag:{result['page_id']}")],
-                [InlineKeyboardButton("删除", callback_data=f"delete:{result['page_id']}")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # 更新或发送新消息
-            await processing_message.edit_text(
-                response,
-                reply_markup=reply_markup,
+        return
+
+    # 多个链接：节流编辑，全部完成时一定更新
+    all_finished = all(job["status"] in (JOB_DONE, JOB_FAILED) for job in jobs)
+    now = asyncio.get_running_loop().time()
+    key = (chat_id, message_id)
+    if not all_finished and now - _batch_last_edit.get(key, 0.0) < BATCH_EDIT_INTERVAL:
+        return
+    _batch_last_edit[key] = now
+    if all_finished:
+        _batch_last_edit.pop(key, None)
+    text, reply_markup = _format_batch_status(jobs)
+    await edit_text(text, reply_markup=reply_markup)
+
+def _partial_result_editor(bot, job, get_draft):
+    """单链接任务在 DeepSeek 流式输出过程中更新状态消息
+
+    返回 (on_partial, close)：on_partial(fields) 记录新生成的字段并按 STREAM_EDIT_INTERVAL 节流编辑，
+    最后一次修改总会在间隔结束后写入；close() 取消尚未执行的编辑，在最终结果回报前调用
+    """
+    fields = {}
+    state = {"last_edit": 0.0, "task": None}
+    edit_text = functools.partial(bot.edit_message_text, chat_id=job["chat_id"], message_id=job["message_id"])
+
+    async def flush(delay):
+        await asyncio.sleep(delay)
+        state["task"] = None
+        state["last_edit"] = asyncio.get_running_loop().time()
+        draft = get_draft()
+        header = "✅ 链接已保存到Notion，正在分析内容..." if draft else "🤖 正在分析内容..."
+        lines = [header]
+        if fields.get("title"):
+            lines.append(f"\n*标题:* {escape_markdown(fields['title'])}")
+        if fields.get("summary"):
+            lines.append(f"\n*摘要:*\n{escape_markdown(fields['summary'][:200])}...")
+        try:
+            await edit_text(
+                "\n".join(lines),
+                reply_markup=_entry_action_keyboard(draft["page_id"]) if draft else None,
                 parse_mode='Markdown'
             )
-        else:
-            error_msg = escape_markdown(result.get('error', '未知错误'))
-            await processing_message.edit_text(
-                f"❌ 保存到Notion时出错: {error_msg}\n\n请稍后再试。"
-            )
+        except Exception as e:
+            logger.debug(f"更新流式分析进度失败: {str(e)}")
+
+    def on_partial(completed):
+        if not any(field in completed for field in ("title", "summary")):
+            return
+        fields.update(completed)
+        if state["task"] is None:
+            now = asyncio.get_running_loop().time()
+            delay = max(0.0, state["last_edit"] + STREAM_EDIT_INTERVAL - now)
+            state["task"] = asyncio.create_task(flush(delay))
+
+    async def close():
+        task = state["task"]
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    return on_partial, close
+
+async def _run_ingest_job(job, bot=None):
+    """队列 worker 执行的任务：抓取 -> 分析 -> 去重 -> 保存
+
+    两阶段保存时，已创建的页面作为中间结果保存在任务中，重试时只补充分析结果；
+    单链接消息在 DeepSeek 流式输出时逐步显示标题和摘要
+    """
+    previous = job.get("result") or {}
+    draft = previous if previous.get("draft") and previous.get("page_id") else None
+    state = {"draft": draft}
+
+    async def on_draft(result):
+        state["draft"] = result
+        await ingest_queue.checkpoint(job, result)
+
+    on_partial, close_editor = None, None
+    if bot is not None and job["chat_id"] and job["message_id"] and \
+            len(ingest_queue.get_message_jobs(job["chat_id"], job["message_id"])) == 1:
+        on_partial, close_editor = _partial_result_editor(bot, job, lambda: state["draft"])
+
+    try:
+        with notion_priority(PRIORITY_BACKGROUND):
+            return await link_pipeline.process(job["url"], draft=draft, on_draft=on_draft, on_partial=on_partial)
+    finally:
+        if close_editor:
+            await close_editor()
+
+async def process_link(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """处理消息中的链接：加入持久化处理队列，由后台 worker 处理"""
+    # 检测链接（去重并保持顺序）
+    url_pattern = r'https?://\S+'
+    message_text = update.message.text
+    urls = list(dict.fromkeys(re.findall(url_pattern, message_text)))
     
-    except Exception as e:
-        logger.error(f"处理链接时出错: {str(e)}")
-        error_msg = escape_markdown(str(e))
-        await processing_message.edit_text(
-            f"❌ 处理链接时出错: {error_msg}\n\n请稍后再试。"
-        )
+    if not urls:
+        await update.message.reply_text("请发送有效的URL链接。")
+        return
+    
+    # 先入队再回复，确保进程重启也不会丢失链接
+    job_ids = ingest_queue.enqueue(urls)
+    if len(urls) > 1 and twitter_api is not None:
+        # 批量导入：推文合并为批量查询预取到缓存，worker 逐条处理时直接命中
+        asyncio.get_running_loop().run_in_executor(None, twitter_api.prefetch_tweets, urls)
+    if len(urls) == 1:
+        text = f"已加入处理队列 (任务 #{job_ids[0]})\n正在处理链接: {urls[0]}\n这可能需要一点时间，请稍候..."
+    else:
+        text = f"已加入处理队列 (任务 #{job_ids[0]}-#{job_ids[-1]})\n正在处理 {len(urls)} 个链接，请稍候..."
+    processing_message = await update.message.reply_text(text)
+    
+    ingest_queue.attach_message(job_ids, processing_message.chat_id, processing_message.message_id)
+    # worker 可能在关联消息之前就已完成任务，此时补发一次结果
+    jobs = ingest_queue.get_message_jobs(processing_message.chat_id, processing_message.message_id)
+    if any(job["status"] in (JOB_DONE, JOB_FAILED) for job in jobs):
+        await _report_jobs(context.bot, processing_message.chat_id, processing_message.message_id)
 
 async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """处理按钮回调查询"""
@@ -266,7 +679,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif action == "set_status" and len(data) > 2:
         # 设置新状态
         status = data[2]
-        result = notion_manager.update_entry_status(page_id, status)
+        result = await notion_manager.update_entry_status_async(page_id, status)
         
         if result["success"]:
             # 恢复原始按钮
@@ -315,12 +728,12 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     elif action == "confirm_delete" and page_id:
         # 执行删除操作
-        result = notion_manager.delete_entry(page_id)
+        result = await notion_manager.delete_entry_async(page_id)
         
         if result["success"]:
             # 若用户来自“最近添加”视图，则删除后返回该列表
             if context.user_data.get("last_view") == "recent":
-                entries = notion_manager.get_entries_with_details(limit=5)
+                entries = await notion_manager.get_entries_with_details_async(limit=5)
                 if not entries:
                     await query.edit_message_text(
                         "*最近添加*\n\n目前没有任何条目。",
@@ -374,15 +787,16 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         is_checked_in = status_value == "是"
         
         # 更新打卡状态
-        result = notion_manager.update_check_in_status(page_id, status_value)
+        result = await notion_manager.update_check_in_status_async(page_id, status_value)
         
         if result["success"] and is_checked_in:
             # 如果标记为已打卡，增加计数
-            count_result = notion_manager.increment_check_in_count(page_id)
+            count_result = await notion_manager.increment_check_in_count_async(page_id)
             
             if count_result["success"]:
+                count_text = "打卡次数已增加!" if count_result["added"] else "今日已打过卡，打卡次数不变"
                 await query.edit_message_text(
-                    f"{query.message.text}\n\n*今日打卡状态已更新为:* {status_value}\n*打卡次数已增加!*",
+                    f"{query.message.text}\n\n*今日打卡状态已更新为:* {status_value}\n*{count_text}* (共 {count_result['check_in_count']} 次)",
                     reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("返回", callback_data=f"show_entry:{page_id}")]]),
                     parse_mode='Markdown'
                 )
@@ -422,7 +836,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     elif action == "update_reminder" and page_id:
         # 更新提醒状态
         reminder_value = data[2] == "True" if len(data) > 2 else False
-        result = notion_manager.update_reminder_status(page_id, reminder_value)
+        result = await notion_manager.update_reminder_status_async(page_id, reminder_value)
         
         if result["success"]:
             await query.edit_message_text(
@@ -449,7 +863,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         
         # 获取带有该标签的条目
-        entries = notion_manager.get_entries_with_details(tag=tag)
+        entries = await notion_manager.get_entries_with_details_async(tag=tag)
         
         if not entries:
             await query.edit_message_text(
@@ -490,8 +904,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         entry_id = page_id  # 重命名更清晰
         
         # 获取条目详细信息
-        entries = notion_manager.get_entries_with_details()
-        entry = next((e for e in entries if e["id"] == entry_id), None)
+        entry = await notion_manager.get_entry_async(entry_id)
         
         if not entry:
             await query.edit_message_text(
@@ -511,6 +924,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         reminder = entry.get("reminder", False)
         check_in_status = escape_markdown(entry.get("check_in_status", "否"))
         check_in_count = entry.get("check_in_count", 0)
+        check_in_stats = await notion_manager.get_check_in_stats_async(entry_id)
         
         message_text = (
             f"*{title}*\n\n"
@@ -521,6 +935,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             f"*是否提醒:* {'是' if reminder else '否'}\n"
             f"*今日是否打卡:* {check_in_status}\n"
             f"*打卡次数:* {check_in_count}\n"
+            f"*连续打卡:* {check_in_stats['streak']} 天\n"
         )
         
         # 添加操作按钮
@@ -540,6 +955,23 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             parse_mode='Markdown'
         )
     
+    elif action == "search_page" and page_id:
+        # 搜索结果翻页
+        keyword = context.user_data.get("search_keyword")
+        if not keyword:
+            await query.edit_message_text("搜索已过期，请重新搜索。")
+            return
+        message_text, reply_markup = await _render_search_page(keyword, int(page_id))
+        await query.edit_message_text(
+            message_text,
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
+    
+    elif action.startswith("fl_"):
+        # 高级筛选面板
+        await _handle_filter_callback(query, context, data)
+    
     elif action == "create_new_tag":
         # 准备创建新标签
         context.user_data["creating_new_tag"] = True
@@ -551,23 +983,17 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     elif action == "back_to_tags":
         # 返回标签列表
-        all_tags = notion_manager.get_all_tags()
+        tag_counts = await notion_manager.get_tag_counts_async(include_unused=True)
         
-        if not all_tags:
+        if not tag_counts:
             await query.edit_message_text(
                 "目前没有可用的标签。",
                 parse_mode='Markdown'
             )
             return
         
-        # 创建标签按钮
-        keyboard = []
-        row = []
-        for i, tag in enumerate(all_tags):
-            row.append(InlineKeyboardButton(tag, callback_data=f"filter_tag:{tag}"))
-            if len(row) == 2 or i == len(all_tags) - 1:
-                keyboard.append(row)
-                row = []
+        # 创建标签按钮（附带条目数量）
+        keyboard = _tag_keyboard(tag_counts)
         
         # 添加创建新标签的选项
         keyboard.append([InlineKeyboardButton("➕ 创建新标签", callback_data="create_new_tag")])
@@ -590,9 +1016,9 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     elif action == "menu_tags":
         # 获取所有标签并显示
-        all_tags = notion_manager.get_all_tags()
+        tag_counts = await notion_manager.get_tag_counts_async(include_unused=True)
         
-        if not all_tags:
+        if not tag_counts:
             await query.edit_message_text(
                 "*标签列表*\n\n"
                 "目前没有可用的标签。\n\n"
@@ -607,14 +1033,8 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 parse_mode='Markdown'
             )
         else:
-            # 创建标签按钮
-            keyboard = []
-            row = []
-            for i, tag in enumerate(all_tags):
-                row.append(InlineKeyboardButton(tag, callback_data=f"filter_tag:{tag}"))
-                if len(row) == 2 or i == len(all_tags) - 1:
-                    keyboard.append(row)
-                    row = []
+            # 创建标签按钮（附带条目数量）
+            keyboard = _tag_keyboard(tag_counts)
             
             keyboard.append([InlineKeyboardButton("➕ 创建新标签", callback_data="create_new_tag")])
             keyboard.append([InlineKeyboardButton("返回主菜单", callback_data="back_to_menu")])
@@ -637,11 +1057,19 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         # 设置期望关键词输入
         context.user_data["expecting_search"] = True
     
+    elif action == "menu_filter":
+        message_text, reply_markup = _render_filter_panel(_get_entry_filter(context))
+        await query.edit_message_text(
+            message_text,
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
+    
     elif action == "menu_recent":
         # 获取最近添加的条目
         # 记录最近视图，用于删除等操作后返回
         context.user_data["last_view"] = "recent"
-        entries = notion_manager.get_entries_with_details(limit=5)
+        entries = await notion_manager.get_entries_with_details_async(limit=5)
         
         if not entries:
             await query.edit_message_text(
@@ -682,7 +1110,7 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     elif action == "menu_checkin":
         # 获取需要打卡的条目
-        entries = notion_manager.get_reminder_entries()
+        entries = await notion_manager.get_reminder_entries_async()
         
         if not entries:
             await query.edit_message_text(
@@ -795,9 +1223,9 @@ async def process_tag_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
             )
         elif callback_data == "menu_tags":
             # 获取所有标签
-            all_tags = notion_manager.get_all_tags()
+            tag_counts = await notion_manager.get_tag_counts_async(include_unused=True)
             
-            if not all_tags:
+            if not tag_counts:
                 await update.message.reply_text(
                     "*标签列表*\n\n"
                     "目前没有可用的标签。\n\n"
@@ -811,14 +1239,8 @@ async def process_tag_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
                     parse_mode='Markdown'
                 )
             else:
-                # 创建标签按钮
-                keyboard = []
-                row = []
-                for i, tag in enumerate(all_tags):
-                    row.append(InlineKeyboardButton(tag, callback_data=f"filter_tag:{tag}"))
-                    if len(row) == 2 or i == len(all_tags) - 1:
-                        keyboard.append(row)
-                        row = []
+                # 创建标签按钮（附带条目数量）
+                keyboard = _tag_keyboard(tag_counts)
                 
                 keyboard.append([InlineKeyboardButton("➕ 创建新标签", callback_data="create_new_tag")])
                 
@@ -837,9 +1259,11 @@ async def process_tag_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
             
             # 设置期望关键词输入
             context.user_data["expecting_search"] = True
+        elif callback_data == "menu_filter":
+            await show_filter_panel(update, context)
         elif callback_data == "menu_recent":
             # 获取最近添加的条目
-            entries = notion_manager.get_entries_with_details(limit=5)
+            entries = await notion_manager.get_entries_with_details_async(limit=5)
             
             if not entries:
                 await update.message.reply_text(
@@ -878,7 +1302,7 @@ async def process_tag_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 )
         elif callback_data == "menu_checkin":
             # 获取需要打卡的条目
-            entries = notion_manager.get_reminder_entries()
+            entries = await notion_manager.get_reminder_entries_async()
             
             if not entries:
                 await update.message.reply_text(
@@ -947,7 +1371,7 @@ async def process_tag_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         if page_id and tag:
             # 添加标签
-            result = notion_manager.add_tag_to_entry(page_id, tag)
+            result = await notion_manager.add_tag_to_entry_async(page_id, tag)
             
             if result["success"]:
                 await update.message.reply_text(
@@ -1011,56 +1435,41 @@ async def process_tag_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
             parse_mode='Markdown'
         )
         
-        # 这里我们需要一个搜索功能，但当前的API不直接支持
-        # 作为替代，我们获取所有条目并进行本地搜索
-        entries = notion_manager.get_entries_with_details(limit=20)
+        # 搜索第一页结果，关键词保存下来供翻页使用
+        context.user_data["search_keyword"] = keyword
+        message_text, reply_markup = await _render_search_page(keyword, 0)
         
-        # 过滤包含关键词的条目
-        filtered_entries = []
-        for entry in entries:
-            title = entry["title"] or ""
-            summary = entry["summary"] or ""
-            if keyword.lower() in title.lower() or keyword.lower() in summary.lower():
-                filtered_entries.append(entry)
+        await loading_message.edit_text(
+            message_text,
+            reply_markup=reply_markup,
+            parse_mode='Markdown'
+        )
         
-        if not filtered_entries:
-            escaped_keyword = escape_markdown(keyword)
-            await loading_message.edit_text(
-                f"没有找到包含 '{escaped_keyword}' 的条目。",
+        # 重置状态
+        context.user_data["expecting_search"] = False
+    
+    # 检查是否期望高级筛选的时间范围
+    elif context.user_data.get("expecting_filter_dates", False):
+        try:
+            added_after, added_before = _parse_date_range(message_text)
+        except ValueError:
+            await update.message.reply_text(
+                "❌ 时间格式不正确，请按 2024-01-01~2024-03-31 的格式重新输入。",
                 parse_mode='Markdown'
             )
-            # 重置状态
-            context.user_data["expecting_search"] = False
             return
         
-        # 创建条目列表
-        escaped_keyword = escape_markdown(keyword)
-        message_text = f"*搜索 '{escaped_keyword}' 的结果:*\n\n"
-        
-        keyboard = []
-        for entry in filtered_entries:
-            title = escape_markdown(entry["title"] or "无标题")
-            status = escape_markdown(entry["status"] or "未知状态")
-            entry_id = entry["id"]
-            
-            # 添加条目信息
-            message_text += f"• *{title}* ({status})\n"
-            
-            # 为每个条目添加一个按钮
-            keyboard.append([InlineKeyboardButton(
-                f"{title[:20]}...", 
-                callback_data=f"show_entry:{entry_id}"
-            )])
+        entry_filter = _get_entry_filter(context)
+        entry_filter.set_date_range(added_after, added_before)
+        context.user_data["expecting_filter_dates"] = False
         
-        await loading_message.edit_text(
+        message_text, reply_markup = _render_filter_panel(entry_filter)
+        await update.message.reply_text(
             message_text,
-            reply_markup=InlineKeyboardMarkup(keyboard),
+            reply_markup=reply_markup,
             parse_mode='Markdown'
         )
         
-        # 重置状态
-        context.user_data["expecting_search"] = False
-        
     else:
         # 如果不是期望的标签输入或搜索关键词，则检查是否是链接
         if re.search(r'https?://\S+', message_text):
@@ -1071,10 +1480,10 @@ async def list_tags(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # 告知用户正在加载
     loading_message = await update.message.reply_text("正在加载标签列表...")
     
-    # 从Notion数据库获取所有唯一标签
-    all_tags = notion_manager.get_all_tags()
+    # 获取所有标签及条目数量（来自内存中的标签索引），包括数据库中已定义但尚未使用的标签
+    tag_counts = await notion_manager.get_tag_counts_async(include_unused=True)
     
-    if not all_tags:
+    if not tag_counts:
         # 如果没有标签，提供一个创建标签的选项
         await loading_message.edit_text(
             "目前没有可用的标签。\n\n"
@@ -1092,14 +1501,8 @@ async def list_tags(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         )
         return
     
-    # 创建标签按钮
-    keyboard = []
-    row = []
-    for i, tag in enumerate(all_tags):
-        row.append(InlineKeyboardButton(tag, callback_data=f"filter_tag:{tag}"))
-        if len(row) == 2 or i == len(all_tags) - 1:
-            keyboard.append(row)
-            row = []
+    # 创建标签按钮（附带条目数量）
+    keyboard = _tag_keyboard(tag_counts)
     
     # 添加创建新标签的选项
     keyboard.append([InlineKeyboardButton("➕ 创建新标签", callback_data="create_new_tag")])
@@ -1131,7 +1534,7 @@ async def show_recent_entries(update: Update, context: ContextTypes.DEFAULT_TYPE
     context.user_data["last_view"] = "recent"
 
     # 获取最近添加的条目
-    entries = notion_manager.get_entries_with_details(limit=5)
+    entries = await notion_manager.get_entries_with_details_async(limit=5)
     
     if not entries:
         await loading_message.edit_text("目前没有任何条目。")
@@ -1165,11 +1568,10 @@ async def set_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         await update.message.reply_text("请先选择一个条目后再设置提醒。", parse_mode='Markdown')
         return
     # 获取当前提醒状态
-    entries = notion_manager.get_entries_with_details(limit=1)
-    entry = next((e for e in entries if e["id"] == page_id), None)
+    entry = await notion_manager.get_entry_async(page_id)
     current_status = entry.get("reminder", False) if entry else False
     new_status = not current_status
-    result = notion_manager.update_reminder_status(page_id, new_status)
+    result = await notion_manager.update_reminder_status_async(page_id, new_status)
     if result.get("success"):
         await update.message.reply_text(f"提醒状态已{'开启' if new_status else '关闭'}。", parse_mode='Markdown')
     else:
@@ -1183,10 +1585,13 @@ async def check_in(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         await update.message.reply_text("请先选择一个条目后再打卡。", parse_mode='Markdown')
         return
     # 标记今日打卡
-    result = notion_manager.update_check_in_status(page_id, True)
+    result = await notion_manager.update_check_in_status_async(page_id, True)
     if result.get("success"):
-        notion_manager.increment_check_in_count(page_id)
-        await update.message.reply_text("今日打卡成功！已为该条目增加一次打卡计数。", parse_mode='Markdown')
+        count_result = await notion_manager.increment_check_in_count_async(page_id)
+        if count_result.get("success") and not count_result["added"]:
+            await update.message.reply_text(f"今日已打过卡，当前打卡次数：{count_result['check_in_count']}", parse_mode='Markdown')
+        else:
+            await update.message.reply_text("今日打卡成功！已为该条目增加一次打卡计数。", parse_mode='Markdown')
     else:
         error_msg = escape_markdown(result.get('error', '未知错误'))
         await update.message.reply_text(f"打卡失败: {error_msg}", parse_mode='Markdown')
@@ -1197,11 +1602,14 @@ async def check_count(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     if not page_id:
         await update.message.reply_text("请先选择一个条目后再查看打卡次数。", parse_mode='Markdown')
         return
-    # 获取打卡次数
-    entries = notion_manager.get_entries_with_details(limit=1)
-    entry = next((e for e in entries if e["id"] == page_id), None)
-    count = entry.get("check_in_count", 0) if entry else 0
-    await update.message.reply_text(f"当前条目打卡次数：{count}", parse_mode='Markdown')
+    # 打卡次数和连续打卡统计来自本地打卡日志
+    stats = await notion_manager.get_check_in_stats_async(page_id)
+    await update.message.reply_text(
+        f"当前条目打卡次数：{stats['count']}\n"
+        f"连续打卡：{stats['streak']} 天（最长 {stats['longest_streak']} 天）\n"
+        f"近30天打卡：{stats['last_30_days']} 天\n"
+        f"最近打卡：{stats['last_day'] or '无'}"
+    )
 
 async def search_entries(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """搜索条目"""
@@ -1213,6 +1621,122 @@ async def search_entries(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # 设置期望关键词输入
     context.user_data["expecting_search"] = True
 
+async def show_filter_panel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """显示高级筛选面板，筛选条件在会话中保留"""
+    message_text, reply_markup = _render_filter_panel(_get_entry_filter(context))
+    await update.message.reply_text(
+        message_text,
+        reply_markup=reply_markup,
+        parse_mode='Markdown'
+    )
+
+# 推文数据源健康状态的显示文本
+PROVIDER_STATE_TEXT = {
+    "healthy": "正常",
+    "cooldown": "冷却中",
+    "rate_limited": "限流中",
+}
+
+async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """显示运行统计：处理队列、分析缓存、本地副本等"""
+    lines = ["📈 运行统计", ""]
+
+    queue_stats = ingest_queue.stats()
+    lines.append(
+        f"处理队列: 待处理 {queue_stats.get(JOB_PENDING, 0)}, 处理中 {queue_stats.get(JOB_RUNNING, 0)}, "
+        f"已完成 {queue_stats.get(JOB_DONE, 0)}, 失败 {queue_stats.get(JOB_FAILED, 0)}, "
+        f"死信 {queue_stats.get('dead_letters', 0)}"
+    )
+
+    if content_processor.llm_cache:
+        cache_stats = content_processor.llm_cache.stats()
+        lines.append(
+            f"分析缓存: {cache_stats['size']}/{cache_stats['max_entries']} 条, "
+            f"命中 {cache_stats['hits']}, 未命中 {cache_stats['misses']}, "
+            f"命中率 {cache_stats['hit_rate']:.0%}"
+        )
+    else:
+        lines.append("分析缓存: 未启用")
+
+    llm_stats = content_processor.llm_client.stats()
+    breaker_text = {"closed": "正常", "open": f"熔断中 ({llm_stats['breaker_retry_in']:.0f}秒后探测)", "half_open": "探测中"}
+    lines.append(
+        f"DeepSeek: {breaker_text[llm_stats['breaker_state']]}, 请求 {llm_stats['requests']}, 失败 {llm_stats['failures']} "
+        f"(超时 {llm_stats['timeouts']}), 重试 {llm_stats['retries']}, 熔断拒绝 {llm_stats['rejected']}"
+    )
+    for bucket, latency in llm_stats["latency"].items():
+        size = f"≤{bucket}字" if bucket else "更长"
+        lines.append(
+            f"  提示词{size}: p50 {latency['p50']:.1f}秒, p95 {latency['p95']:.1f}秒, 超时 {latency['timeout']:.0f}秒"
+        )
+
+    for label, cache in (
+        ("推文缓存", twitter_api.tweet_cache if twitter_api is not None else None),
+        ("短链接缓存", get_short_link_cache(create=False))
+    ):
+        if cache is None:
+            continue
+        cache_stats = cache.stats()
+        lines.append(
+            f"{label}: {cache_stats['size']}/{cache_stats['max_entries']} 条, "
+            f"命中 {cache_stats['hits']}, 命中率 {cache_stats['hit_rate']:.0%}"
+        )
+
+    if twitter_api is not None:
+        tweet_stats = twitter_api.fetcher.stats()
+        lines.append(f"推文获取: 请求 {tweet_stats['requests']}, 对冲 {tweet_stats['hedges']}, 全部失败 {tweet_stats['failed']}")
+        if twitter_api.batcher is not None:
+            batch_stats = twitter_api.batcher.stats()
+            lines.append(
+                f"  批量查询: {batch_stats['batches']} 次, 共 {batch_stats['requested']} 条推文, "
+                f"平均每批 {batch_stats['average_size']:.1f} 条, 失败 {batch_stats['failed_batches']} 次"
+            )
+        if tweet_stats["order"]:
+            lines.append(f"  当前顺序: {' > '.join(tweet_stats['order'])}")
+        for name, provider in tweet_stats["providers"].items():
+            health = provider["health"]
+            p50 = f"{provider['p50']:.1f}秒" if provider["p50"] is not None else "-"
+            state = PROVIDER_STATE_TEXT.get(health["state"], health["state"])
+            if health["unavailable_for"]:
+                state += f" ({health['unavailable_for']:.0f}秒)"
+            quota = f", 剩余配额 {health['quota_remaining']:.0f}" if health["quota_remaining"] is not None else ""
+            lines.append(
+                f"  {name}: {state}, 评分 {health['score']:.1f}, 成功率 {health['success_rate']:.0%}, "
+                f"成功 {provider['success']}, 失败 {provider['failure']}, 限流 {provider['rate_limited']}, "
+                f"p50 {p50}, 对冲延迟 {provider['hedge_delay']:.1f}秒{quota}"
+            )
+
+    if notion_manager.replica is not None:
+        replica_state = "已同步" if notion_manager.replica.ready else "同步中"
+        lines.append(f"本地副本: {notion_manager.replica.count()} 条 ({replica_state})")
+    else:
+        lines.append("本地副本: 未启用")
+    lines.append(f"已保存链接索引: {len(notion_manager.url_index)} 条")
+    if not SEARCH_INDEX_ENABLED:
+        lines.append("搜索索引: 未启用 (Notion 服务端筛选)")
+    else:
+        lines.append(f"搜索索引: {len(notion_manager.search_index)} 条" if notion_manager.search_index.ready else "搜索索引: 建立中")
+    entry_stats = notion_manager.entry_cache.stats()
+    lines.append(f"条目缓存: {entry_stats['size']} 条, 命中率 {entry_stats['hit_rate']:.0%}")
+    if notion_manager.write_buffer is not None:
+        buffer_stats = notion_manager.write_buffer.stats()
+        lines.append(
+            f"写入缓冲: 待写 {buffer_stats['pending']} 个条目, 修改 {buffer_stats['queued']} 次, "
+            f"合并写入 {buffer_stats['writes']} 次, 冲突 {buffer_stats['conflicts']}, 失败 {buffer_stats['failed']}"
+        )
+    limiter_stats = notion_manager.transport.rate_limiter.stats()
+    lines.append(
+        f"Notion 限流: 每秒 {limiter_stats['rate']:g} 次, 429 {limiter_stats['throttled']} 次, "
+        f"最长等待 {limiter_stats['max_wait']:.1f}秒"
+    )
+    for priority, name in PRIORITY_NAMES.items():
+        lines.append(
+            f"  {name}: 排队 {limiter_stats['queue_depth'][priority]}, 已发出 {limiter_stats['granted'][priority]}, "
+            f"平均等待 {limiter_stats['avg_wait'][priority]:.2f}秒"
+        )
+
+    await update.message.reply_text("\n".join(lines))
+
 async def setup_commands(application) -> None:
     """设置命令菜单，这将在Telegram客户端的输入框左侧显示菜单按钮"""
     commands = [
@@ -1226,7 +1750,9 @@ async def setup_commands(application) -> None:
         BotCommand("checkin", "标记今日是否完成打卡"),
         BotCommand("checkcount", "查看打卡次数"),
         BotCommand("recent", "显示最近添加的条目"),
-        BotCommand("search", "搜索条目")
+        BotCommand("search", "搜索条目"),
+        BotCommand("filter", "组合筛选条目"),
+        BotCommand("stats", "查看运行统计")
     ]
     
     try:
@@ -1235,10 +1761,40 @@ async def setup_commands(application) -> None:
     except Exception as e:
         logger.error(f"设置命令菜单失败: {str(e)}")
 
+async def _sync_notion_periodically():
+    """启动时及之后定期从 Notion 同步本地副本和已保存链接索引，覆盖在其他客户端中的修改"""
+    while True:
+        with notion_priority(PRIORITY_BACKGROUND):
+            await notion_manager.sync_async()
+        await asyncio.sleep(notion_manager.sync_interval)
+
 async def post_init(application: Application) -> None:
     """应用初始化后运行的函数"""
+    global notion_sync_task
     await setup_commands(application)
 
+    # 同步本地副本和已保存链接索引；首次同步完成前读操作和去重会回退到直接查询 Notion
+    notion_sync_task = asyncio.create_task(_sync_notion_periodically())
+
+    # 启动处理队列 worker，并恢复上次中断的任务
+    async def on_job_update(job):
+        if job and job["chat_id"] and job["message_id"]:
+            await _report_jobs(application.bot, job["chat_id"], job["message_id"])
+
+    await ingest_queue.start(functools.partial(_run_ingest_job, bot=application.bot), on_complete=on_job_update)
+
+async def post_shutdown(application: Application) -> None:
+    """应用关闭后运行的函数"""
+    if notion_sync_task:
+        notion_sync_task.cancel()
+    await ingest_queue.stop()
+    ingest_queue.close()
+    content_processor.shutdown()
+    if twitter_api is not None:
+        twitter_api.shutdown()
+    await content_processor.llm_client.aclose()
+    await notion_manager.aclose()
+
 def main() -> None:
     """启动机器人"""
     # 创建应用实例 - 确保TOKEN不为None
@@ -1249,26 +1805,29 @@ def main() -> None:
     application = Application.builder().token(token).build()
 
     # 添加处理程序
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("menu", menu_command))  # 添加菜单命令
-    application.add_handler(CommandHandler("mymenu", my_menu_command))  # 添加"我的菜单"命令
-    application.add_handler(CommandHandler("tags", list_tags))
-    application.add_handler(CommandHandler("status", handle_status_command))
-    application.add_handler(CommandHandler("recent", show_recent_entries))
-    application.add_handler(CommandHandler("reminder", set_reminder))
-    application.add_handler(CommandHandler("checkin", check_in))
-    application.add_handler(CommandHandler("checkcount", check_count))
-    application.add_handler(CommandHandler("search", search_entries))
+    application.add_handler(CommandHandler("start", interactive(start)))
+    application.add_handler(CommandHandler("help", interactive(help_command)))
+    application.add_handler(CommandHandler("menu", interactive(menu_command)))  # 添加菜单命令
+    application.add_handler(CommandHandler("mymenu", interactive(my_menu_command)))  # 添加"我的菜单"命令
+    application.add_handler(CommandHandler("tags", interactive(list_tags)))
+    application.add_handler(CommandHandler("status", interactive(handle_status_command)))
+    application.add_handler(CommandHandler("recent", interactive(show_recent_entries)))
+    application.add_handler(CommandHandler("reminder", interactive(set_reminder)))
+    application.add_handler(CommandHandler("checkin", interactive(check_in)))
+    application.add_handler(CommandHandler("checkcount", interactive(check_count)))
+    application.add_handler(CommandHandler("search", interactive(search_entries)))
+    application.add_handler(CommandHandler("filter", interactive(show_filter_panel)))
+    application.add_handler(CommandHandler("stats", interactive(show_stats)))
     
     # 处理回调查询
-    application.add_handler(CallbackQueryHandler(handle_callback))
+    application.add_handler(CallbackQueryHandler(interactive(handle_callback)))
     
     # 处理消息（包括菜单选择和其他文本消息）
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, process_tag_input))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, interactive(process_tag_input)))
 
     # 启动机器人，并在启动后设置命令菜单
     application.post_init = post_init
+    application.post_shutdown = post_shutdown
     
     # 记录日志
     logger.info("正在启动机器人，将设置命令菜单...")
@@ -0,0 +1,384 @@
+"""
+DeepSeek 异步客户端 - 基于 httpx 的连接池客户端
+失败重试使用全抖动（full jitter）指数退避；连续失败达到阈值后熔断，冷却期内直接失败，
+冷却结束后先发送探测请求，成功才恢复；单次请求的超时按提示词长度分档、根据最近的延迟分位数自适应
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+import httpx
+from app.common.aio import background_loop
+from app.config import (
+    DEEPSEEK_API_TIMEOUT,
+    DEEPSEEK_API_MAX_RETRIES,
+    DEEPSEEK_API_RETRY_DELAY,
+    DEEPSEEK_TIMEOUT_MIN,
+    DEEPSEEK_TIMEOUT_MULTIPLIER,
+    DEEPSEEK_BREAKER_THRESHOLD,
+    DEEPSEEK_BREAKER_COOLDOWN
+)
+
+logger = logging.getLogger(__name__)
+
+DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
+
+# 退避等待的上限（秒）
+MAX_BACKOFF = 60.0
+# 提示词长度分档（字符数上限），同一档内的请求共享延迟统计
+PROMPT_SIZE_BUCKETS = (2000, 5000, 10000, 20000)
+# 每档保留的最近延迟样本数，以及开始使用自适应超时所需的最少样本数
+LATENCY_WINDOW = 50
+LATENCY_MIN_SAMPLES = 5
+# 自适应超时参考的延迟分位数
+TIMEOUT_PERCENTILE = 0.95
+# 熔断状态
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class LLMError(Exception):
+    """DeepSeek 请求失败；attempts 为放弃前实际发出的请求次数（熔断时可能为 0）"""
+
+    attempts = 0
+
+
+class LLMTimeoutError(LLMError):
+    """DeepSeek 请求超时"""
+
+    def __init__(self, message, timeout):
+        super().__init__(message)
+        self.timeout = timeout
+
+
+class LLMConnectionError(LLMError):
+    """无法连接到 DeepSeek 或服务端出错"""
+
+
+class CircuitOpenError(LLMConnectionError):
+    """熔断中，请求未发出"""
+
+    def __init__(self, message, retry_in):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
+
+
+class CircuitBreaker:
+    """熔断器：连续失败 threshold 次后打开，cooldown 秒后进入半开状态，由一次探测决定恢复或继续熔断
+
+    冷却时间在每次探测失败后加倍（最长 MAX_BACKOFF 的 10 倍）。只在后台事件循环中使用。
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._current_cooldown = cooldown
+        self._open_until = 0.0
+        self._probe = None
+
+    def retry_in(self):
+        return max(0.0, self._open_until - time.monotonic())
+
+    async def before_request(self, probe):
+        """请求前检查熔断状态；熔断中抛出 CircuitOpenError，冷却结束时由一个调用方执行 probe() 探测"""
+        if self.state == BREAKER_CLOSED:
+            return
+        if self.state == BREAKER_OPEN and time.monotonic() < self._open_until:
+            raise CircuitOpenError(f"DeepSeek API 暂时不可用（熔断中），{self.retry_in():.0f}秒后恢复尝试", self.retry_in())
+
+        if self._probe is None:
+            self.state = BREAKER_HALF_OPEN
+            self._probe = asyncio.ensure_future(probe())
+        # 其他请求等待同一次探测的结果
+        probe_task = self._probe
+        try:
+            ok = await asyncio.shield(probe_task)
+        finally:
+            if self._probe is probe_task and probe_task.done():
+                self._probe = None
+        if ok:
+            if self.state != BREAKER_CLOSED:
+                logger.info("DeepSeek API 探测成功，熔断已恢复")
+            self.record_success()
+            return
+        if self.state == BREAKER_HALF_OPEN:
+            self._current_cooldown = min(self._current_cooldown * 2, MAX_BACKOFF * 10)
+            self._open(f"探测失败，熔断 {self._current_cooldown:.0f}秒")
+        raise CircuitOpenError(f"DeepSeek API 暂时不可用（熔断中），{self.retry_in():.0f}秒后恢复尝试", self.retry_in())
+
+    def record_success(self):
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self._current_cooldown = self.cooldown
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == BREAKER_CLOSED and self.failures >= self.threshold:
+            self._open(f"连续失败 {self.failures} 次，熔断 {self._current_cooldown:.0f}秒")
+
+    def _open(self, reason):
+        self.state = BREAKER_OPEN
+        self.opened += 1
+        self._open_until = time.monotonic() + self._current_cooldown
+        logger.warning(f"DeepSeek API {reason}")
+
+
+class DeepSeekClient:
+    """DeepSeek chat completions 异步客户端
+
+    - complete(payload, on_delta=None): 返回模型输出的文本；提供 on_delta(text) 时以流式模式请求，
+      每收到一段输出就调用一次（在后台事件循环线程中），重试前以 on_delta(None) 通知丢弃已收到的输出
+    - check_connection(): 发送极小的请求检查 API 是否可用，返回 (是否可用, 说明)
+    请求在共享的后台事件循环中执行，可在任意事件循环中 await，同步代码使用 run_sync()。
+    """
+
+    def __init__(self, api_key, model="deepseek-chat", endpoint=DEEPSEEK_API_URL,
+                 max_timeout=DEEPSEEK_API_TIMEOUT, max_attempts=DEEPSEEK_API_MAX_RETRIES,
+                 retry_base_delay=DEEPSEEK_API_RETRY_DELAY):
+        self.api_key = api_key
+        self.model = model
+        self.endpoint = endpoint
+        self.max_timeout = max_timeout
+        self.min_timeout = min(DEEPSEEK_TIMEOUT_MIN, max_timeout)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.breaker = CircuitBreaker(DEEPSEEK_BREAKER_THRESHOLD, DEEPSEEK_BREAKER_COOLDOWN)
+
+        self._loop = background_loop
+        self._client = None
+        self._latencies = {bucket: deque(maxlen=LATENCY_WINDOW) for bucket in self._buckets()}
+
+        # 统计信息
+        self.requests = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.rejected = 0
+
+    def _get_client(self):
+        """获取（必要时创建）连接池客户端，只能在后台事件循环中调用"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {self.api_key}"
+                },
+                timeout=self.max_timeout,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=10, keepalive_expiry=60)
+            )
+        return self._client
+
+    # ---------------- 自适应超时 ----------------
+
+    @staticmethod
+    def _buckets():
+        return PROMPT_SIZE_BUCKETS + (None,)
+
+    @staticmethod
+    def _bucket_for(size):
+        for bucket in PROMPT_SIZE_BUCKETS:
+            if size <= bucket:
+                return bucket
+        return None
+
+    def timeout_for(self, size):
+        """按提示词长度所在分档的延迟分位数计算超时；样本不足时使用 DEEPSEEK_API_TIMEOUT"""
+        samples = self._latencies[self._bucket_for(size)]
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return self.max_timeout
+        timeout = _percentile(samples, TIMEOUT_PERCENTILE) * DEEPSEEK_TIMEOUT_MULTIPLIER
+        return min(self.max_timeout, max(self.min_timeout, timeout))
+
+    @staticmethod
+    def _prompt_size(payload):
+        return sum(len(message.get("content") or "") for message in payload.get("messages", []))
+
+    # ---------------- 请求 ----------------
+
+    async def complete(self, payload, on_delta=None):
+        """发送 chat completions 请求（带重试和熔断），返回模型输出的文本内容"""
+        return await self._loop.submit(self._complete(payload, on_delta))
+
+    def run_sync(self, coro):
+        """同步执行协程（供线程池中的同步代码使用）"""
+        return self._loop.run_sync(coro)
+
+    async def _complete(self, payload, on_delta):
+        size = self._prompt_size(payload)
+        bucket = self._bucket_for(size)
+        last_error = None
+        for attempt in range(self.max_attempts):
+            if attempt > 0:
+                # 全抖动退避：第 n 次重试在 [0, base * 2^(n-1)] 中随机等待，避免多个请求同时重试
+                delay = random.uniform(0, min(MAX_BACKOFF, self.retry_base_delay * (2 ** (attempt - 1))))
+                self.retries += 1
+                logger.warning(f"DeepSeek API请求失败，{delay:.1f}秒后进行第{attempt}次重试: {str(last_error)}")
+                await asyncio.sleep(delay)
+
+            try:
+                await self.breaker.before_request(self._probe)
+            except CircuitOpenError as e:
+                self.rejected += 1
+                e.attempts = attempt
+                raise
+
+            timeout = self.timeout_for(size)
+            self.requests += 1
+            start = time.monotonic()
+            try:
+                logger.info(f"正在发送请求到DeepSeek API分析内容 (超时 {timeout:.0f}秒){' (重试)' if attempt > 0 else ''}")
+                content = await asyncio.wait_for(self._send(payload, on_delta, timeout), timeout)
+            except (asyncio.TimeoutError, httpx.TimeoutException):
+                # 整体超时（wait_for）和 httpx 的连接/读取超时都按超时处理
+                self.timeouts += 1
+                self.failures += 1
+                self.breaker.record_failure()
+                last_error = LLMTimeoutError(f"DeepSeek API 请求超时 ({timeout:.0f}秒)", timeout)
+                continue
+            except (httpx.TransportError, LLMConnectionError) as e:
+                self.failures += 1
+                self.breaker.record_failure()
+                last_error = e if isinstance(e, LLMConnectionError) else LLMConnectionError(f"DeepSeek API 连接错误: {str(e)}")
+                continue
+            except LLMError as e:
+                # 不可重试的错误（如认证失败）
+                e.attempts = attempt + 1
+                raise
+
+            self._latencies[bucket].append(time.monotonic() - start)
+            self.breaker.record_success()
+            return content
+
+        last_error.attempts = self.max_attempts
+        raise last_error
+
+    async def _send(self, payload, on_delta, timeout):
+        client = self._get_client()
+        if on_delta is None:
+            response = await client.post(self.endpoint, json=payload, timeout=timeout)
+            self._raise_for_status(response)
+            try:
+                result = response.json()
+            except ValueError as e:
+                raise LLMConnectionError(f"DeepSeek 响应格式错误: {str(e)}")
+            return result.get("choices", [{}])[0].get("message", {}).get("content", "{}")
+
+        parts = []
+        on_delta(None)
+        async with client.stream("POST", self.endpoint, json=dict(payload, stream=True), timeout=timeout) as response:
+            if response.status_code != 200:
+                await response.aread()
+                self._raise_for_status(response)
+            async for line in response.aiter_lines():
+                # 每个事件为 "data: {...}"，以 "data: [DONE]" 结束；空行和注释行（心跳）忽略
+                line = line.strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError as e:
+                    raise LLMConnectionError(f"DeepSeek 流式响应格式错误: {str(e)}")
+                delta = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                if not delta:
+                    continue
+                parts.append(delta)
+                try:
+                    on_delta(delta)
+                except Exception as e:
+                    logger.warning(f"处理流式输出失败: {str(e)}")
+        return "".join(parts) or "{}"
+
+    @staticmethod
+    def _raise_for_status(response):
+        """429 和 5xx 视为暂时故障（重试、计入熔断），其他错误直接失败"""
+        if response.status_code == 200:
+            return
+        message = f"DeepSeek API 返回 HTTP {response.status_code}: {response.text[:200]}"
+        if response.status_code == 429 or response.status_code >= 500:
+            raise LLMConnectionError(message)
+        raise LLMError(message)
+
+    # ---------------- 连接检查 ----------------
+
+    async def _probe(self):
+        ok, _ = await self._check_connection()
+        return ok
+
+    async def check_connection(self):
+        """检查 DeepSeek API 连接状态，返回 (是否可用, 说明)"""
+        return await self._loop.submit(self._check_connection())
+
+    async def _check_connection(self):
+        test_payload = {
+            "model": self.model,
+            "messages": [{"role": "user", "content": "Hello"}],
+            "max_tokens": 5
+        }
+        logger.info("正在测试 DeepSeek API 连接...")
+        try:
+            response = await self._get_client().post(self.endpoint, json=test_payload, timeout=10)
+        except httpx.TimeoutException:
+            logger.warning("⚠️ DeepSeek API 连接超时")
+            return False, "API 请求超时"
+        except httpx.TransportError:
+            logger.warning("⚠️ DeepSeek API 连接错误: 无法连接到 API 服务器")
+            return False, "无法连接到 API 服务器"
+        except Exception as e:
+            logger.warning(f"⚠️ DeepSeek API 连接测试出现异常: {str(e)}")
+            return False, f"未知错误: {str(e)}"
+        if response.status_code == 200:
+            logger.info("✅ DeepSeek API 连接正常")
+            return True, "连接正常"
+        error_msg = f"API 返回非200状态码: {response.status_code}"
+        logger.warning(f"⚠️ DeepSeek API 连接测试失败: {error_msg}")
+        return False, error_msg
+
+    # ---------------- 统计与关闭 ----------------
+
+    def stats(self):
+        """返回请求统计、熔断状态和各分档的延迟分位数"""
+        latency = {}
+        for bucket, samples in self._latencies.items():
+            if samples:
+                latency[bucket] = {
+                    "samples": len(samples),
+                    "p50": _percentile(samples, 0.5),
+                    "p95": _percentile(samples, TIMEOUT_PERCENTILE),
+                    "timeout": self.timeout_for(bucket or PROMPT_SIZE_BUCKETS[-1] + 1)
+                }
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+            "breaker_retry_in": self.breaker.retry_in(),
+            "latency": latency
+        }
+
+    async def _aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self._loop.submit(self._aclose())
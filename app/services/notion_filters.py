@@ -0,0 +1,162 @@
+"""
+条目筛选与排序构建器
+同一组筛选条件既可以转换为 Notion 数据库查询的 filter/sorts，也可以转换为本地副本的 SQL 条件
+"""
+
+from datetime import date, timedelta
+
+# 多个标签之间的关系
+TAG_MODE_ALL = "and"
+TAG_MODE_ANY = "or"
+
+# 排序选项: 键 -> (显示名称, Notion 属性, 方向, 本地副本列)
+SORT_OPTIONS = {
+    "added_desc": ("最新添加", "添加时间", "descending", "added_time DESC"),
+    "added_asc": ("最早添加", "添加时间", "ascending", "added_time ASC"),
+    "title_asc": ("按标题", "标题", "ascending", "title ASC"),
+    "check_in_desc": ("打卡次数最多", "打卡次数", "descending", "check_in_count DESC"),
+}
+
+# 添加时间的快捷范围: 键 -> (显示名称, 天数)
+DATE_PRESETS = {
+    "7d": ("近7天", 7),
+    "30d": ("近30天", 30),
+    "90d": ("近90天", 90),
+    "365d": ("近一年", 365),
+}
+
+
+class EntryFilter:
+    """条目筛选条件
+
+    - tags: 标签列表，tag_mode 为 "and" 时需全部包含，为 "or" 时包含任一即可
+    - status: 状态
+    - reminder: 是否提醒 (True/False/None 不限)
+    - check_in: 今日是否打卡 (True/False/None 不限)
+    - added_after / added_before: 添加时间范围，ISO 日期字符串 (YYYY-MM-DD)，包含边界
+    - sort: SORT_OPTIONS 中的键
+    """
+
+    def __init__(self, tags=None, tag_mode=TAG_MODE_ALL, status=None, reminder=None, check_in=None,
+                 added_after=None, added_before=None, sort="added_desc"):
+        self.tags = list(tags or [])
+        self.tag_mode = tag_mode
+        self.status = status
+        self.reminder = reminder
+        self.check_in = check_in
+        self.added_after = added_after
+        self.added_before = added_before
+        # 当前使用的快捷时间范围（DATE_PRESETS 中的键），自定义范围时为 None
+        self.date_preset = None
+        self.sort = sort if sort in SORT_OPTIONS else "added_desc"
+
+    def toggle_tag(self, tag):
+        """选中或取消一个标签"""
+        if tag in self.tags:
+            self.tags.remove(tag)
+        else:
+            self.tags.append(tag)
+
+    def set_date_preset(self, preset):
+        """按快捷范围设置添加时间，preset 为 None 时不限"""
+        self.date_preset = preset
+        if preset is None:
+            self.added_after = self.added_before = None
+            return
+        days = DATE_PRESETS[preset][1]
+        self.added_after = (date.today() - timedelta(days=days)).isoformat()
+        self.added_before = None
+
+    def set_date_range(self, added_after=None, added_before=None):
+        """设置自定义添加时间范围（ISO 日期字符串，包含边界）"""
+        self.date_preset = None
+        self.added_after = added_after
+        self.added_before = added_before
+
+    def is_empty(self):
+        return not (self.tags or self.status or self.reminder is not None or self.check_in is not None
+                    or self.added_after or self.added_before)
+
+    # ---------------- Notion 查询 ----------------
+
+    def to_notion_filter(self):
+        """转换为 Notion 数据库查询的 filter，没有条件时返回 None"""
+        conditions = []
+        if self.tags:
+            tag_conditions = [{"property": "标签", "multi_select": {"contains": tag}} for tag in self.tags]
+            if len(tag_conditions) == 1:
+                conditions.append(tag_conditions[0])
+            else:
+                conditions.append({self.tag_mode: tag_conditions})
+        if self.status:
+            conditions.append({"property": "状态", "status": {"equals": self.status}})
+        if self.reminder is not None:
+            conditions.append({"property": "是否提醒", "checkbox": {"equals": bool(self.reminder)}})
+        if self.check_in is not None:
+            conditions.append({"property": "今日是否打卡", "status": {"equals": "是" if self.check_in else "否"}})
+        if self.added_after:
+            conditions.append({"property": "添加时间", "date": {"on_or_after": self.added_after}})
+        if self.added_before:
+            conditions.append({"property": "添加时间", "date": {"on_or_before": self.added_before}})
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        return {"and": conditions}
+
+    def to_notion_sorts(self):
+        _, prop, direction, _ = SORT_OPTIONS[self.sort]
+        return [{"property": prop, "direction": direction}]
+
+    # ---------------- 本地副本查询 ----------------
+
+    def to_sql(self):
+        """转换为本地副本 pages 表的 (WHERE 子句, 参数, ORDER BY 子句)"""
+        conditions = []
+        params = []
+        if self.tags:
+            if self.tag_mode == TAG_MODE_ANY:
+                placeholders = ", ".join("?" for _ in self.tags)
+                conditions.append(f"id IN (SELECT page_id FROM page_tags WHERE tag IN ({placeholders}))")
+                params.extend(self.tags)
+            else:
+                for tag in self.tags:
+                    conditions.append("id IN (SELECT page_id FROM page_tags WHERE tag = ?)")
+                    params.append(tag)
+        if self.status:
+            conditions.append("status = ?")
+            params.append(self.status)
+        if self.reminder is not None:
+            conditions.append("reminder = ?")
+            params.append(1 if self.reminder else 0)
+        if self.check_in is not None:
+            conditions.append("check_in_status = ?")
+            params.append("是" if self.check_in else "否")
+        if self.added_after:
+            conditions.append("substr(added_time, 1, 10) >= ?")
+            params.append(self.added_after)
+        if self.added_before:
+            conditions.append("substr(added_time, 1, 10) <= ?")
+            params.append(self.added_before)
+        where = " AND ".join(conditions) if conditions else "1 = 1"
+        return where, params, SORT_OPTIONS[self.sort][3]
+
+    # ---------------- 显示 ----------------
+
+    def describe(self):
+        """筛选条件的文字描述"""
+        parts = []
+        if self.tags:
+            joiner = " 且 " if self.tag_mode == TAG_MODE_ALL else " 或 "
+            parts.append(f"标签: {joiner.join(self.tags)}")
+        if self.status:
+            parts.append(f"状态: {self.status}")
+        if self.reminder is not None:
+            parts.append(f"提醒: {'是' if self.reminder else '否'}")
+        if self.check_in is not None:
+            parts.append(f"今日打卡: {'是' if self.check_in else '否'}")
+        if self.added_after or self.added_before:
+            parts.append(f"添加时间: {self.added_after or '不限'} ~ {self.added_before or '不限'}")
+        parts.append(f"排序: {SORT_OPTIONS[self.sort][0]}")
+        return "\n".join(parts)
@@ -0,0 +1,194 @@
+"""
+Notion 数据库的本地只读副本 - 基于本地 SQLite 文件
+按 last_edited_time 增量同步，本机写操作成功后直接写入，读操作在本地完成
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    summary TEXT,
+    status TEXT,
+    tags TEXT NOT NULL DEFAULT '[]',
+    url TEXT,
+    source TEXT,
+    reminder INTEGER NOT NULL DEFAULT 0,
+    check_in_status TEXT,
+    check_in_count INTEGER NOT NULL DEFAULT 0,
+    added_time TEXT,
+    last_edited_time TEXT,
+    key_points TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pages_added_time ON pages (added_time);
+CREATE INDEX IF NOT EXISTS idx_pages_status ON pages (status);
+CREATE INDEX IF NOT EXISTS idx_pages_reminder ON pages (reminder);
+CREATE INDEX IF NOT EXISTS idx_pages_url ON pages (url);
+CREATE TABLE IF NOT EXISTS page_tags (
+    page_id TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (page_id, tag)
+);
+CREATE INDEX IF NOT EXISTS idx_page_tags_tag ON page_tags (tag);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = [
+    "id", "title", "summary", "status", "tags", "url", "source",
+    "reminder", "check_in_status", "check_in_count", "added_time", "last_edited_time", "key_points"
+]
+
+
+class NotionReplica:
+    """Notion 数据库条目的本地副本
+
+    条目为 NotionManager._page_to_entry 解码后的字典；
+    ready 在本进程完成第一次同步后为真，此前读操作应回退到 Notion API。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.ready = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        # 兼容旧版本创建的副本文件
+        existing_columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(pages)")}
+        if "key_points" not in existing_columns:
+            self._conn.execute("ALTER TABLE pages ADD COLUMN key_points TEXT")
+        self._lock = threading.Lock()
+
+    # ---------------- 写入 ----------------
+
+    def upsert(self, entry):
+        """写入或更新一个条目"""
+        self.upsert_many([entry])
+
+    def upsert_many(self, entries):
+        """批量写入或更新条目（单个事务）
+
+        关键点保存在页面正文中，同步得到的条目 key_points 为 None，此时保留已记录的关键点
+        """
+        if not entries:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for entry in entries:
+                tags = entry.get("tags") or []
+                key_points = entry.get("key_points")
+                self._conn.execute(
+                    f"INSERT INTO pages ({', '.join(COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in COLUMNS)}) "
+                    f"ON CONFLICT(id) DO UPDATE SET "
+                    f"{', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:-1])}, "
+                    f"key_points = COALESCE(excluded.key_points, pages.key_points)",
+                    (
+                        entry["id"], entry.get("title"), entry.get("summary"), entry.get("status"),
+                        json.dumps(tags, ensure_ascii=False), entry.get("url"), entry.get("source"),
+                        1 if entry.get("reminder") else 0, entry.get("check_in_status"),
+                        entry.get("check_in_count") or 0, entry.get("added_time"), entry.get("last_edited_time"),
+                        json.dumps(key_points, ensure_ascii=False) if key_points is not None else None
+                    )
+                )
+                self._conn.execute("DELETE FROM page_tags WHERE page_id = ?", (entry["id"],))
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO page_tags (page_id, tag) VALUES (?, ?)",
+                    [(entry["id"], tag) for tag in tags]
+                )
+            self._conn.execute("COMMIT")
+
+    def delete(self, page_id):
+        """删除一个条目"""
+        with self._lock:
+            self._conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+            self._conn.execute("DELETE FROM page_tags WHERE page_id = ?", (page_id,))
+
+    def delete_missing(self, page_ids, edited_before):
+        """全量同步后删除 Notion 中已不存在（已归档）的条目，返回被删除的条目ID列表
+
+        同步期间本机写入的条目不在 page_ids 中，因此只删除最后编辑时间早于 edited_before 的条目
+        """
+        keep = set(page_ids)
+        with self._lock:
+            stale = [
+                row["id"] for row in self._conn.execute("SELECT id, last_edited_time FROM pages")
+                if row["id"] not in keep and (row["last_edited_time"] or "") < edited_before
+            ]
+            self._conn.execute("BEGIN")
+            for page_id in stale:
+                self._conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+                self._conn.execute("DELETE FROM page_tags WHERE page_id = ?", (page_id,))
+            self._conn.execute("COMMIT")
+        return stale
+
+    def get_edited_times(self):
+        """{页面ID: 最后编辑时间}"""
+        with self._lock:
+            rows = self._conn.execute("SELECT id, last_edited_time FROM pages").fetchall()
+        return {row["id"]: row["last_edited_time"] for row in rows}
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ---------------- 读取 ----------------
+
+    def get_entry(self, page_id):
+        """按ID读取条目，不存在返回 None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM pages WHERE id = ?", (page_id,)).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    def get_all_entries(self):
+        """读取全部条目，用于重建索引"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM pages").fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    def filter_entries(self, entry_filter, offset=0, limit=None):
+        """按 EntryFilter 筛选排序，返回 (匹配总数, 当前页条目)"""
+        where, params, order_by = entry_filter.to_sql()
+        sql = f"SELECT * FROM pages WHERE {where} ORDER BY {order_by}, id"
+        page_params = list(params)
+        if limit:
+            sql += " LIMIT ? OFFSET ?"
+            page_params.extend([limit, offset])
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM pages WHERE {where}", params).fetchone()[0]
+            rows = self._conn.execute(sql, page_params).fetchall()
+        return total, [self._row_to_entry(row) for row in rows]
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+    @staticmethod
+    def _row_to_entry(row):
+        entry = dict(row)
+        entry["tags"] = json.loads(entry["tags"]) if entry.get("tags") else []
+        entry["reminder"] = bool(entry["reminder"])
+        entry["key_points"] = json.loads(entry["key_points"]) if entry.get("key_points") else None
+        return entry
@@ -1,158 +1,224 @@
 from notion_client import Client
-import requests
+import asyncio
 import json
 import logging
-from datetime import datetime
-from app.config import NOTION_API_TOKEN, NOTION_DATABASE_ID
+import time
+from datetime import datetime, timezone
+from app.config import (
+    NOTION_API_TOKEN,
+    NOTION_DATABASE_ID,
+    NOTION_REPLICA_ENABLED,
+    NOTION_REPLICA_PATH,
+    NOTION_REPLICA_SYNC_INTERVAL,
+    NOTION_REPLICA_FULL_SYNC_INTERVAL,
+    NOTION_ENTRY_CACHE_SIZE,
+    NOTION_ENTRY_CACHE_TTL,
+    NOTION_QUERY_PAGE_SIZE,
+    NOTION_BULK_CONCURRENCY,
+    NOTION_BULK_MAX_ATTEMPTS,
+    NOTION_WRITE_BEHIND_ENABLED,
+    NOTION_WRITE_BEHIND_DELAY,
+    CHECK_IN_LOG_PATH,
+    SEARCH_INDEX_ENABLED,
+    SEEN_URL_SYNC_INTERVAL
+)
+from app.services.notion_transport import NotionTransport, notion_priority
+from app.services.notion_replica import NotionReplica
+from app.services.notion_filters import EntryFilter
+from app.services.notion_write_buffer import WriteBehindBuffer
+from app.common.ttl_cache import TTLCache
+from app.common.rate_limiter import PRIORITY_BACKGROUND
+from app.core.check_in_log import CheckInLog
+from app.core.url_index import SeenUrlIndex
+from app.core.tag_index import TagIndex
+from app.core.search_index import SearchIndex
 
 logger = logging.getLogger(__name__)
 
+# 两阶段保存时，分析完成前页面的状态
+DRAFT_STATUS = "处理中"
+
+# 批量更新：失败重试的初始延迟（秒，每次加倍）、最多扫描轮数、进度回调的最小间隔（秒）
+BULK_RETRY_BASE_DELAY = 1.0
+BULK_MAX_PASSES = 3
+BULK_PROGRESS_INTERVAL = 2.0
+
 class NotionManager:
-    def __init__(self):
+    def __init__(self, local_state=True):
+        """local_state=False 时不打开本地副本和打卡日志，供调度器等只读取 Notion 的模块使用，
+        避免与机器人的实例同时打开同一批 SQLite 文件（打卡次数此时以 Notion 中的值为准）
+        """
         self.token = NOTION_API_TOKEN
         self.database_id = NOTION_DATABASE_ID
         
-        # 使用直接的请求而不是客户端库
-        self.api_url = "https://api.notion.com/v1"
-        self.headers = {
-            "Authorization": f"Bearer {self.token}",
-            "Content-Type": "application/json",
-            "Notion-Version": "2022-06-28"
-        }
+        # 使用直接的请求而不是客户端库（共享连接池的异步传输层）
+        self.transport = NotionTransport(self.token)
+        
+        # 已保存链接索引，用于在抓取和分析之前本地去重
+        self.url_index = SeenUrlIndex()
+        # 标签索引：标签 -> 条目数量 / 条目ID
+        self.tag_index = TagIndex()
+        # 全文搜索索引
+        self.search_index = SearchIndex()
+        
+        # 数据库本地副本，读操作在同步完成后直接从本地读取
+        self.replica = NotionReplica(NOTION_REPLICA_PATH) if NOTION_REPLICA_ENABLED and local_state else None
+        self._last_full_sync = 0
+        
+        # 单个条目缓存（按页面ID），写操作后失效
+        self.entry_cache = TTLCache(NOTION_ENTRY_CACHE_SIZE, NOTION_ENTRY_CACHE_TTL)
+        
+        # 属性修改写入缓冲：修改立即在本地生效，短时间内的多次修改合并为一次写入
+        self.write_buffer = WriteBehindBuffer(self, NOTION_WRITE_BEHIND_DELAY) if NOTION_WRITE_BEHIND_ENABLED else None
+        
+        # 打卡事件日志：打卡次数以本地日志为准，异步同步到 Notion
+        self.check_in_log = CheckInLog(CHECK_IN_LOG_PATH) if local_state else None
+        self._check_in_sync_tasks = set()
         
         # 检查数据库ID是否有效
         if not self.database_id:
             logger.error("数据库ID不能为空")
             raise ValueError("数据库ID不能为空")
         
-    def add_content_to_database(self, processed_data):
-        """将处理后的内容添加到Notion数据库"""
-        try:
-            # 准备Notion页面属性
-            properties = {
-                "标题": {
-                    "title": [
-                        {
-                            "text": {
-                                "content": processed_data["title"]
-                            }
-                        }
-                    ]
-                },
-                "摘要": {
-                    "rich_text": [
-                        {
-                            "text": {
-                                "content": processed_data["summary"][:2000] if len(processed_data["summary"]) > 2000 else processed_data["summary"]
-                            }
+    def _analysis_properties(self, processed_data):
+        """DeepSeek 分析结果对应的页面属性：标题、摘要、标签、来源"""
+        summary = processed_data["summary"]
+        return {
+            "标题": {
+                "title": [
+                    {
+                        "text": {
+                            "content": processed_data["title"]
                         }
-                    ]
-                },
-                "标签": {
-                    "multi_select": [
-                        {"name": tag} for tag in processed_data["tags"][:2]  # 业务限制：最多2个标签
-                    ]
-                },
-                "来源": {
-                    "url": processed_data["source"]
-                },
-                "链接": {
-                    "url": processed_data["original_url"]
-                },
-                "添加时间": {
-                    "date": {
-                        "start": datetime.now().isoformat()
-                    }
-                },
-                "状态": {
-                    "status": {
-                        "name": "未处理"  # 默认状态
                     }
-                },
-                "是否提醒": {
-                    "checkbox": False  # 默认不提醒
-                },
-                "今日是否打卡": {
-                    "status": {
-                        "name": "否"  # 默认未打卡
+                ]
+            },
+            "摘要": {
+                "rich_text": [
+                    {
+                        "text": {
+                            "content": summary[:2000] if len(summary) > 2000 else summary
+                        }
                     }
-                },
-                "打卡次数": {
-                    "number": 0  # 默认打卡次数为0
+                ]
+            },
+            "标签": {
+                "multi_select": [
+                    {"name": tag} for tag in processed_data["tags"][:2]  # 业务限制：最多2个标签
+                ]
+            },
+            "来源": {
+                "url": processed_data["source"]
+            }
+        }
+
+    def _new_page_properties(self, url, status):
+        """新建页面的默认属性：链接、添加时间、状态、提醒和打卡"""
+        return {
+            "链接": {
+                "url": url
+            },
+            "添加时间": {
+                "date": {
+                    "start": datetime.now().isoformat()
+                }
+            },
+            "状态": {
+                "status": {
+                    "name": status
+                }
+            },
+            "是否提醒": {
+                "checkbox": False  # 默认不提醒
+            },
+            "今日是否打卡": {
+                "status": {
+                    "name": "否"  # 默认未打卡
+                }
+            },
+            "打卡次数": {
+                "number": 0  # 默认打卡次数为0
+            }
+        }
+
+    def _content_blocks(self, processed_data):
+        """页面正文：关键点和相关链接"""
+        children = [
+            {
+                "object": "block",
+                "type": "heading_2",
+                "heading_2": {
+                    "rich_text": [{"type": "text", "text": {"content": "关键点"}}]
                 }
             }
+        ]
+        
+        # 添加关键点
+        for point in processed_data["key_points"]:
+            children.append({
+                "object": "block",
+                "type": "bulleted_list_item",
+                "bulleted_list_item": {
+                    "rich_text": [{"type": "text", "text": {"content": point}}]
+                }
+            })
             
-            # 创建页面内容
-            children = [
-                {
-                    "object": "block",
-                    "type": "heading_2",
-                    "heading_2": {
-                        "rich_text": [{"type": "text", "text": {"content": "关键点"}}]
-                    }
+        # 添加相关链接部分
+        if processed_data["related_links"]:
+            children.append({
+                "object": "block",
+                "type": "heading_2",
+                "heading_2": {
+                    "rich_text": [{"type": "text", "text": {"content": "相关链接"}}]
                 }
-            ]
+            })
             
-            # 添加关键点
-            for point in processed_data["key_points"]:
-                children.append({
-                    "object": "block",
-                    "type": "bulleted_list_item",
-                    "bulleted_list_item": {
-                        "rich_text": [{"type": "text", "text": {"content": point}}]
-                    }
-                })
-                
-            # 添加相关链接部分
-            if processed_data["related_links"]:
+            for link in processed_data["related_links"]:
                 children.append({
                     "object": "block",
-                    "type": "heading_2",
-                    "heading_2": {
-                        "rich_text": [{"type": "text", "text": {"content": "相关链接"}}]
+                    "type": "paragraph",
+                    "paragraph": {
+                        "rich_text": [
+                            {
+                                "type": "text",
+                                "text": {
+                                    "content": f"{link['description']}: ",
+                                }
+                            },
+                            {
+                                "type": "text",
+                                "text": {
+                                    "content": link["url"],
+                                    "link": {"url": link["url"]}
+                                }
+                            }
+                        ]
                     }
                 })
-                
-                for link in processed_data["related_links"]:
-                    children.append({
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {
-                            "rich_text": [
-                                {
-                                    "type": "text",
-                                    "text": {
-                                        "content": f"{link['description']}: ",
-                                    }
-                                },
-                                {
-                                    "type": "text",
-                                    "text": {
-                                        "content": link["url"],
-                                        "link": {"url": link["url"]}
-                                    }
-                                }
-                            ]
-                        }
-                    })
+        return children
+
+    async def add_content_to_database_async(self, processed_data):
+        """将处理后的内容添加到Notion数据库"""
+        try:
+            # 准备Notion页面属性
+            properties = self._analysis_properties(processed_data)
+            properties.update(self._new_page_properties(processed_data["original_url"], "未处理"))
             
             # 创建页面
             data = {
                 "parent": {"database_id": self.database_id},
                 "properties": properties,
-                "children": children
+                "children": self._content_blocks(processed_data)
             }
             
-            response = requests.post(
-                f"{self.api_url}/pages",
-                headers=self.headers,
-                json=data
-            )
+            response = await self.transport.request("POST", "/pages", json=data)
             
             if response.status_code == 200:
                 result = response.json()
                 page_id = result.get("id", "unknown_id")
                 logger.info(f"内容已成功添加到Notion数据库: {page_id}")
+                self.url_index.add(processed_data["original_url"], page_id, processed_data.get("title"))
+                self._record_page(result, key_points=processed_data.get("key_points"))
                 return {"success": True, "page_id": page_id}
             else:
                 error_msg = response.text
@@ -163,87 +229,356 @@ class NotionManager:
             logger.error(f"添加内容到Notion失败: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    def find_entry_by_link(self, url: str):
-        """根据'链接'属性精确查找是否已存在相同链接，存在则返回{id,title}，否则None"""
+    async def create_draft_page_async(self, url, webpage_data):
+        """两阶段保存的第一步：抓取完成后立即创建只有标题、链接和来源的页面，状态为'处理中'"""
         try:
-            if not url:
-                return None
-            data = {
-                "filter": {
-                    "property": "链接",
-                    "url": {
-                        "equals": url
-                    }
-                },
-                "page_size": 1
+            title = (webpage_data or {}).get("title") or url
+            properties = {
+                "标题": {"title": [{"text": {"content": title[:2000]}}]},
+                "来源": {"url": (webpage_data or {}).get("source") or url}
             }
-            response = requests.post(
-                f"{self.api_url}/databases/{self.database_id}/query",
-                headers=self.headers,
-                json=data
+            properties.update(self._new_page_properties(url, DRAFT_STATUS))
+            
+            response = await self.transport.request(
+                "POST", "/pages", json={"parent": {"database_id": self.database_id}, "properties": properties}
+            )
+            
+            if response.status_code == 200:
+                result = response.json()
+                page_id = result.get("id", "unknown_id")
+                logger.info(f"已创建待分析页面: {page_id}")
+                self.url_index.add(url, page_id, title)
+                self._record_page(result)
+                return {"success": True, "page_id": page_id, "title": title}
+            else:
+                error_msg = response.text
+                logger.error(f"创建页面失败: HTTP {response.status_code}, {error_msg}")
+                return {"success": False, "error": f"HTTP {response.status_code}: {error_msg}"}
+            
+        except Exception as e:
+            logger.error(f"创建页面失败: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def enrich_page_async(self, page_id, processed_data):
+        """两阶段保存的第二步：把 DeepSeek 分析结果写入已创建的页面
+
+        先更新摘要、标签等属性并把状态改为'未处理'，再追加关键点等正文块；
+        正文块最后写入，失败重试时不会重复追加
+        """
+        try:
+            properties = self._analysis_properties(processed_data)
+            properties["状态"] = {"status": {"name": "未处理"}}
+            response = await self.transport.request("PATCH", f"/pages/{page_id}", json={"properties": properties})
+            if response.status_code != 200:
+                error_msg = response.text
+                logger.error(f"写入分析结果失败: HTTP {response.status_code}, {error_msg}")
+                return {"success": False, "error": f"HTTP {response.status_code}: {error_msg}"}
+            page = response.json()
+            
+            response = await self.transport.request(
+                "PATCH", f"/blocks/{page_id}/children", json={"children": self._content_blocks(processed_data)}
             )
+            
+            if response.status_code == 200:
+                logger.info(f"页面分析结果已写入: {page_id}")
+                self._record_page(page, key_points=processed_data.get("key_points"))
+                return {"success": True, "page_id": page_id}
+            else:
+                error_msg = response.text
+                logger.error(f"写入关键点失败: HTTP {response.status_code}, {error_msg}")
+                self._record_page(page)
+                return {"success": False, "error": f"HTTP {response.status_code}: {error_msg}"}
+            
+        except Exception as e:
+            logger.error(f"写入分析结果失败: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    def _replica_ready(self):
+        return self.replica is not None and self.replica.ready
+
+    def _page_to_entry(self, page):
+        """将 Notion 页面解码为本地副本中的条目字典"""
+        return {
+            "id": page.get("id", ""),
+            "title": self._get_property_value(page, "标题", "title"),
+            "summary": self._get_property_value(page, "摘要", "rich_text"),
+            "status": self._get_property_value(page, "状态", "status"),
+            "tags": self._get_property_value(page, "标签", "multi_select") or [],
+            "url": self._get_property_value(page, "链接", "url"),
+            "source": self._get_property_value(page, "来源", "url"),
+            "reminder": self._get_property_value(page, "是否提醒", "checkbox") or False,
+            "check_in_status": self._get_property_value(page, "今日是否打卡", "status") or "否",
+            "check_in_count": self._get_property_value(page, "打卡次数", "number") or 0,
+            "added_time": self._get_property_value(page, "添加时间", "date"),
+            "last_edited_time": page.get("last_edited_time"),
+            # 关键点保存在页面正文中，页面属性中没有
+            "key_points": None
+        }
+
+    def _record_page(self, page, key_points=None):
+        """本机写操作成功后，使条目缓存失效，并用返回的页面对象更新各索引和本地副本"""
+        if not page or not page.get("id"):
+            return
+        page_id = page["id"]
+        if page.get("archived") or page.get("in_trash"):
+            self._forget_page(page_id)
+            return
+        self.entry_cache.invalidate(page_id)
+        entry = self._page_to_entry(page)
+        if key_points is not None:
+            entry["key_points"] = key_points
+        self._index_entry(entry)
+        if self.replica is not None:
+            self.replica.upsert(entry)
+
+    def _index_entry(self, entry):
+        """新增或修改条目后更新各索引"""
+        if entry["url"]:
+            self.url_index.add(entry["url"], entry["id"], entry["title"])
+        else:
+            # 链接被清空的条目不再参与去重
+            self.url_index.remove_page(entry["id"])
+        self.tag_index.set_entry_tags(entry["id"], entry["tags"])
+        if SEARCH_INDEX_ENABLED:
+            self.search_index.add(entry)
+
+    def _forget_page(self, page_id):
+        """条目被删除（归档）后，从各索引、缓存和本地副本中移除"""
+        self.url_index.remove_page(page_id)
+        self.tag_index.remove_entry(page_id)
+        self.search_index.remove(page_id)
+        self.entry_cache.invalidate(page_id)
+        if self.replica is not None:
+            self.replica.delete(page_id)
+
+    @property
+    def sync_interval(self):
+        """后台同步间隔（秒）"""
+        return NOTION_REPLICA_SYNC_INTERVAL if self.replica is not None else SEEN_URL_SYNC_INTERVAL
+
+    async def sync_async(self):
+        """后台同步入口：同步本地副本，并更新已保存链接索引和标签索引；未启用副本时直接扫描数据库重建索引"""
+        # 补写之前未能同步到 Notion 的打卡次数
+        await self.sync_check_in_counts_async()
+        if self.replica is None:
+            return await self.sync_indexes_async()
+        full = time.time() - self._last_full_sync >= NOTION_REPLICA_FULL_SYNC_INTERVAL
+        if not await self.sync_replica_async(full=full):
+            return False
+        if full:
+            self._last_full_sync = time.time()
+        return True
+
+    async def sync_replica_async(self, full=False):
+        """同步本地副本
+
+        增量同步只拉取 last_edited_time 不早于上次同步位置的页面；
+        全量同步拉取所有页面，并删除本地存在但 Notion 中已归档的条目
+        """
+        try:
+            since = None if full else self.replica.get_meta("last_edited_time")
+            # Notion 的 last_edited_time 精确到分钟，留出余量
+            started = datetime.fromtimestamp(time.time() - 60, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+            filter_obj = None
+            if since:
+                filter_obj = {
+                    "timestamp": "last_edited_time",
+                    "last_edited_time": {"on_or_after": since}
+                }
+            sorts = [{"timestamp": "last_edited_time", "direction": "ascending"}]
+            # 全量同步时跳过最后编辑时间未变化的条目
+            edited_times = self.replica.get_edited_times() if full else {}
+            indexes_ready = self.url_index.ready and self.tag_index.ready and (self.search_index.ready or not SEARCH_INDEX_ENABLED)
+            seen_ids = []
+            batch = []
+            latest = since
+            async for page in self.iter_database_pages_async(filter_obj=filter_obj, sorts=sorts):
+                entry = self._page_to_entry(page)
+                seen_ids.append(entry["id"])
+                edited = entry["last_edited_time"]
+                if edited and (latest is None or edited > latest):
+                    latest = edited
+                if full and edited and edited_times.get(entry["id"]) == edited:
+                    continue
+                batch.append(entry)
+                self.entry_cache.invalidate(entry["id"])
+                if indexes_ready:
+                    self._index_entry(entry)
+                if len(batch) >= NOTION_QUERY_PAGE_SIZE:
+                    self.replica.upsert_many(batch)
+                    batch = []
+            self.replica.upsert_many(batch)
+
+            removed = self.replica.delete_missing(seen_ids, started) if full else []
+            for page_id in removed:
+                self._forget_page(page_id)
+            if latest:
+                self.replica.set_meta("last_edited_time", latest)
+            if not indexes_ready:
+                # 首次同步后从本地副本建立索引
+                await self._load_indexes_async(self.replica.get_all_entries(), await self.get_tag_options_async())
+            elif full:
+                self.tag_index.set_options(await self.get_tag_options_async())
+            if full or not self.replica.ready:
+                logger.info(f"本地副本已同步 ({'全量' if full else '增量'}): 扫描 {len(seen_ids)} 条, 删除 {len(removed)} 条, 共 {self.replica.count()} 条")
+            self.replica.ready = True
+            return True
+        except Exception as e:
+            logger.error(f"同步本地副本失败: {str(e)}")
+            return False
+
+    async def _load_indexes_async(self, entries, tag_options=None):
+        """用全量条目重建已保存链接索引、标签索引和搜索索引"""
+        self.url_index.load(entries)
+        self.tag_index.load([(entry["id"], entry["tags"]) for entry in entries], options=tag_options)
+        if SEARCH_INDEX_ENABLED:
+            # 建立搜索索引耗时较长，在线程池中执行，避免阻塞事件循环
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.search_index.load, entries)
+
+    async def sync_indexes_async(self):
+        """未启用本地副本时，通过一次分页扫描重建已保存链接索引、标签索引和搜索索引"""
+        try:
+            entries = []
+            async for page in self.iter_database_pages_async():
+                entries.append(self._page_to_entry(page))
+            await self._load_indexes_async(entries, await self.get_tag_options_async())
+            return True
+        except Exception as e:
+            logger.error(f"同步索引失败: {str(e)}")
+            return False
+
+    async def get_tag_options_async(self):
+        """读取数据库结构中'标签'属性定义的所有选项，失败时返回 None"""
+        try:
+            response = await self.transport.request("GET", f"/databases/{self.database_id}")
             if response.status_code != 200:
-                logger.error(f"查询重复链接失败: HTTP {response.status_code}")
+                logger.error(f"获取数据库结构失败: HTTP {response.status_code}")
                 return None
+            prop = response.json().get("properties", {}).get("标签", {})
+            return [option.get("name") for option in prop.get("multi_select", {}).get("options", []) if option.get("name")]
+        except Exception as e:
+            logger.error(f"获取标签选项失败: {str(e)}")
+            return None
+
+    async def iter_database_pages_async(self, filter_obj=None, sorts=None, page_size=NOTION_QUERY_PAGE_SIZE, limit=None):
+        """按游标分页查询数据库，逐个产出页面对象
+
+        根据 has_more/next_cursor 自动翻页，只有在调用方继续迭代时才请求下一页，
+        提前 break 或达到 limit 后不再发起请求；请求失败时抛出 RuntimeError
+        """
+        data = {"page_size": max(1, min(page_size, 100))}
+        if filter_obj:
+            data["filter"] = filter_obj
+        if sorts:
+            data["sorts"] = sorts
+
+        count = 0
+        while True:
+            if limit:
+                data["page_size"] = max(1, min(data["page_size"], limit - count))
+            response = await self.transport.request("POST", f"/databases/{self.database_id}/query", json=data)
+            if response.status_code != 200:
+                raise RuntimeError(f"查询数据库失败: HTTP {response.status_code}, {response.text}")
             result = response.json()
-            results = result.get("results", [])
-            if not results:
+            for page in result.get("results", []):
+                yield page
+                count += 1
+                if limit and count >= limit:
+                    return
+            if not result.get("has_more") or not result.get("next_cursor"):
+                return
+            data["start_cursor"] = result["next_cursor"]
+
+    async def get_entry_async(self, page_id):
+        """按页面ID获取单个条目的详细信息，不存在或已删除返回 None
+
+        依次从条目缓存、本地副本和 Notion API (GET /pages/{id}) 读取，
+        启用写入缓冲时叠加尚未写入 Notion 的修改
+        """
+        entry = await self._fetch_entry_async(page_id)
+        if self.write_buffer is not None:
+            entry = self.write_buffer.overlay(entry)
+        if entry is not None and self.check_in_log is not None:
+            count = await self._run_check_in_log(self.check_in_log.count, page_id)
+            if count is not None and count != entry.get("check_in_count"):
+                entry = dict(entry, check_in_count=count)
+        return entry
+
+    async def _fetch_entry_async(self, page_id):
+        """读取条目在 Notion 中（或缓存、副本中）的状态，不含写入缓冲中的修改"""
+        try:
+            if not page_id:
                 return None
-            page = results[0]
-            return {
-                "id": page.get("id"),
-                "title": self._get_property_value(page, "标题", "title")
-            }
+            entry = self.entry_cache.get(page_id)
+            if entry is not None:
+                return entry
+            
+            if self._replica_ready():
+                entry = self.replica.get_entry(page_id)
+            if entry is None:
+                response = await self.transport.request("GET", f"/pages/{page_id}")
+                if response.status_code != 200:
+                    logger.error(f"获取条目失败: HTTP {response.status_code}")
+                    return None
+                page = response.json()
+                if page.get("archived") or page.get("in_trash"):
+                    return None
+                entry = self._page_to_entry(page)
+            
+            self.entry_cache.set(page_id, entry)
+            return entry
         except Exception as e:
-            logger.error(f"查找链接时出错: {str(e)}")
+            logger.error(f"获取条目失败: {str(e)}")
             return None
 
-    def get_entries_by_tag(self, tag):
-        """根据标签获取数据库条目"""
+    async def find_entry_by_link_async(self, url: str):
+        """查找是否已存在相同链接，存在则返回{id,title}，否则None
+
+        链接索引已同步时按规范化链接在本地查找（x.com/twitter.com/追踪参数等视为同一链接），
+        否则回退到按'链接'属性精确查询 Notion
+        """
         try:
-            # 准备查询数据
-            data = {
-                "filter": {
-                    "property": "标签",
-                    "multi_select": {
-                        "contains": tag
-                    }
+            if not url:
+                return None
+            if self.url_index.ready:
+                return self.url_index.lookup(url)
+            filter_obj = {
+                "property": "链接",
+                "url": {
+                    "equals": url
                 }
             }
-            
-            response = requests.post(
-                f"{self.api_url}/databases/{self.database_id}/query",
-                headers=self.headers,
-                json=data
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"获取条目失败: HTTP {response.status_code}")
-                return []
-                
-            result = response.json()
-            entries = []
-            
-            for page in result.get("results", []):
-                title = self._get_property_value(page, "标题", "title")
-                status = self._get_property_value(page, "状态", "status")
-                url = self._get_property_value(page, "链接", "url")
-                
-                entries.append({
-                    "id": page.get("id", ""),
-                    "title": title,
-                    "status": status,
-                    "url": url
-                })
-                
-            return entries
-        
+            async for page in self.iter_database_pages_async(filter_obj=filter_obj, limit=1):
+                return {
+                    "id": page.get("id"),
+                    "title": self._get_property_value(page, "标题", "title")
+                }
+            return None
         except Exception as e:
-            logger.error(f"根据标签获取条目失败: {str(e)}")
-            return []
-    
-    def update_entry_status(self, page_id, status):
+            logger.error(f"查找链接时出错: {str(e)}")
+            return None
+
+    async def get_entries_by_tag_async(self, tag):
+        """根据标签获取数据库条目"""
+        result = await self.query_entries_async(EntryFilter(tags=[tag]), limit=None)
+        return [
+            {"id": e["id"], "title": e["title"], "status": e["status"], "url": e["url"]}
+            for e in result["entries"]
+        ]
+
+    async def _buffer_property_async(self, page_id, field, property_name, property_value, value, result):
+        """启用写入缓冲时记录属性修改并立即返回，实际写入在合并窗口结束后进行"""
+        if not await self.write_buffer.enqueue_property(page_id, field, property_name, property_value, value):
+            return {"success": False, "error": "条目不存在"}
+        return {"success": True, "page_id": page_id, "pending": True, **result}
+
+    async def update_entry_status_async(self, page_id, status):
         """更新条目状态"""
+        if self.write_buffer is not None:
+            return await self._buffer_property_async(
+                page_id, "status", "状态", {"status": {"name": status}}, status, {"status": status}
+            )
         try:
             data = {
                 "properties": {
@@ -255,14 +590,11 @@ class NotionManager:
                 }
             }
             
-            response = requests.patch(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers,
-                json=data
-            )
+            response = await self.transport.request("PATCH", f"/pages/{page_id}", json=data)
             
             if response.status_code == 200:
                 logger.info(f"条目状态已更新: {page_id} -> {status}")
+                self._record_page(response.json())
                 return {"success": True, "page_id": page_id, "status": status}
             else:
                 error_msg = response.text
@@ -273,14 +605,17 @@ class NotionManager:
             logger.error(f"更新条目状态失败: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    def add_tag_to_entry(self, page_id, tag):
+    async def add_tag_to_entry_async(self, page_id, tag):
         """为条目添加标签"""
+        if self.write_buffer is not None:
+            # 写入时在 Notion 中最新的标签基础上追加，无需先读取页面
+            if not await self.write_buffer.enqueue_tag(page_id, tag):
+                return {"success": False, "error": "条目不存在"}
+            entry = await self.get_entry_async(page_id)
+            return {"success": True, "page_id": page_id, "tags": entry["tags"] if entry else [tag], "pending": True}
         try:
             # 先获取当前标签
-            response = requests.get(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers
-            )
+            response = await self.transport.request("GET", f"/pages/{page_id}")
             
             if response.status_code != 200:
                 logger.error(f"获取页面失败: HTTP {response.status_code}")
@@ -307,14 +642,11 @@ class NotionManager:
                 }
             }
             
-            response = requests.patch(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers,
-                json=data
-            )
+            response = await self.transport.request("PATCH", f"/pages/{page_id}", json=data)
             
             if response.status_code == 200:
                 logger.info(f"条目标签已更新: {page_id} 添加标签 {tag}")
+                self._record_page(response.json())
                 return {"success": True, "page_id": page_id, "tags": current_tags}
             else:
                 error_msg = response.text
@@ -325,7 +657,7 @@ class NotionManager:
             logger.error(f"为条目添加标签失败: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    def delete_entry(self, page_id):
+    async def delete_entry_async(self, page_id):
         """删除数据库条目"""
         try:
             # Notion API 通过"归档"来删除页面
@@ -333,14 +665,13 @@ class NotionManager:
                 "archived": True
             }
             
-            response = requests.patch(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers,
-                json=data
-            )
+            response = await self.transport.request("PATCH", f"/pages/{page_id}", json=data)
             
             if response.status_code == 200:
                 logger.info(f"条目已删除: {page_id}")
+                if self.write_buffer is not None:
+                    self.write_buffer.discard(page_id)
+                self._forget_page(page_id)
                 return {"success": True, "page_id": page_id}
             else:
                 error_msg = response.text
@@ -351,8 +682,13 @@ class NotionManager:
             logger.error(f"删除条目失败: {str(e)}")
             return {"success": False, "error": str(e)}
             
-    def update_reminder_status(self, page_id, reminder_status):
+    async def update_reminder_status_async(self, page_id, reminder_status):
         """更新是否提醒状态"""
+        if self.write_buffer is not None:
+            return await self._buffer_property_async(
+                page_id, "reminder", "是否提醒", {"checkbox": reminder_status}, bool(reminder_status),
+                {"reminder_status": reminder_status}
+            )
         try:
             data = {
                 "properties": {
@@ -362,14 +698,11 @@ class NotionManager:
                 }
             }
             
-            response = requests.patch(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers,
-                json=data
-            )
+            response = await self.transport.request("PATCH", f"/pages/{page_id}", json=data)
             
             if response.status_code == 200:
                 logger.info(f"提醒状态已更新: {page_id} -> {reminder_status}")
+                self._record_page(response.json())
                 return {"success": True, "page_id": page_id, "reminder_status": reminder_status}
             else:
                 error_msg = response.text
@@ -380,7 +713,7 @@ class NotionManager:
             logger.error(f"更新提醒状态失败: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    def update_check_in_status(self, page_id, check_in_status):
+    async def update_check_in_status_async(self, page_id, check_in_status):
         """更新今日是否打卡状态。支持传入布尔或'是'/'否'字符串。"""
         try:
             # 兼容字符串/布尔入参
@@ -389,6 +722,12 @@ class NotionManager:
                 is_checked = normalized == "是"
             else:
                 is_checked = bool(check_in_status)
+            
+            if self.write_buffer is not None:
+                return await self._buffer_property_async(
+                    page_id, "check_in_status", "今日是否打卡", {"status": {"name": "是" if is_checked else "否"}},
+                    "是" if is_checked else "否", {"check_in_status": check_in_status}
+                )
 
             data = {
                 "properties": {
@@ -400,14 +739,11 @@ class NotionManager:
                 }
             }
             
-            response = requests.patch(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers,
-                json=data
-            )
+            response = await self.transport.request("PATCH", f"/pages/{page_id}", json=data)
             
             if response.status_code == 200:
                 logger.info(f"打卡状态已更新: {page_id} -> {check_in_status}")
+                self._record_page(response.json())
                 return {"success": True, "page_id": page_id, "check_in_status": check_in_status}
             else:
                 error_msg = response.text
@@ -418,234 +754,429 @@ class NotionManager:
             logger.error(f"更新打卡状态失败: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    def increment_check_in_count(self, page_id):
-        """增加打卡次数"""
+    @staticmethod
+    async def _run_check_in_log(func, *args):
+        """在线程池中执行打卡日志（本地 SQLite）的读写，不阻塞事件循环"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def increment_check_in_count_async(self, page_id):
+        """记录今日打卡并增加打卡次数
+
+        打卡事件追加写入本地日志（同一条目每天只计一次），打卡次数由日志汇总，
+        随后在后台写入 Notion 的'打卡次数'属性；只有条目第一次打卡时需要读取已有次数作为基数
+        """
+        if self.check_in_log is None:
+            return {"success": False, "error": "未启用打卡日志"}
         try:
-            # 首先获取当前打卡次数
-            response = requests.get(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"获取页面失败: HTTP {response.status_code}")
-                return {"success": False, "error": f"HTTP {response.status_code}"}
-            
-            page = response.json()
-            current_count = 0
-            
-            if "properties" in page and "打卡次数" in page["properties"]:
-                count_prop = page["properties"]["打卡次数"]
-                if "number" in count_prop:
-                    current_count = count_prop["number"] or 0
-            
-            # 增加打卡次数
-            new_count = current_count + 1
-            
-            data = {
-                "properties": {
-                    "打卡次数": {
-                        "number": new_count
-                    }
-                }
-            }
+            baseline = 0
+            if not await self._run_check_in_log(self.check_in_log.has_page, page_id):
+                entry = await self._fetch_entry_async(page_id)
+                if entry is None:
+                    return {"success": False, "error": "条目不存在"}
+                baseline = entry.get("check_in_count") or 0
             
-            response = requests.patch(
-                f"{self.api_url}/pages/{page_id}",
-                headers=self.headers,
-                json=data
-            )
-            
-            if response.status_code == 200:
-                logger.info(f"打卡次数已更新: {page_id} -> {new_count}")
-                return {"success": True, "page_id": page_id, "check_in_count": new_count}
-            else:
-                error_msg = response.text
-                logger.error(f"更新打卡次数失败: HTTP {response.status_code}, {error_msg}")
-                return {"success": False, "error": f"HTTP {response.status_code}: {error_msg}"}
+            added, count = await self._run_check_in_log(self.check_in_log.record, page_id, baseline)
+            if added:
+                logger.info(f"打卡已记录: {page_id} -> {count}")
+                self._schedule_check_in_sync(page_id)
+            return {"success": True, "page_id": page_id, "check_in_count": count, "added": added}
             
         except Exception as e:
             logger.error(f"更新打卡次数失败: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    def get_reminder_entries(self):
-        """获取设置了提醒的条目"""
-        try:
-            # 准备筛选条件
-            filter_obj = {
-                "property": "是否提醒",
-                "checkbox": {
-                    "equals": True
-                }
-            }
-            
-            data = {
-                "filter": filter_obj,
-                "page_size": 100  # 获取最多100条记录
-            }
-            
-            response = requests.post(
-                f"{self.api_url}/databases/{self.database_id}/query",
-                headers=self.headers,
-                json=data
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"获取提醒条目失败: HTTP {response.status_code}")
-                return []
-                
-            result = response.json()
-            entries = []
-            
-            for page in result.get("results", []):
-                title = self._get_property_value(page, "标题", "title")
-                check_in_status = self._get_property_value(page, "今日是否打卡", "status")
-                check_in_count = self._get_property_value(page, "打卡次数", "number")
-                
-                entries.append({
-                    "id": page.get("id", ""),
-                    "title": title,
-                    "check_in_status": check_in_status,
-                    "check_in_count": check_in_count
-                })
-                
+    def _schedule_check_in_sync(self, page_id):
+        """在后台把条目的打卡次数写入 Notion，失败的会在下一次定期同步时补写"""
+        task = asyncio.ensure_future(self.sync_check_in_counts_async([page_id]))
+        self._check_in_sync_tasks.add(task)
+        task.add_done_callback(self._check_in_sync_tasks.discard)
+    
+    async def sync_check_in_counts_async(self, page_ids=None):
+        """把打卡日志汇总的次数写入 Notion 的'打卡次数'属性，返回成功写入的条目数
+
+        写入的是汇总后的绝对值，重复写入或乱序写入都会在下一次同步时被纠正
+        """
+        synced = 0
+        if self.check_in_log is None:
+            return synced
+        with notion_priority(PRIORITY_BACKGROUND):
+            for page_id, count in await self._run_check_in_log(self.check_in_log.unsynced, page_ids):
+                try:
+                    response = await self.transport.request(
+                        "PATCH", f"/pages/{page_id}", json={"properties": {"打卡次数": {"number": count}}}
+                    )
+                    if response.status_code != 200:
+                        logger.error(f"同步打卡次数失败: HTTP {response.status_code}, {response.text}")
+                        continue
+                    await self._run_check_in_log(self.check_in_log.mark_synced, page_id, count)
+                    self._record_page(response.json())
+                    synced += 1
+                except Exception as e:
+                    logger.error(f"同步打卡次数失败: {page_id}, {str(e)}")
+        return synced
+    
+    async def get_check_in_stats_async(self, page_id):
+        """条目的打卡统计（次数、连续天数、最长连续天数、最近打卡日期、近30天次数），全部来自本地日志"""
+        if self.check_in_log is None:
+            raise RuntimeError("未启用打卡日志")
+        stats, logged_count = await self._run_check_in_log(
+            lambda: (self.check_in_log.stats(page_id), self.check_in_log.count(page_id))
+        )
+        if logged_count is None:
+            # 尚未在本机打过卡，次数沿用 Notion 中的值
+            entry = await self.get_entry_async(page_id)
+            stats["count"] = entry.get("check_in_count", 0) if entry else 0
+        return stats
+    
+    async def _apply_check_in_counts_async(self, entries):
+        """用打卡日志中的次数覆盖条目中尚未同步的打卡次数（读取本地日志在线程池中执行）"""
+        if self.check_in_log is None:
+            return entries
+        page_ids = [entry["id"] for entry in entries]
+        counts = await self._run_check_in_log(self.check_in_log.counts, page_ids)
+        for entry in entries:
+            if entry["id"] in counts:
+                entry["check_in_count"] = counts[entry["id"]]
+        return entries
+
+    def _overlay_entries(self, entries):
+        """启用写入缓冲时，在条目列表上叠加尚未写入 Notion 的修改"""
+        if self.write_buffer is None:
             return entries
+        return [self.write_buffer.overlay(entry) for entry in entries]
+    
+    async def get_reminder_entries_async(self):
+        """获取设置了提醒的条目"""
+        result = await self.query_entries_async(EntryFilter(reminder=True), limit=None)
+        return [
+            {"id": e["id"], "title": e["title"], "check_in_status": e["check_in_status"], "check_in_count": e["check_in_count"]}
+            for e in result["entries"]
+        ]
+
+    async def reset_daily_check_in_status_async(self, on_progress=None):
+        """重置所有提醒条目的今日打卡状态为'否'，已经是'否'的条目跳过"""
+        result = await self.bulk_update_async(
+            {"今日是否打卡": {"status": {"name": "否"}}},
+            filter_obj={
+                "and": [
+                    {"property": "是否提醒", "checkbox": {"equals": True}},
+                    {"property": "今日是否打卡", "status": {"does_not_equal": "否"}}
+                ]
+            },
+            skip=lambda page: self._get_property_value(page, "今日是否打卡", "status") == "否",
+            on_progress=on_progress
+        )
+        if not result["success"]:
+            logger.error(f"重置每日打卡状态失败: {result['error']}")
+            return result
         
-        except Exception as e:
-            logger.error(f"获取提醒条目失败: {str(e)}")
-            return []
-            
-    def reset_daily_check_in_status(self):
-        """重置所有条目的今日打卡状态为'否'"""
-        try:
-            # 获取所有设置了提醒的条目
-            reminder_entries = self.get_reminder_entries()
-            
-            success_count = 0
-            failed_entries = []
-            
-            for entry in reminder_entries:
-                result = self.update_check_in_status(entry["id"], False)
+        logger.info(f"每日打卡状态已重置: {result['updated']} 成功, {len(result['failed_entries'])} 失败")
+        return {"success": True, "reset_count": result["updated"], "failed_entries": result["failed_entries"]}
+    
+    async def bulk_update_async(self, properties, filter_obj=None, skip=None, concurrency=NOTION_BULK_CONCURRENCY,
+                                max_attempts=NOTION_BULK_MAX_ATTEMPTS, on_progress=None):
+        """批量修改条目属性
+
+        - properties: 要写入的 Notion 页面属性，或 page -> 属性 的函数（返回空值时跳过该页面）
+        - filter_obj: 数据库查询筛选条件，流式读取所有匹配的页面，边读取边更新
+        - skip: page -> bool，返回真时跳过该页面（例如属性已经是目标值）
+        - concurrency: 同时进行的更新请求数，实际速率由传输层限流器控制
+        - max_attempts: 单个页面的最大尝试次数，失败后按指数退避重试
+        - on_progress: async 回调，参数为进度字典 {"matched", "updated", "skipped", "failed"}，
+          至多每 BULK_PROGRESS_INTERVAL 秒调用一次，结束时再调用一次
+
+        更新后的页面可能不再满足筛选条件，分页游标因此可能跳过部分页面，
+        所以在有更新时会重新扫描，直到没有新的页面需要更新（最多 BULK_MAX_PASSES 轮）。
+        返回 {"success", "matched", "updated", "skipped", "failed", "failed_entries"}
+        """
+        progress = {"matched": 0, "updated": 0, "skipped": 0, "failed": 0}
+        failed_entries = []
+        seen = set()
+        last_report = [time.monotonic()]
+        
+        async def report(final=False):
+            if on_progress is None:
+                return
+            now = time.monotonic()
+            if not final and now - last_report[0] < BULK_PROGRESS_INTERVAL:
+                return
+            last_report[0] = now
+            try:
+                await on_progress(dict(progress))
+            except Exception as e:
+                logger.warning(f"批量更新进度回调失败: {str(e)}")
+        
+        async def worker(queue):
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                page_id, page_properties = item
+                result = await self._patch_page_async(page_id, page_properties, max_attempts)
                 if result["success"]:
-                    success_count += 1
+                    progress["updated"] += 1
                 else:
-                    failed_entries.append(entry["id"])
-            
-            logger.info(f"每日打卡状态已重置: {success_count} 成功, {len(failed_entries)} 失败")
-            return {"success": True, "reset_count": success_count, "failed_entries": failed_entries}
-            
+                    progress["failed"] += 1
+                    failed_entries.append(page_id)
+                await report()
+        
+        try:
+            for _ in range(BULK_MAX_PASSES):
+                updated_before = progress["updated"]
+                queue = asyncio.Queue(maxsize=concurrency * 2)
+                workers = [asyncio.create_task(worker(queue)) for _ in range(max(1, concurrency))]
+                try:
+                    async for page in self.iter_database_pages_async(filter_obj=filter_obj):
+                        # 重新扫描时已处理（更新或跳过）的页面不再计数
+                        if page["id"] in seen:
+                            continue
+                        seen.add(page["id"])
+                        progress["matched"] += 1
+                        page_properties = properties(page) if callable(properties) else properties
+                        if not page_properties or (skip and skip(page)):
+                            progress["skipped"] += 1
+                            continue
+                        await queue.put((page["id"], page_properties))
+                    for _ in workers:
+                        await queue.put(None)
+                    await asyncio.gather(*workers)
+                except BaseException:
+                    for task in workers:
+                        task.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+                    raise
+                if not filter_obj or progress["updated"] == updated_before:
+                    break
         except Exception as e:
-            logger.error(f"重置每日打卡状态失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+            logger.error(f"批量更新失败: {str(e)}")
+            await report(final=True)
+            return {"success": False, "error": str(e), **progress, "failed_entries": failed_entries}
+        
+        await report(final=True)
+        logger.info(
+            f"批量更新完成: 匹配 {progress['matched']}, 更新 {progress['updated']}, "
+            f"跳过 {progress['skipped']}, 失败 {progress['failed']}"
+        )
+        return {"success": True, **progress, "failed_entries": failed_entries}
     
-    def get_all_tags(self):
+    async def _patch_page_async(self, page_id, properties, max_attempts=NOTION_BULK_MAX_ATTEMPTS):
+        """更新单个页面的属性，网络错误、冲突和服务端错误按指数退避重试"""
+        error = None
+        for attempt in range(1, max_attempts + 1):
+            try:
+                response = await self.transport.request("PATCH", f"/pages/{page_id}", json={"properties": properties})
+                if response.status_code == 200:
+                    self._record_page(response.json())
+                    return {"success": True, "page_id": page_id}
+                error = f"HTTP {response.status_code}: {response.text}"
+                retryable = response.status_code in (409, 429) or response.status_code >= 500
+            except Exception as e:
+                error = str(e)
+                retryable = True
+            if not retryable or attempt == max_attempts:
+                break
+            await asyncio.sleep(BULK_RETRY_BASE_DELAY * 2 ** (attempt - 1))
+        logger.error(f"更新页面失败: {page_id}, {error}")
+        return {"success": False, "page_id": page_id, "error": error}
+    
+    async def get_all_tags_async(self):
         """获取数据库中所有使用的标签"""
+        return [tag for tag, _ in sorted(await self.get_tag_counts_async())]
+
+    async def get_tag_counts_async(self, include_unused=False):
+        """获取所有使用中的标签及其条目数量 [(标签, 数量)]，按数量降序
+
+        标签索引建立后直接从内存读取；否则扫描数据库并顺便建立标签索引。
+        include_unused 为真时在末尾追加数据库中已定义但尚未使用的标签（数量为 0）
+        """
         try:
-            # 查询数据库
-            response = requests.post(
-                f"{self.api_url}/databases/{self.database_id}/query",
-                headers=self.headers,
-                json={}
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"获取数据库数据失败: HTTP {response.status_code}")
-                return []
+            if not self.tag_index.ready:
+                page_tags = []
                 
-            result = response.json()
-            all_tags = set()
-            
-            # 从所有条目中提取标签
-            for page in result.get("results", []):
-                tags = self._get_property_value(page, "标签", "multi_select")
-                if tags:
-                    all_tags.update(tags)
+                # 从所有条目中提取标签
+                async for page in self.iter_database_pages_async():
+                    tags = self._get_property_value(page, "标签", "multi_select")
+                    page_tags.append((page.get("id"), tags or []))
+                
+                self.tag_index.load(page_tags, options=await self.get_tag_options_async())
             
-            return sorted(list(all_tags))
+            counts = self.tag_index.counts()
+            if include_unused:
+                counts += [(tag, 0) for tag in self.tag_index.unused_options()]
+            return counts
         
         except Exception as e:
             logger.error(f"获取所有标签失败: {str(e)}")
             return []
-    
-    def get_entries_with_details(self, tag=None, status=None, limit=10):
-        """获取数据库条目，带有摘要和更多详细信息"""
+
+    async def get_entries_with_details_async(self, tag=None, status=None, limit=10):
+        """获取数据库条目，带有摘要和更多详细信息；limit 为 None 时返回全部条目"""
+        entry_filter = EntryFilter(tags=[tag] if tag else None, status=status)
+        result = await self.query_entries_async(entry_filter, limit=limit)
+        return result["entries"]
+
+    async def query_entries_async(self, entry_filter, offset=0, limit=10):
+        """按 EntryFilter 筛选排序条目，返回 {"total": 匹配总数或 None, "entries": 当前页条目, "has_more": 是否还有下一页}
+
+        本地副本同步完成后在本地查询；否则将条件下推到 Notion 服务端，
+        只读取到当前页为止（此时总数未知，total 为 None）；limit 为 None 时返回全部条目
+        """
         try:
-            # 准备筛选条件
-            filter_obj = {}
-            
-            if tag:
-                filter_obj = {
-                    "property": "标签",
-                    "multi_select": {
-                        "contains": tag
-                    }
-                }
-            elif status:
-                filter_obj = {
-                    "property": "状态",
-                    "status": {
-                        "equals": status
-                    }
-                }
-            
-            data = {}
-            if filter_obj:
-                data["filter"] = filter_obj
-                
-            # 添加页面大小限制
-            data["page_size"] = limit
-            
-            # 按添加时间排序
-            data["sorts"] = [
-                {
-                    "property": "添加时间",
-                    "direction": "descending"
-                }
-            ]
-            
-            response = requests.post(
-                f"{self.api_url}/databases/{self.database_id}/query",
-                headers=self.headers,
-                json=data
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"获取条目失败: HTTP {response.status_code}")
-                return []
-                
-            result = response.json()
-            entries = []
+            if self._replica_ready():
+                total, entries = self.replica.filter_entries(entry_filter, offset=offset, limit=limit)
+                entries = self._overlay_entries(await self._apply_check_in_counts_async(entries))
+                return {"total": total, "entries": entries, "has_more": offset + len(entries) < total}
             
-            for page in result.get("results", []):
-                title = self._get_property_value(page, "标题", "title")
-                summary = self._get_property_value(page, "摘要", "rich_text")
-                status = self._get_property_value(page, "状态", "status")
-                tags = self._get_property_value(page, "标签", "multi_select")
-                url = self._get_property_value(page, "链接", "url")
-                source = self._get_property_value(page, "来源", "url")
-                reminder = self._get_property_value(page, "是否提醒", "checkbox") or False
-                check_in_status = self._get_property_value(page, "今日是否打卡", "status") or "否"
-                check_in_count = self._get_property_value(page, "打卡次数", "number") or 0
-                
-                entries.append({
-                    "id": page.get("id", ""),
-                    "title": title,
-                    "summary": summary,
-                    "status": status,
-                    "tags": tags,
-                    "url": url,
-                    "source": source,
-                    "reminder": reminder,
-                    "check_in_status": check_in_status,
-                    "check_in_count": check_in_count
-                })
-                
-            return entries
+            # 多读取一条用于判断是否还有下一页
+            fetch_limit = offset + limit + 1 if limit else None
+            matched = []
+            async for page in self.iter_database_pages_async(
+                filter_obj=entry_filter.to_notion_filter(),
+                sorts=entry_filter.to_notion_sorts(),
+                limit=fetch_limit
+            ):
+                matched.append(self._page_to_entry(page))
+            matched = self._overlay_entries(await self._apply_check_in_counts_async(matched))
+            if not limit:
+                return {"total": len(matched), "entries": matched[offset:], "has_more": False}
+            return {"total": None, "entries": matched[offset:offset + limit], "has_more": len(matched) > offset + limit}
         
         except Exception as e:
             logger.error(f"获取条目失败: {str(e)}")
-            return []
+            return {"total": 0, "entries": [], "has_more": False}
+
+    def build_search_filter(self, keyword):
+        """构建 Notion 搜索筛选条件：标题、摘要包含关键词或标签等于关键词
+
+        多个以空格分隔的关键词之间为"且"关系，每个关键词在各属性之间为"或"关系
+        """
+        conditions = []
+        for word in keyword.split():
+            conditions.append({
+                "or": [
+                    {"property": "标题", "title": {"contains": word}},
+                    {"property": "摘要", "rich_text": {"contains": word}},
+                    {"property": "标签", "multi_select": {"contains": word}}
+                ]
+            })
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"and": conditions}
+
+    async def iter_search_entries_async(self, keyword, limit=None):
+        """在 Notion 服务端按关键词筛选，按添加时间倒序跨游标逐个产出匹配的条目"""
+        filter_obj = self.build_search_filter(keyword)
+        if filter_obj is None:
+            return
+        sorts = [{"property": "添加时间", "direction": "descending"}]
+        async for page in self.iter_database_pages_async(filter_obj=filter_obj, sorts=sorts, limit=limit):
+            yield self._page_to_entry(page)
+
+    async def search_entries_async(self, keyword, offset=0, limit=10):
+        """按关键词搜索条目，返回 {"total": 匹配总数或 None, "entries": 当前页条目, "has_more": 是否还有下一页}
+
+        搜索索引建立后在本地按 BM25 相关度排序；否则由 Notion 服务端筛选，
+        只读取到当前页为止（此时总数未知，total 为 None）
+        """
+        try:
+            if self.search_index.ready:
+                total, entries = self.search_index.search(keyword, offset=offset, limit=limit)
+                entries = self._overlay_entries(entries)
+                return {"total": total, "entries": entries, "has_more": offset + len(entries) < total}
+            
+            # 多读取一条用于判断是否还有下一页
+            matched = []
+            async for entry in self.iter_search_entries_async(keyword, limit=offset + limit + 1):
+                matched.append(entry)
+            entries = self._overlay_entries(matched[offset:offset + limit])
+            return {"total": None, "entries": entries, "has_more": len(matched) > offset + limit}
+        
+        except Exception as e:
+            logger.error(f"搜索条目失败: {str(e)}")
+            return {"total": 0, "entries": [], "has_more": False}
     
+    async def aclose(self):
+        """写入缓冲中的修改和待同步的打卡次数后，关闭 Notion 连接池和本地文件"""
+        if self.write_buffer is not None:
+            await self.write_buffer.flush_all()
+        loop = asyncio.get_running_loop()
+        pending_syncs = [task for task in self._check_in_sync_tasks if task.get_loop() is loop]
+        if pending_syncs:
+            await asyncio.gather(*pending_syncs, return_exceptions=True)
+        await self.transport.aclose()
+        if self.replica is not None:
+            self.replica.close()
+        if self.check_in_log is not None:
+            self.check_in_log.close()
+
+    # ---------------- 同步接口 ----------------
+    # 以下方法在后台事件循环中执行对应的异步方法并阻塞等待结果，
+    # 供调度器等同步代码使用；在机器人事件循环中请直接 await *_async 方法
+
+    def add_content_to_database(self, processed_data):
+        """将处理后的内容添加到Notion数据库（同步接口）"""
+        return self.transport.run_sync(self.add_content_to_database_async(processed_data))
+
+    def get_entry(self, page_id):
+        """按页面ID获取单个条目的详细信息（同步接口）"""
+        return self.transport.run_sync(self.get_entry_async(page_id))
+
+    def find_entry_by_link(self, url: str):
+        """根据'链接'属性精确查找是否已存在相同链接，存在则返回{id,title}，否则None（同步接口）"""
+        return self.transport.run_sync(self.find_entry_by_link_async(url))
+
+    def get_entries_by_tag(self, tag):
+        """根据标签获取数据库条目（同步接口）"""
+        return self.transport.run_sync(self.get_entries_by_tag_async(tag))
+
+    def update_entry_status(self, page_id, status):
+        """更新条目状态（同步接口）"""
+        return self.transport.run_sync(self.update_entry_status_async(page_id, status))
+
+    def add_tag_to_entry(self, page_id, tag):
+        """为条目添加标签（同步接口）"""
+        return self.transport.run_sync(self.add_tag_to_entry_async(page_id, tag))
+
+    def delete_entry(self, page_id):
+        """删除数据库条目（同步接口）"""
+        return self.transport.run_sync(self.delete_entry_async(page_id))
+
+    def update_reminder_status(self, page_id, reminder_status):
+        """更新是否提醒状态（同步接口）"""
+        return self.transport.run_sync(self.update_reminder_status_async(page_id, reminder_status))
+
+    def update_check_in_status(self, page_id, check_in_status):
+        """更新今日是否打卡状态。支持传入布尔或'是'/'否'字符串（同步接口）"""
+        return self.transport.run_sync(self.update_check_in_status_async(page_id, check_in_status))
+
+    def increment_check_in_count(self, page_id):
+        """增加打卡次数（同步接口）"""
+        return self.transport.run_sync(self.increment_check_in_count_async(page_id))
+
+    def get_reminder_entries(self):
+        """获取设置了提醒的条目（同步接口）"""
+        return self.transport.run_sync(self.get_reminder_entries_async())
+
+    def reset_daily_check_in_status(self):
+        """重置所有条目的今日打卡状态为'否'（同步接口）"""
+        return self.transport.run_sync(self.reset_daily_check_in_status_async())
+
+    def get_all_tags(self):
+        """获取数据库中所有使用的标签（同步接口）"""
+        return self.transport.run_sync(self.get_all_tags_async())
+
+    def get_tag_counts(self):
+        """获取所有使用中的标签及其条目数量（同步接口）"""
+        return self.transport.run_sync(self.get_tag_counts_async())
+
+    def get_entries_with_details(self, tag=None, status=None, limit=10):
+        """获取数据库条目，带有摘要和更多详细信息（同步接口）"""
+        return self.transport.run_sync(self.get_entries_with_details_async(tag=tag, status=status, limit=limit))
+
+    def search_entries(self, keyword, offset=0, limit=10):
+        """按关键词搜索条目（同步接口）"""
+        return self.transport.run_sync(self.search_entries_async(keyword, offset, limit))
+
     def _get_property_value(self, page, property_name, property_type):
         """从页面属性中提取值"""
         if not page or "properties" not in page or property_name not in page["properties"]:
@@ -673,5 +1204,7 @@ class NotionManager:
             return prop.get("checkbox", False)
         elif property_type == "number" and "number" in prop:
             return prop.get("number", 0)
+        elif property_type == "date" and "date" in prop:
+            return (prop.get("date") or {}).get("start")
         else:
             return None
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Notion HTTP 传输层 - 基于 httpx 的异步连接池客户端
+所有 Notion 请求共享同一个保持连接的连接池，可选启用 HTTP/2；
+请求统一经过带优先级的令牌桶限流，收到 429 时按 Retry-After 暂停并重试
+"""
+
+import contextvars
+import logging
+from contextlib import contextmanager
+import httpx
+from app.common.aio import background_loop
+from app.common.rate_limiter import PriorityRateLimiter, PRIORITY_NORMAL
+from app.config import (
+    NOTION_API_TIMEOUT,
+    NOTION_HTTP2,
+    NOTION_MAX_CONNECTIONS,
+    NOTION_RATE_LIMIT,
+    NOTION_RATE_BURST,
+    NOTION_RATE_LIMIT_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 需要额外安装 h2 (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+NOTION_API_URL = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+
+# 未提供 Retry-After 时 429 之后的默认等待秒数
+DEFAULT_RETRY_AFTER = 1.0
+
+# 当前调用链发出的 Notion 请求的优先级
+_request_priority = contextvars.ContextVar("notion_request_priority", default=PRIORITY_NORMAL)
+
+
+@contextmanager
+def notion_priority(priority):
+    """在 with 块内发出的 Notion 请求使用指定优先级（见 app.common.rate_limiter）"""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+def _retry_after_seconds(response):
+    """解析 429 响应的 Retry-After 头（秒数）"""
+    try:
+        return max(0.0, float(response.headers.get("Retry-After", DEFAULT_RETRY_AFTER)))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+class NotionTransport:
+    def __init__(self, token, timeout=NOTION_API_TIMEOUT, http2=NOTION_HTTP2, max_connections=NOTION_MAX_CONNECTIONS):
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+            "Notion-Version": NOTION_VERSION
+        }
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.http2 = http2 and HAS_HTTP2
+        if http2 and not HAS_HTTP2:
+            logger.warning("已启用 NOTION_HTTP2 但未安装 h2 库，回退到 HTTP/1.1 (pip install httpx[http2])")
+
+        # 请求全部在后台事件循环中执行，客户端和限流器绑定在该循环上
+        self._loop = background_loop
+        self._client = None
+        self.rate_limiter = PriorityRateLimiter(NOTION_RATE_LIMIT, NOTION_RATE_BURST)
+        self.max_retries = NOTION_RATE_LIMIT_MAX_RETRIES
+
+    def _get_client(self):
+        """获取（必要时创建）连接池客户端，只能在后台事件循环中调用"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=NOTION_API_URL,
+                headers=self.headers,
+                timeout=self.timeout,
+                http2=self.http2,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=60
+                )
+            )
+            logger.info(f"Notion 连接池已创建: 最大连接数 {self.max_connections}, HTTP/2 {'启用' if self.http2 else '未启用'}")
+        return self._client
+
+    async def _send(self, method, path, json=None, timeout=None, priority=PRIORITY_NORMAL):
+        client = self._get_client()
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(priority)
+            response = await client.request(
+                method,
+                path,
+                json=json,
+                timeout=timeout if timeout is not None else self.timeout
+            )
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+            # 被限流：所有请求暂停到 Retry-After 之后，本请求重新排队
+            attempt += 1
+            retry_after = _retry_after_seconds(response)
+            logger.warning(f"Notion API 限流 (HTTP 429)，{retry_after:.1f}秒后重试 ({attempt}/{self.max_retries}): {method} {path}")
+            self.rate_limiter.pause(retry_after)
+
+    async def request(self, method, path, json=None, timeout=None):
+        """发送 Notion API 请求，可在任意事件循环中 await
+
+        timeout 为单次调用的超时秒数，未指定时使用 NOTION_API_TIMEOUT；
+        优先级取自调用方的 notion_priority() 上下文
+        """
+        priority = _request_priority.get()
+        return await self._loop.submit(self._send(method, path, json, timeout, priority))
+
+    def run_sync(self, coro):
+        """同步执行协程（供调度器等同步代码使用），沿用调用线程的请求优先级"""
+        return self._loop.run_sync(self._with_priority(coro, _request_priority.get()))
+
+    @staticmethod
+    async def _with_priority(coro, priority):
+        with notion_priority(priority):
+            return await coro
+
+    async def _aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self._loop.submit(self._aclose())
+
+    def close(self):
+        """同步关闭连接池"""
+        self._loop.run_sync(self._aclose())
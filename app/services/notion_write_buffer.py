@@ -0,0 +1,237 @@
+"""
+Notion 属性修改的写入缓冲（write-behind）
+对同一页面的属性修改先在本地生效并立即返回，窗口结束后合并为一次 PATCH；
+写入前比较 last_edited_time 检测其他客户端的并发修改，对方改过的属性不会被覆盖
+"""
+
+import asyncio
+import logging
+import threading
+from app.common.aio import background_loop
+
+logger = logging.getLogger(__name__)
+
+# 单次合并写入失败后的最大尝试次数
+WRITE_MAX_ATTEMPTS = 3
+# 业务限制：每个条目最多2个标签
+MAX_TAGS = 2
+
+
+class WriteBehindBuffer:
+    """按页面合并属性修改的写入缓冲
+
+    - enqueue_property(): 修改单个属性（状态、今日是否打卡、是否提醒等）
+    - enqueue_tag(): 添加标签，写入时在最新的标签基础上追加
+    - overlay(): 在读取到的条目上叠加尚未写入的修改
+    - flush_all(): 立即写入所有待写修改（关闭时调用）
+    所有状态在共享的后台事件循环中维护，写入通过 manager 的传输层完成。
+    """
+
+    def __init__(self, manager, delay):
+        self.manager = manager
+        self.delay = delay
+        self._loop = background_loop
+        # 页面ID -> {"base": 首次修改时的条目, "changes": {字段: (属性名, 属性值, 条目值)}, "add_tags": [], "attempts": n}
+        self._pending = {}
+        # 正在写入的修改，写入完成前仍需叠加到读取结果上
+        self._inflight = {}
+        self._timers = {}
+        self._flush_locks = {}
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.queued = 0
+        self.writes = 0
+        self.conflicts = 0
+        self.failed = 0
+
+    # ---------------- 记录修改 ----------------
+
+    async def enqueue_property(self, page_id, field, property_name, property_value, value):
+        """记录一次属性修改，field/value 为条目字典中的字段和值；条目不存在时返回 False"""
+        return await self._loop.submit(self._enqueue(page_id, change=(field, property_name, property_value, value)))
+
+    async def enqueue_tag(self, page_id, tag):
+        """记录一次添加标签；条目不存在时返回 False"""
+        return await self._loop.submit(self._enqueue(page_id, add_tag=tag))
+
+    async def _enqueue(self, page_id, change=None, add_tag=None):
+        with self._lock:
+            pending = self._pending.get(page_id)
+        if pending is None:
+            base = await self.manager._fetch_entry_async(page_id)
+            if base is None:
+                return False
+            with self._lock:
+                pending = self._pending.setdefault(page_id, {"base": base, "changes": {}, "add_tags": [], "attempts": 0})
+
+        with self._lock:
+            if change is not None:
+                field, property_name, property_value, value = change
+                pending["changes"][field] = (property_name, property_value, value)
+            if add_tag is not None and add_tag not in pending["add_tags"]:
+                pending["add_tags"].append(add_tag)
+            self.queued += 1
+
+        # 窗口从第一次修改开始计时，窗口内的后续修改合并到同一次写入
+        if page_id not in self._timers:
+            self._timers[page_id] = asyncio.get_running_loop().call_later(self.delay, self._start_flush, page_id)
+        return True
+
+    def discard(self, page_id):
+        """丢弃页面的待写修改（例如条目已被删除）"""
+        with self._lock:
+            self._pending.pop(page_id, None)
+
+    # ---------------- 读取 ----------------
+
+    def overlay(self, entry):
+        """返回叠加了待写修改的条目副本，没有待写修改时原样返回"""
+        if not entry:
+            return entry
+        with self._lock:
+            layers = [self._inflight.get(entry["id"]), self._pending.get(entry["id"])]
+            layers = [layer for layer in layers if layer]
+            if not layers:
+                return entry
+            merged = dict(entry)
+            for layer in layers:
+                for field, (_, _, value) in layer["changes"].items():
+                    merged[field] = value
+                if layer["add_tags"]:
+                    merged["tags"] = _merge_tags(merged.get("tags") or [], layer["add_tags"])
+        return merged
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending) + len(self._inflight)
+        return {
+            "pending": pending,
+            "queued": self.queued,
+            "writes": self.writes,
+            "conflicts": self.conflicts,
+            "failed": self.failed
+        }
+
+    # ---------------- 写入 ----------------
+
+    def _start_flush(self, page_id):
+        self._timers.pop(page_id, None)
+        asyncio.ensure_future(self._flush(page_id))
+
+    async def _flush(self, page_id):
+        # 同一页面的写入串行执行，下一批修改以上一批写入后的页面为基准
+        lock = self._flush_locks.setdefault(page_id, asyncio.Lock())
+        async with lock:
+            with self._lock:
+                pending = self._pending.pop(page_id, None)
+                if pending is None:
+                    return
+                self._inflight[page_id] = pending
+            try:
+                written = await self._write(page_id, pending)
+            except Exception as e:
+                logger.error(f"写入缓冲的修改失败: {page_id}, {str(e)}")
+                written = False
+            with self._lock:
+                self._inflight.pop(page_id, None)
+                if not written:
+                    self._requeue_locked(page_id, pending)
+        if not lock.locked() and page_id not in self._pending:
+            self._flush_locks.pop(page_id, None)
+
+    def _requeue_locked(self, page_id, pending):
+        """写入失败后把修改放回缓冲等待重试，期间新的修改优先"""
+        pending["attempts"] += 1
+        if pending["attempts"] >= WRITE_MAX_ATTEMPTS:
+            self.failed += 1
+            logger.error(f"写入缓冲的修改多次失败，已放弃: {page_id}, {list(pending['changes'])}")
+            return
+        newer = self._pending.get(page_id)
+        if newer is not None:
+            pending["changes"].update(newer["changes"])
+            pending["add_tags"] += [tag for tag in newer["add_tags"] if tag not in pending["add_tags"]]
+        self._pending[page_id] = pending
+        if page_id not in self._timers:
+            delay = self.delay * (2 ** pending["attempts"])
+            self._timers[page_id] = asyncio.get_running_loop().call_later(delay, self._start_flush, page_id)
+
+    async def _write(self, page_id, pending):
+        """读取页面最新状态、排除冲突属性后合并写入一次，成功（或无需写入）返回 True"""
+        transport = self.manager.transport
+        response = await transport.request("GET", f"/pages/{page_id}")
+        if response.status_code == 404:
+            logger.warning(f"条目已不存在，丢弃待写修改: {page_id}")
+            return True
+        if response.status_code != 200:
+            logger.error(f"写入前获取页面失败: HTTP {response.status_code}")
+            return False
+        page = response.json()
+        if page.get("archived") or page.get("in_trash"):
+            logger.warning(f"条目已删除，丢弃待写修改: {page_id}")
+            self.manager._forget_page(page_id)
+            return True
+
+        remote = self.manager._page_to_entry(page)
+        base = pending["base"]
+        properties = {}
+        edited_elsewhere = remote["last_edited_time"] != base.get("last_edited_time")
+        for field, (property_name, property_value, value) in pending["changes"].items():
+            if edited_elsewhere and remote.get(field) != base.get(field) and remote.get(field) != value:
+                # 其他客户端在此期间修改了同一属性，以对方的修改为准
+                self.conflicts += 1
+                logger.warning(f"检测到并发修改，保留 Notion 中的值: {page_id} {property_name} = {remote.get(field)}")
+                continue
+            if remote.get(field) != value:
+                properties[property_name] = property_value
+        if pending["add_tags"]:
+            tags = _merge_tags(remote["tags"], pending["add_tags"])
+            if tags != remote["tags"]:
+                properties["标签"] = {"multi_select": [{"name": tag} for tag in tags]}
+
+        if not properties:
+            self.manager._record_page(page)
+            self._rebase(page_id, page)
+            return True
+
+        response = await transport.request("PATCH", f"/pages/{page_id}", json={"properties": properties})
+        if response.status_code != 200:
+            logger.error(f"合并写入失败: HTTP {response.status_code}, {response.text}")
+            return False
+        self.writes += 1
+        page = response.json()
+        logger.info(f"合并写入完成: {page_id} {list(properties)}")
+        self.manager._record_page(page)
+        self._rebase(page_id, page)
+        return True
+
+    def _rebase(self, page_id, page):
+        """写入期间产生的新修改以本次写入后的页面为基准，不把自己的写入当作并发修改"""
+        with self._lock:
+            newer = self._pending.get(page_id)
+            if newer is not None:
+                newer["base"] = self.manager._page_to_entry(page)
+
+    async def flush_all(self):
+        """立即写入所有待写修改"""
+        await self._loop.submit(self._flush_all())
+
+    async def _flush_all(self):
+        for _ in range(WRITE_MAX_ATTEMPTS):
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+            with self._lock:
+                page_ids = list(self._pending)
+            if not page_ids:
+                return
+            await asyncio.gather(*(self._flush(page_id) for page_id in page_ids))
+
+
+def _merge_tags(tags, add_tags):
+    """在已有标签后追加新标签（去重，最多 MAX_TAGS 个）"""
+    merged = list(tags)
+    for tag in add_tags:
+        if tag not in merged:
+            merged.append(tag)
+    return merged[:MAX_TAGS]
@@ -0,0 +1,112 @@
+"""
+推文批量查询 - 把多个线程中的单条推文请求合并为微批次（micro-batch）
+第一个请求到达后等待一个很短的窗口（linger），窗口内其他并发请求的推文ID合并为一次批量查询，
+凑满 max_batch 个ID时立即发出；查询结果按推文ID分发回各个调用方
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# 官方 API v2 单次批量查询的ID数上限
+MAX_BATCH_SIZE = 100
+
+
+class TweetBatcher:
+    """推文ID的微批次合并器
+
+    - fetch(tweet_id): 阻塞等待该推文所在批次的查询结果，推文不存在时返回 None
+    - fetch_many(tweet_ids): 一次加入多个ID，返回 {推文ID: 结果}
+    lookup(ids) 执行一次批量查询并返回 {推文ID: 结果}，抛出的异常会传给同一批次的所有调用方。
+    同一推文ID的并发请求共享同一个结果。批次在触发它的线程（凑满时）或定时器线程（窗口结束时）中执行。
+    可在多个线程中使用。
+    """
+
+    def __init__(self, lookup, linger, max_batch=MAX_BATCH_SIZE):
+        self.lookup = lookup
+        self.linger = linger
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_SIZE))
+        # 推文ID -> Future，等待下一个批次
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.batches = 0
+        self.requested = 0
+        self.failed_batches = 0
+
+    def fetch(self, tweet_id, timeout=None):
+        """获取单条推文（与其他并发请求合并查询）"""
+        tweet_id = str(tweet_id)
+        return self._submit([tweet_id])[tweet_id].result(timeout)
+
+    def fetch_many(self, tweet_ids, timeout=None):
+        """获取多条推文，超过 max_batch 个时拆分为多个批次"""
+        futures = self._submit([str(tweet_id) for tweet_id in tweet_ids])
+        return {tweet_id: future.result(timeout) for tweet_id, future in futures.items()}
+
+    def _submit(self, tweet_ids):
+        futures = {}
+        with self._lock:
+            for tweet_id in tweet_ids:
+                future = self._pending.get(tweet_id)
+                if future is None:
+                    future = self._pending[tweet_id] = Future()
+                futures[tweet_id] = future
+            # 凑满的批次立即发出，剩余的ID等待窗口结束
+            batches = []
+            while len(self._pending) >= self.max_batch:
+                batches.append(self._take_locked())
+            if self._pending and self._timer is None:
+                self._timer = threading.Timer(self.linger, self._on_linger)
+                self._timer.daemon = True
+                self._timer.start()
+        for batch in batches:
+            self._run(batch)
+        return futures
+
+    def _take_locked(self):
+        ids = list(self._pending)[:self.max_batch]
+        batch = {tweet_id: self._pending.pop(tweet_id) for tweet_id in ids}
+        if not self._pending and self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _on_linger(self):
+        with self._lock:
+            self._timer = None
+            batches = []
+            while self._pending:
+                batches.append(self._take_locked())
+        for batch in batches:
+            self._run(batch)
+
+    def _run(self, batch):
+        with self._lock:
+            self.batches += 1
+            self.requested += len(batch)
+        logger.info(f"批量查询 {len(batch)} 条推文")
+        try:
+            results = self.lookup(list(batch))
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+            for future in batch.values():
+                future.set_exception(e)
+            return
+        for tweet_id, future in batch.items():
+            future.set_result(results.get(tweet_id))
+
+    def stats(self):
+        """返回批次数、查询的推文数和平均批次大小"""
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "requested": self.requested,
+                "failed_batches": self.failed_batches,
+                "average_size": (self.requested / self.batches) if self.batches else 0.0
+            }
@@ -0,0 +1,324 @@
+"""
+推文数据源编排 - 健康评分排序 + 对冲（hedged）请求
+按各数据源的成功率、延迟、限流和冷却状态动态决定请求顺序；
+先向第一个数据源发出请求，超过该数据源的延迟分位数仍未返回时，再向下一个数据源发出请求，
+采用最先返回的有效结果；某个数据源失败时立即启用下一个，不必等待对冲延迟
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from app.config import (
+    TWITTER_HEDGE_DELAY,
+    TWITTER_HEDGE_PERCENTILE,
+    TWITTER_PROVIDER_FAILURE_THRESHOLD,
+    TWITTER_PROVIDER_COOLDOWN
+)
+
+logger = logging.getLogger(__name__)
+
+# 对冲延迟的下限（秒）
+HEDGE_MIN_DELAY = 0.5
+# 每个数据源保留的最近成功延迟样本数，以及开始使用分位数所需的最少样本数
+LATENCY_WINDOW = 50
+LATENCY_MIN_SAMPLES = 5
+# 同时进行的数据源请求上限（所有推文共享）
+MAX_PROVIDER_WORKERS = 8
+# 成功率和延迟 EWMA 的平滑系数
+HEALTH_ALPHA = 0.2
+# 计算评分时成功率的下限，避免除以 0
+MIN_SUCCESS_RATE = 0.05
+# 连续失败导致的冷却时间上限（秒），每次冷却后再失败冷却时间加倍
+MAX_COOLDOWN = 1800
+# 限流但未提供恢复时间时的默认冷却（秒）
+DEFAULT_RATE_LIMIT_COOLDOWN = 60
+# 数据源状态
+STATE_HEALTHY = "healthy"
+STATE_COOLDOWN = "cooldown"
+STATE_RATE_LIMITED = "rate_limited"
+
+
+class ProviderRateLimited(Exception):
+    """数据源限流或配额用尽；retry_after 为恢复前的秒数（未知时为 None）"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TweetProvider:
+    """推文数据源
+
+    - name: 数据源名称（用于日志和统计）
+    - fetch(tweet_id, url): 返回统一的 tweet_data 结构，失败返回 None 或抛出异常
+    """
+
+    def __init__(self, name, fetch):
+        self.name = name
+        self.fetch = fetch
+
+    def __repr__(self):
+        return f"TweetProvider({self.name})"
+
+
+def is_valid_tweet(tweet_data):
+    """数据源返回的结果是否可用：包含非空的推文内容"""
+    return isinstance(tweet_data, dict) and bool((tweet_data.get("content") or "").strip())
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ProviderHealth:
+    """单个数据源的健康状态
+
+    - success_rate / latency: 成功率和成功请求延迟的 EWMA
+    - 连续失败 TWITTER_PROVIDER_FAILURE_THRESHOLD 次后进入冷却，冷却时间每次加倍；
+      限流或配额用尽时冷却到恢复时间
+    - score(): 期望获取时间（延迟 / 成功率），越小越优先；尚未请求过的数据源评分为 0，优先试用一次
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.success_rate = 1.0
+        self.latency = None
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.quota_remaining = None
+        self.state = STATE_HEALTHY
+        self.unavailable_until = 0.0
+        self._cooldown = TWITTER_PROVIDER_COOLDOWN
+
+    def available(self, now):
+        if self.state != STATE_HEALTHY and now >= self.unavailable_until:
+            # 冷却结束，重新参与排序；再次失败时冷却时间加倍
+            self.state = STATE_HEALTHY
+        return self.state == STATE_HEALTHY
+
+    def score(self, default_latency):
+        if self.successes == 0 and self.failures == 0:
+            return 0.0
+        latency = self.latency if self.latency is not None else default_latency
+        return latency / max(self.success_rate, MIN_SUCCESS_RATE)
+
+    def record_success(self, latency):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self._cooldown = TWITTER_PROVIDER_COOLDOWN
+        self.success_rate += HEALTH_ALPHA * (1.0 - self.success_rate)
+        self.latency = latency if self.latency is None else self.latency + HEALTH_ALPHA * (latency - self.latency)
+
+    def record_failure(self, now):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.success_rate -= HEALTH_ALPHA * self.success_rate
+        if self.consecutive_failures >= TWITTER_PROVIDER_FAILURE_THRESHOLD and self.state == STATE_HEALTHY:
+            self.state = STATE_COOLDOWN
+            self.unavailable_until = now + self._cooldown
+            logger.warning(f"推文数据源 {self.name} 连续失败 {self.consecutive_failures} 次，冷却 {self._cooldown:.0f}秒")
+            self._cooldown = min(self._cooldown * 2, MAX_COOLDOWN)
+            self.consecutive_failures = 0
+
+    def record_rate_limited(self, now, retry_after):
+        self.rate_limited += 1
+        retry_after = retry_after if retry_after is not None else DEFAULT_RATE_LIMIT_COOLDOWN
+        self.state = STATE_RATE_LIMITED
+        self.unavailable_until = max(self.unavailable_until, now + retry_after)
+        logger.warning(f"推文数据源 {self.name} 被限流，{retry_after:.0f}秒内不再使用")
+
+    def record_quota(self, now, remaining, reset_after):
+        self.quota_remaining = remaining
+        if remaining is not None and remaining <= 0:
+            self.record_rate_limited(now, reset_after)
+
+    def snapshot(self, now, default_latency):
+        return {
+            "state": self.state if now < self.unavailable_until else STATE_HEALTHY,
+            "success_rate": self.success_rate,
+            "latency": self.latency,
+            "score": self.score(default_latency),
+            "unavailable_for": max(0.0, self.unavailable_until - now),
+            "quota_remaining": self.quota_remaining,
+            "successes": self.successes,
+            "failures": self.failures,
+            "rate_limited": self.rate_limited
+        }
+
+
+class HedgedFetcher:
+    """按健康评分排序后依次对冲请求多个数据源
+
+    数据源的调用是阻塞的（tweepy / requests），在共享线程池中执行；已在执行的落选请求无法中断，
+    其结果被丢弃（各数据源自身的请求超时限制了占用时间），尚未开始的请求会被取消。可在多个线程中使用。
+    """
+
+    def __init__(self, hedge_delay=TWITTER_HEDGE_DELAY, percentile=TWITTER_HEDGE_PERCENTILE, max_workers=MAX_PROVIDER_WORKERS):
+        self.hedge_delay = hedge_delay
+        self.percentile = percentile
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tweet-provider")
+        self._latencies = {}
+        self._stats = {}
+        self._health = {}
+        self._lock = threading.Lock()
+        # 最近一次使用的数据源顺序
+        self.last_order = []
+
+        # 统计信息
+        self.requests = 0
+        self.hedges = 0
+        self.failed = 0
+
+    def hedge_delay_for(self, name):
+        """数据源的对冲延迟：最近成功请求延迟的分位数，样本不足时使用 TWITTER_HEDGE_DELAY"""
+        with self._lock:
+            samples = list(self._latencies.get(name, ()))
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return self.hedge_delay
+        return max(HEDGE_MIN_DELAY, _percentile(samples, self.percentile))
+
+    def _health_of(self, name):
+        health = self._health.get(name)
+        if health is None:
+            health = self._health[name] = ProviderHealth(name)
+        return health
+
+    def order(self, providers):
+        """按健康评分排序数据源（评分相同时保持传入的顺序），冷却或限流中的数据源不参与；
+        全部不可用时按恢复时间排序后全部使用
+        """
+        now = time.monotonic()
+        with self._lock:
+            ranked = [(self._health_of(provider.name), index, provider) for index, provider in enumerate(providers)]
+            available = [item for item in ranked if item[0].available(now)]
+            if available:
+                available.sort(key=lambda item: (item[0].score(self.hedge_delay), item[1]))
+                ordered = [provider for _, _, provider in available]
+            else:
+                ranked.sort(key=lambda item: (item[0].unavailable_until, item[1]))
+                ordered = [provider for _, _, provider in ranked]
+            self.last_order = [provider.name for provider in ordered]
+        return ordered
+
+    def report_quota(self, name, remaining, reset_after=None):
+        """数据源报告剩余配额（如 RapidAPI 的响应头），配额用尽时在 reset_after 秒内不再使用"""
+        with self._lock:
+            self._health_of(name).record_quota(time.monotonic(), remaining, reset_after)
+
+    def report_rate_limited(self, name, retry_after=None):
+        """不经过 fetch 的请求（如推文串的会话搜索）被限流时报告，retry_after 秒内 is_available 返回 False"""
+        with self._lock:
+            stats = self._stats.setdefault(name, {"success": 0, "failure": 0, "cancelled": 0, "rate_limited": 0})
+            stats["rate_limited"] += 1
+            self._health_of(name).record_rate_limited(time.monotonic(), retry_after)
+
+    def is_available(self, name):
+        with self._lock:
+            return self._health_of(name).available(time.monotonic())
+
+    def fetch(self, providers, tweet_id, url):
+        """按健康评分排序后对冲请求 providers，返回最先得到的有效 tweet_data，全部失败返回 None"""
+        queue = self.order(providers)
+        if not queue:
+            return None
+        with self._lock:
+            self.requests += 1
+        pending = {}
+        next_hedge_at = None
+
+        def launch(hedged):
+            nonlocal next_hedge_at
+            provider = queue.pop(0)
+            if hedged:
+                with self._lock:
+                    self.hedges += 1
+                logger.info(f"推文 {tweet_id} 的请求超过对冲延迟，同时请求 {provider.name}")
+            started = time.monotonic()
+            future = self._executor.submit(provider.fetch, tweet_id, url)
+            future.add_done_callback(lambda f: self._record(provider.name, f, started))
+            pending[future] = provider
+            next_hedge_at = started + self.hedge_delay_for(provider.name)
+
+        launch(False)
+        while pending:
+            timeout = max(0.0, next_hedge_at - time.monotonic()) if queue else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    tweet_data = future.result()
+                except Exception as e:
+                    logger.warning(f"{provider.name} 获取推文失败: {str(e)}")
+                    continue
+                if is_valid_tweet(tweet_data):
+                    for loser in pending:
+                        loser.cancel()
+                    logger.info(f"推文 {tweet_id} 由 {provider.name} 返回")
+                    return tweet_data
+                logger.warning(f"{provider.name} 未返回有效的推文数据: {tweet_id}")
+
+            if queue and (not done or not pending or time.monotonic() >= next_hedge_at):
+                # 对冲延迟已到，或已发出的请求都失败了：启用下一个数据源
+                launch(bool(pending))
+
+        with self._lock:
+            self.failed += 1
+        logger.error(f"所有推文数据源均无法获取数据: {tweet_id}")
+        return None
+
+    def _record(self, name, future, started):
+        """记录每个请求的结果（包括落选的请求），用于计算对冲延迟、健康评分和统计"""
+        retry_after = None
+        if future.cancelled():
+            outcome = "cancelled"
+        else:
+            try:
+                outcome = "success" if is_valid_tweet(future.result()) else "failure"
+            except ProviderRateLimited as e:
+                outcome = "rate_limited"
+                retry_after = e.retry_after
+            except Exception:
+                outcome = "failure"
+        now = time.monotonic()
+        with self._lock:
+            stats = self._stats.setdefault(name, {"success": 0, "failure": 0, "cancelled": 0, "rate_limited": 0})
+            stats[outcome] += 1
+            health = self._health_of(name)
+            if outcome == "success":
+                self._latencies.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append(now - started)
+                health.record_success(now - started)
+            elif outcome == "failure":
+                health.record_failure(now)
+            elif outcome == "rate_limited":
+                health.record_rate_limited(now, retry_after)
+
+    def stats(self):
+        """返回对冲统计、最近的数据源顺序，以及各数据源的结果次数、延迟中位数、对冲延迟和健康状态"""
+        now = time.monotonic()
+        with self._lock:
+            providers = {
+                name: dict(
+                    self._stats.get(name, {"success": 0, "failure": 0, "cancelled": 0, "rate_limited": 0}),
+                    p50=_percentile(self._latencies[name], 0.5) if self._latencies.get(name) else None,
+                    health=health.snapshot(now, self.hedge_delay)
+                )
+                for name, health in self._health.items()
+            }
+            order = list(self.last_order)
+        for name, stats in providers.items():
+            stats["hedge_delay"] = self.hedge_delay_for(name)
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "failed": self.failed,
+            "order": order,
+            "providers": providers
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,10 +1,12 @@
 """
 Twitter API 模块 - 使用官方API获取推文数据
-作为内容抓取的备用方案
+作为内容抓取的备用方案；官方 API、Scraper.tech 和 RapidAPI 作为数据源，按健康评分排序后对冲请求
 """
 
 import re
+import time
 import logging
+from concurrent.futures import ThreadPoolExecutor
 import tweepy
 import requests
 from requests import Response
@@ -18,17 +20,71 @@ from app.config import (
     CAN_USE_TWITTER_API,
     SCRAPER_TECH_ENDPOINT,
     SCRAPER_TECH_KEY,
-    RAPIDAPI_KEY
+    RAPIDAPI_KEY,
+    TWEET_CACHE_ENABLED,
+    TWEET_CACHE_PATH,
+    TWEET_CACHE_TTL,
+    TWEET_CACHE_MAX_ENTRIES,
+    TWITTER_BATCH_LINGER,
+    TWITTER_BATCH_MAX_SIZE,
+    TWEET_THREAD_EXPANSION_ENABLED,
+    TWEET_THREAD_MAX_DEPTH,
+    TWEET_THREAD_MAX_TWEETS,
+    TWEET_THREAD_MAX_CHARS
 )
+from app.common.sqlite_cache import SQLiteCache
+from app.services.tweet_batcher import TweetBatcher
+from app.core.url_index import resolve_short_url
+from app.services.tweet_providers import TweetProvider, HedgedFetcher, ProviderRateLimited, is_valid_tweet
 
 logger = logging.getLogger(__name__)
 
+# API v2 推文查询的扩展字段（单条和批量查询相同）
+V2_EXPANSIONS = ["author_id", "referenced_tweets.id", "attachments.media_keys"]
+V2_TWEET_FIELDS = ["created_at", "public_metrics", "entities", "context_annotations", "conversation_id"]
+V2_USER_FIELDS = ["name", "username", "profile_image_url", "verified", "description"]
+V2_MEDIA_FIELDS = ["preview_image_url", "url"]
+# 推文串中被引用推文的类型
+REF_REPLIED_TO = "replied_to"
+REF_QUOTED = "quoted"
+# 会话搜索（search_recent_tweets）的配额与推文查询分开计算，单独记录限流状态
+SEARCH_PROVIDER = "twitter_api_v2_search"
+
+
+def _header_number(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate_limit_error(provider, response):
+    """HTTP 429 转换为 ProviderRateLimited，按 Retry-After 或 x-rate-limit-reset（时间戳）计算恢复时间"""
+    retry_after = _header_number(response.headers, "Retry-After")
+    reset_at = _header_number(response.headers, "x-rate-limit-reset")
+    if retry_after is None and reset_at is not None:
+        retry_after = max(0.0, reset_at - time.time())
+    return ProviderRateLimited(f"{provider} 限流 (HTTP 429)", retry_after)
+
 class TwitterAPI:
     def __init__(self):
         """初始化Twitter API客户端"""
         self.api_v1 = None
         self.client_v2 = None
         self.is_initialized = False
+        # 官方 API v2 的批量查询（仅在官方 API 可用时创建）
+        self.batcher = None
+        # 推文串展开时与引用推文查询并行执行会话搜索（仅在启用展开时创建）
+        self._thread_executor = None
+        # 多个数据源之间的对冲请求
+        self.fetcher = HedgedFetcher()
+        # 按推文ID缓存解析后的推文数据，重复发送或多人转发的推文不再请求数据源
+        self.tweet_cache = SQLiteCache(
+            TWEET_CACHE_PATH,
+            "tweets",
+            ttl=TWEET_CACHE_TTL,
+            max_entries=TWEET_CACHE_MAX_ENTRIES
+        ) if TWEET_CACHE_ENABLED else None
         
         # 优先检查 Scraper.tech 配置
         if SCRAPER_TECH_KEY:
@@ -65,6 +121,10 @@ class TwitterAPI:
                 # wait_on_rate_limit=True
             )
             
+            self.batcher = TweetBatcher(self._lookup_v2, linger=TWITTER_BATCH_LINGER, max_batch=TWITTER_BATCH_MAX_SIZE)
+            if TWEET_THREAD_EXPANSION_ENABLED:
+                self._thread_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tweet-thread")
+            
             self.is_initialized = True
             logger.info("Twitter API客户端初始化成功")
         except Exception as e:
@@ -78,17 +138,13 @@ class TwitterAPI:
         if match:
             return match.group(1)
             
-        # 处理Twitter短链接
+        # 处理Twitter短链接（展开结果有缓存）
         short_pattern = r'(?:t\.co)/(\w+)'
         match = re.search(short_pattern, url)
         if match:
-            try:
-                # 尝试使用requests展开短链接
-                import requests
-                response = requests.head(url, allow_redirects=True, timeout=10)
-                return self.extract_tweet_id_from_url(response.url)
-            except Exception as e:
-                logger.warning(f"展开短链接失败: {str(e)}")
+            resolved = resolve_short_url(url)
+            if resolved != url:
+                return self.extract_tweet_id_from_url(resolved)
                 
         return None
         
@@ -119,82 +175,285 @@ class TwitterAPI:
             if not tweet_id:
                 logger.warning(f"无法从URL中提取推文ID: {url}")
                 return None
-                
-            # 若官方API不可用，直接走备用
-            if not self.is_initialized:
-                logger.info(f"官方API未初始化，尝试使用备用接口抓取: {tweet_id}")
-                return self._fetch_with_fallback(tweet_id, url)
-
-            logger.info(f"尝试使用官方API获取推文: {tweet_id}")
             
-            # 使用API v2获取推文数据
-            tweet = self.client_v2.get_tweet(
-                id=tweet_id,
-                expansions=[
-                    "author_id", 
-                    "referenced_tweets.id", 
-                    "attachments.media_keys"
-                ],
-                tweet_fields=[
-                    "created_at", 
-                    "public_metrics", 
-                    "entities", 
-                    "context_annotations", 
-                    "conversation_id"
-                ],
-                user_fields=[
-                    "name", 
-                    "username", 
-                    "profile_image_url", 
-                    "verified", 
-                    "description"
-                ],
-                media_fields=["preview_image_url", "url"]
-            )
+            if self.tweet_cache is not None:
+                cached = self.tweet_cache.get(tweet_id)
+                if cached:
+                    logger.info(f"推文 {tweet_id} 命中缓存")
+                    if cached.pop("thread_pending", False):
+                        # 批量预取的推文尚未展开推文串，在这里展开后更新缓存
+                        cached = self.expand_thread(tweet_id, cached)
+                        self.tweet_cache.set(tweet_id, cached)
+                    # 同一条推文可能来自不同的链接，保留本次请求的链接
+                    return dict(cached, url=url)
             
-            if not tweet or not tweet.data:
-                logger.warning(f"使用API v2获取推文失败，尝试使用API v1.1: {tweet_id}")
-                
-                # 尝试使用API v1.1作为备选
-                try:
-                    tweet_v1 = self.api_v1.get_status(
-                        tweet_id, 
-                        tweet_mode="extended", 
-                        include_entities=True
-                    )
-                    return self._parse_tweet_v1(tweet_v1, url)
-                except Exception as e:
-                    logger.error(f"使用API v1.1获取推文失败: {str(e)}")
-                    return None
+            providers = self._providers()
+            if not providers:
+                logger.error("没有可用的推文数据源")
+                return None
             
-            # 解析API v2返回的数据
-            return self._parse_tweet_v2(tweet, url)
+            logger.info(f"获取推文 {tweet_id}，数据源: {', '.join(provider.name for provider in providers)}")
+            tweet_data = self.fetcher.fetch(providers, tweet_id, url)
+            if is_valid_tweet(tweet_data):
+                tweet_data = self.expand_thread(tweet_id, tweet_data)
+            if self.tweet_cache is not None and is_valid_tweet(tweet_data):
+                self.tweet_cache.set(tweet_id, tweet_data)
+            return tweet_data
             
         except Exception as e:
-            err_text = str(e)
-            logger.error(f"获取推文数据失败: {err_text}")
-            # 任何错误都尝试使用备用抓取，确保尽可能获取内容
-            tweet_id = self.extract_tweet_id_from_url(url)
-            if tweet_id:
-                logger.info(f"官方API调用失败，改用备用接口抓取: {tweet_id}")
-                return self._fetch_with_fallback(tweet_id, url)
+            logger.error(f"获取推文数据失败: {str(e)}")
             return None
 
-    def _fetch_with_fallback(self, tweet_id: str, url: str):
-        """尝试所有可用的备用抓取方式"""
-        # 1. 优先尝试 Scraper.tech
+    def _providers(self):
+        """可用的数据源（默认顺序）：官方 API v2、v1.1，然后是 Scraper.tech、RapidAPI；
+        实际请求顺序由 HedgedFetcher 按健康评分决定
+        """
+        providers = []
+        if self.is_initialized:
+            providers.append(TweetProvider("twitter_api_v2", self._fetch_via_v2))
+            providers.append(TweetProvider("twitter_api_v1", self._fetch_via_v1))
         if SCRAPER_TECH_KEY:
-            result = self._fetch_via_scraper(tweet_id, url)
-            if result:
-                return result
-            logger.warning(f"Scraper.tech 抓取失败/无响应，尝试 RapidAPI: {tweet_id}")
-        
-        # 2. 尝试 RapidAPI Fallback
+            providers.append(TweetProvider("scraper_tech", self._fetch_via_scraper))
         if RAPIDAPI_KEY:
-            return self._fetch_via_rapidapi(tweet_id, url)
-            
-        logger.error("所有备用接口均无法获取数据")
-        return None
+            providers.append(TweetProvider("rapidapi", self._fetch_via_rapidapi))
+        return providers
+
+    def _fetch_via_v2(self, tweet_id: str, original_url: str):
+        """通过官方 API v2 获取推文（与其他并发请求合并为批量查询）"""
+        return self._parse_tweet_v2(self.batcher.fetch(tweet_id), original_url)
+
+    def _lookup_v2(self, tweet_ids):
+        """一次 get_tweets 请求查询多条推文，返回 {推文ID: 单条推文的 tweepy.Response}"""
+        try:
+            response = self.client_v2.get_tweets(
+                ids=tweet_ids,
+                expansions=V2_EXPANSIONS,
+                tweet_fields=V2_TWEET_FIELDS,
+                user_fields=V2_USER_FIELDS,
+                media_fields=V2_MEDIA_FIELDS
+            )
+        except tweepy.TooManyRequests as e:
+            raise _rate_limit_error("twitter_api_v2", e.response)
+        # 每条推文与整批的 includes 组成单条查询的响应结构，供 _parse_tweet_v2 解析
+        return {
+            str(tweet.id): tweepy.Response(tweet, response.includes or {}, response.errors, response.meta)
+            for tweet in response.data or []
+        }
+
+    def prefetch_tweets(self, urls):
+        """批量预取多条推文并写入缓存（批量导入时使用），之后逐条处理时直接命中缓存；
+        只使用官方 API v2 的批量查询，未取到的推文留给逐条处理时的对冲流程；返回写入缓存的条数。
+        预取时不展开推文串（每条推文一次会话搜索会很快用完搜索配额），启用推文串展开时
+        缓存的推文标记为待展开，由逐条处理时展开
+        """
+        if self.batcher is None or self.tweet_cache is None:
+            return 0
+        # 在后台执行、没有调用方等待结果，所有异常在这里记录
+        try:
+            return self._prefetch_tweets(urls)
+        except Exception as e:
+            logger.warning(f"批量预取推文失败: {str(e)}")
+            return 0
+
+    def _prefetch_tweets(self, urls):
+        wanted = {}
+        for url in urls:
+            tweet_id = self.extract_tweet_id_from_url(url)
+            if tweet_id and tweet_id not in wanted and self.tweet_cache.get(tweet_id) is None:
+                wanted[tweet_id] = url
+        if not wanted:
+            return 0
+        responses = self.batcher.fetch_many(wanted)
+        cached = 0
+        for tweet_id, url in wanted.items():
+            tweet_data = self._parse_tweet_v2(responses.get(tweet_id), url)
+            if is_valid_tweet(tweet_data):
+                if self._thread_executor is not None:
+                    tweet_data = dict(tweet_data, thread_pending=True)
+                self.tweet_cache.set(tweet_id, tweet_data)
+                cached += 1
+        logger.info(f"批量预取推文: {cached}/{len(wanted)} 条已缓存")
+        return cached
+
+    def _fetch_via_v1(self, tweet_id: str, original_url: str):
+        """通过官方 API v1.1 获取推文"""
+        try:
+            tweet_v1 = self.api_v1.get_status(
+                tweet_id, 
+                tweet_mode="extended", 
+                include_entities=True
+            )
+        except tweepy.TooManyRequests as e:
+            raise _rate_limit_error("twitter_api_v1", e.response)
+        return self._parse_tweet_v1(tweet_v1, original_url)
+
+    # ---------------- 推文串展开 ----------------
+
+    def expand_thread(self, tweet_id, tweet_data):
+        """推文串展开：补充回复的推文、作者在同一会话中的后续推文（自回复）和引用的推文，
+        合并为一篇内容（推文数和字数有上限）；未启用、无法展开或没有关联推文时原样返回
+        """
+        if self._thread_executor is None:
+            return tweet_data
+        try:
+            root = self._thread_root(tweet_id, tweet_data)
+            if root is None:
+                return tweet_data
+            # 会话搜索与引用推文的逐层批量查询并行执行
+            search = None
+            if root["conversation_id"] and root["username"] and self.fetcher.is_available(SEARCH_PROVIDER):
+                search = self._thread_executor.submit(self._search_self_replies, root)
+            referenced = self._fetch_referenced(root)
+            replies = []
+            if search is not None:
+                try:
+                    replies = search.result()
+                except Exception as e:
+                    logger.warning(f"搜索推文串失败: {str(e)}")
+        except Exception as e:
+            logger.warning(f"展开推文串失败: {tweet_id}, {str(e)}")
+            return tweet_data
+
+        sections, total = self._assemble_thread(root, referenced, replies)
+        if len(sections) <= 1:
+            return tweet_data
+        content = "\n\n".join(f"【{label}】@{node['username'] or '未知作者'}:\n{node['text']}" for label, node in sections)
+        logger.info(f"推文串展开: {tweet_id} 合并 {len(sections)}/{total} 条推文")
+        meta = dict(tweet_data.get("tweet_meta") or {}, thread={
+            "tweets": len(sections),
+            "found": total,
+            "truncated": len(sections) < total
+        })
+        return dict(tweet_data, content=content, tweet_meta=meta)
+
+    @staticmethod
+    def _users(response):
+        return {user.id: user for user in (response.includes or {}).get("users", [])}
+
+    @staticmethod
+    def _thread_node(tweet, users):
+        """API v2 推文对象 -> 推文串节点"""
+        author = users.get(tweet.author_id)
+        return {
+            "id": str(tweet.id),
+            "text": tweet.text,
+            "author_id": str(tweet.author_id) if tweet.author_id else None,
+            "username": author.username if author else None,
+            "conversation_id": str(tweet.conversation_id) if tweet.conversation_id else None,
+            "refs": [(ref.type, str(ref.id)) for ref in tweet.referenced_tweets or []]
+        }
+
+    def _thread_root(self, tweet_id, tweet_data):
+        """原推文的推文串节点：官方 API v2 返回的数据直接使用，其他数据源的结果通过批量查询补充会话信息"""
+        meta = tweet_data.get("tweet_meta") or {}
+        if meta.get("tweet_id"):
+            return {
+                "id": meta["tweet_id"],
+                "text": tweet_data["content"],
+                "author_id": meta.get("author_id"),
+                "username": meta.get("username"),
+                "conversation_id": meta.get("conversation_id"),
+                "refs": [(ref["type"], ref["id"]) for ref in meta.get("referenced_tweets") or []]
+            }
+        response = self.batcher.fetch(tweet_id)
+        if not response or not response.data:
+            return None
+        return self._thread_node(response.data, self._users(response))
+
+    def _fetch_referenced(self, root):
+        """沿回复/引用关系逐层展开（每层一次批量查询），最多 TWEET_THREAD_MAX_DEPTH 层，返回 [(引用类型, 节点)]"""
+        found = []
+        seen = {root["id"]}
+        frontier = root["refs"]
+        for _ in range(TWEET_THREAD_MAX_DEPTH):
+            layer = []
+            for ref_type, ref_id in frontier:
+                if ref_id not in seen:
+                    seen.add(ref_id)
+                    layer.append((ref_type, ref_id))
+            layer = layer[:max(0, TWEET_THREAD_MAX_TWEETS - 1 - len(found))]
+            if not layer:
+                break
+            responses = self.batcher.fetch_many([ref_id for _, ref_id in layer])
+            frontier = []
+            for ref_type, ref_id in layer:
+                response = responses.get(ref_id)
+                if not response or not response.data:
+                    continue
+                node = self._thread_node(response.data, self._users(response))
+                found.append((ref_type, node))
+                # 被回复的推文继续向上展开；被引用的推文只展开其中再次引用的推文
+                frontier += [ref for ref in node["refs"] if ref_type == REF_REPLIED_TO or ref[0] == REF_QUOTED]
+        return found
+
+    def _search_self_replies(self, root):
+        """搜索作者在同一会话中的推文（search_recent_tweets 只覆盖最近7天）；
+        被限流时报告给 HedgedFetcher，恢复之前不再搜索
+        """
+        try:
+            response = self.client_v2.search_recent_tweets(
+                query=f"conversation_id:{root['conversation_id']} from:{root['username']}",
+                max_results=min(100, max(10, TWEET_THREAD_MAX_TWEETS)),
+                expansions=V2_EXPANSIONS,
+                tweet_fields=V2_TWEET_FIELDS,
+                user_fields=V2_USER_FIELDS
+            )
+        except tweepy.TooManyRequests as e:
+            error = _rate_limit_error(SEARCH_PROVIDER, e.response)
+            self.fetcher.report_rate_limited(SEARCH_PROVIDER, error.retry_after)
+            raise error
+        users = self._users(response)
+        return [self._thread_node(tweet, users) for tweet in response.data or []]
+
+    @staticmethod
+    def _assemble_thread(root, referenced, replies):
+        """按 原推文 > 后续推文 > 前文 > 引用 的优先级在推文数和字数上限内选取，再按阅读顺序排列；
+        返回 ([(标题, 节点)], 找到的推文总数)
+        """
+        ancestors = sorted((node for ref_type, node in referenced if ref_type == REF_REPLIED_TO), key=lambda node: int(node["id"]))
+        quoted = [node for ref_type, node in referenced if ref_type == REF_QUOTED]
+
+        # 只保留接在推文串上的自回复（回复的是原推文、前文或已保留的自回复），按时间顺序
+        chain = {root["id"], *(node["id"] for node in ancestors)}
+        if root["conversation_id"]:
+            chain.add(root["conversation_id"])
+        known = set(chain) | {node["id"] for node in quoted}
+        followups = []
+        for node in sorted(replies, key=lambda node: int(node["id"])):
+            parent = next((ref_id for ref_type, ref_id in node["refs"] if ref_type == REF_REPLIED_TO), None)
+            if node["id"] not in known and parent in chain:
+                chain.add(node["id"])
+                followups.append(node)
+
+        selected = set()
+        chars = 0
+        for node in [root] + followups + ancestors[::-1] + quoted:
+            if len(selected) >= TWEET_THREAD_MAX_TWEETS:
+                break
+            if selected and chars + len(node["text"]) > TWEET_THREAD_MAX_CHARS:
+                continue
+            selected.add(node["id"])
+            chars += len(node["text"])
+
+        sections = [
+            ("推文串前文" if node["author_id"] == root["author_id"] else "回复的推文", node) for node in ancestors
+        ] + [("原推文", root)] + [
+            (f"后续推文 {index}", node) for index, node in enumerate(followups, 1)
+        ] + [("引用的推文", node) for node in quoted]
+        total = len(sections)
+        return [(label, node) for label, node in sections if node["id"] in selected], total
+
+    def shutdown(self):
+        """关闭数据源和推文串展开的线程池"""
+        self.fetcher.shutdown()
+        if self._thread_executor is not None:
+            self._thread_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _report_quota(self, provider, response):
+        """记录 RapidAPI 风格的配额响应头（x-ratelimit-requests-remaining / -reset）"""
+        remaining = _header_number(response.headers, "x-ratelimit-requests-remaining")
+        if remaining is not None:
+            self.fetcher.report_quota(provider, remaining, _header_number(response.headers, "x-ratelimit-requests-reset"))
 
     def _fetch_via_scraper(self, tweet_id: str, original_url: str):
         """通过公开 scraper 接口抓取推文数据"""
@@ -207,11 +466,16 @@ class TwitterAPI:
                 headers=headers,
                 timeout=30
             )
+            if resp.status_code == 429:
+                raise _rate_limit_error("scraper_tech", resp)
+            self._report_quota("scraper_tech", resp)
             if resp.status_code != 200:
                 logger.error(f"Scraper.tech 返回非200: {resp.status_code} {resp.text[:200]}")
                 return None
             data = resp.json()
-            return self._parse_scraper_payload(data, original_url)
+            return self._parse_scraper_payload(data, original_url, via="scraper_tech")
+        except ProviderRateLimited:
+            raise
         except Exception as e:
             logger.error(f"调用 Scraper.tech 出错: {str(e)}")
             return None
@@ -229,19 +493,24 @@ class TwitterAPI:
             logger.info(f"正在尝试 RapidAPI 备用接口: {tweet_id}")
             resp = requests.get(url, headers=headers, params=querystring, timeout=30)
             
+            if resp.status_code == 429:
+                raise _rate_limit_error("rapidapi", resp)
+            self._report_quota("rapidapi", resp)
             if resp.status_code != 200:
                 logger.error(f"RapidAPI 返回非200: {resp.status_code} {resp.text[:200]}")
                 return None
                 
             data = resp.json()
             # 用户确认 RapidAPI 返回结构与 Scraper.tech 一致，直接复用解析逻辑
-            return self._parse_scraper_payload(data, original_url)
+            return self._parse_scraper_payload(data, original_url, via="rapidapi")
+        except ProviderRateLimited:
+            raise
         except Exception as e:
             logger.error(f"调用 RapidAPI 出错: {str(e)}")
             return None
 
-    def _parse_scraper_payload(self, data: dict, original_url: str):
-        """解析 scraper 返回的 JSON 形成统一 tweet_data 结构"""
+    def _parse_scraper_payload(self, data: dict, original_url: str, via: str = "scraper_tech"):
+        """解析 scraper（Scraper.tech / RapidAPI）返回的 JSON 形成统一 tweet_data 结构"""
         if not isinstance(data, dict):
             return None
 
@@ -275,10 +544,10 @@ class TwitterAPI:
                 "date": data.get("created_at"),
                 "tags": hashtags,
                 "mentions": [m.get("screen_name") for m in (entities.get("user_mentions") or []) if isinstance(m, dict) and m.get("screen_name")],
-                "via": "scraper_tech"
+                "via": via
             }
         }
-        logger.info("成功通过 Scraper.tech 解析推文数据")
+        logger.info(f"成功解析 {via} 返回的推文数据")
         return tweet_data
             
     def _parse_tweet_v2(self, tweet_response, original_url):
@@ -287,7 +556,7 @@ class TwitterAPI:
             return None
             
         tweet = tweet_response.data
-        users = {user.id: user for user in tweet_response.includes.get("users", [])} if hasattr(tweet_response.includes, "users") else {}
+        users = {user.id: user for user in (tweet_response.includes or {}).get("users", [])}
         
         # 获取作者信息
         author = None
@@ -322,7 +591,12 @@ class TwitterAPI:
                 "date": tweet.created_at.isoformat() if hasattr(tweet, "created_at") else None,
                 "tags": hashtags,
                 "mentions": mentions,
-                "via": "twitter_api_v2"
+                "via": "twitter_api_v2",
+                # 推文串展开使用的会话和引用关系
+                "tweet_id": str(tweet.id),
+                "author_id": str(tweet.author_id) if tweet.author_id else None,
+                "conversation_id": str(tweet.conversation_id) if tweet.conversation_id else None,
+                "referenced_tweets": [{"type": ref.type, "id": str(ref.id)} for ref in tweet.referenced_tweets or []]
             }
         }
         
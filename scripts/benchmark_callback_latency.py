@@ -0,0 +1,147 @@
+"""
+回调延迟基准测试
+模拟 N 个链接经处理队列和 LinkPipeline 同时处理时，机器人事件循环处理其他回调的延迟 (p50/p99)
+抓取替换为固定耗时的阻塞调用，DeepSeek 分析替换为固定耗时的等待，Notion 替换为内存实现；
+对比旧的阻塞调用方式（在协程中直接调用同步方法）与实际使用的方式（抓取在线程池中执行，分析直接 await 异步客户端）
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# 基准测试不访问真实服务，填充占位环境变量以便导入配置
+for var in ['TELEGRAM_BOT_TOKEN', 'NOTION_API_TOKEN', 'NOTION_DATABASE_ID', 'DEEPSEEK_API_KEY', 'TARGET_CHAT_ID']:
+    os.environ.setdefault(var, 'benchmark')
+
+from app.core.content_processor import ContentProcessor
+from app.core.job_queue import IngestQueue, JOB_PENDING, JOB_RUNNING
+from app.core.pipeline import LinkPipeline
+
+
+class FakeNotionManager:
+    """内存中的 Notion：不查重，保存总是成功"""
+
+    def __init__(self):
+        self.pages = 0
+
+    async def find_entry_by_link_async(self, url):
+        return None
+
+    async def add_content_to_database_async(self, processed_data):
+        self.pages += 1
+        return {"success": True, "page_id": f"page-{self.pages}"}
+
+
+def percentile(values, pct):
+    """计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def stub_processor(processor, link_seconds, mode):
+    """用固定耗时的调用替代真实的抓取与 DeepSeek 分析（各占一半耗时）"""
+    def fetch_link_content(url):
+        time.sleep(link_seconds / 2)
+        return {"title": "benchmark", "content": "benchmark content " * 20, "url": url, "source": "example.com"}
+
+    def analyze_content(url, webpage_data, on_partial=None):
+        time.sleep(link_seconds / 2)
+        return {"title": "benchmark", "summary": "ok", "key_points": [], "tags": [], "source": "example.com", "original_url": url}
+
+    async def wait_analysis(url, webpage_data, on_partial=None):
+        await asyncio.sleep(link_seconds / 2)
+        return {"title": "benchmark", "summary": "ok", "key_points": [], "tags": [], "source": "example.com", "original_url": url}
+
+    processor.fetch_link_content = fetch_link_content
+    processor.analyze_content = analyze_content
+    processor.analyze_content_async = wait_analysis
+
+    if mode == "blocking":
+        # 旧实现：在协程中直接调用同步方法
+        async def fetch_link_content_async(url):
+            return fetch_link_content(url)
+
+        async def analyze_content_async(url, webpage_data, on_partial=None):
+            return analyze_content(url, webpage_data)
+
+        processor.fetch_link_content_async = fetch_link_content_async
+        processor.analyze_content_async = analyze_content_async
+
+
+async def probe_callbacks(stop_event, interval, samples):
+    """模拟用户回调：每隔 interval 秒调度一次，记录实际被执行的延迟"""
+    loop = asyncio.get_running_loop()
+    while not stop_event.is_set():
+        scheduled = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - scheduled - interval) * 1000)
+
+
+async def run_case(in_flight, link_seconds, mode, interval, directory):
+    """运行一组测试：in_flight 个链接入队，由同样数量的 worker 经 LinkPipeline 处理，返回回调延迟样本（毫秒）"""
+    processor = ContentProcessor()
+    stub_processor(processor, link_seconds, mode)
+    pipeline = LinkPipeline(processor, FakeNotionManager(), two_phase=False)
+    queue = IngestQueue(
+        path=os.path.join(directory, f"queue-{mode}-{in_flight}.db"),
+        workers=max(1, in_flight),
+        max_attempts=1
+    )
+
+    samples = []
+    stop_event = asyncio.Event()
+    probe = asyncio.create_task(probe_callbacks(stop_event, interval, samples))
+    finished = asyncio.Event()
+
+    async def on_complete(job):
+        stats = queue.stats()
+        if not stats.get(JOB_PENDING) and not stats.get(JOB_RUNNING):
+            finished.set()
+
+    if in_flight:
+        queue.enqueue([f"https://example.com/{i}" for i in range(in_flight)])
+        await queue.start(lambda job: pipeline.process(job["url"]), on_complete=on_complete)
+        await finished.wait()
+        await queue.stop()
+    else:
+        await asyncio.sleep(link_seconds)
+
+    stop_event.set()
+    await probe
+    queue.close()
+    processor.shutdown()
+    return samples
+
+
+async def main_async(args):
+    print(f"{'模式':<10}{'并发链接':>8}{'样本数':>8}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in args.modes:
+            for in_flight in args.in_flight:
+                samples = await run_case(in_flight, args.link_seconds, mode, args.interval, directory)
+                p50 = statistics.median(samples) if samples else 0.0
+                p99 = percentile(samples, 99)
+                worst = max(samples) if samples else 0.0
+                print(f"{mode:<10}{in_flight:>8}{len(samples):>8}{p50:>10.1f}{p99:>10.1f}{worst:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量链接处理期间的回调延迟")
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[0, 1, 4, 8, 16], help="同时处理的链接数量")
+    parser.add_argument("--link-seconds", type=float, default=1.0, help="单个链接模拟处理耗时（秒，抓取和分析各占一半）")
+    parser.add_argument("--interval", type=float, default=0.02, help="模拟回调的调度间隔（秒）")
+    parser.add_argument("--modes", nargs="+", default=["blocking", "executor"], choices=["blocking", "executor"])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+搜索索引基准测试
+用随机生成的中英文混合条目建立本地搜索索引，测量全量重建耗时，以及单字、常见词和多词查询的延迟 (p50/p99)；
+任一类查询的 p50 超过目标值时以非零状态退出
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.search_index import SearchIndex
+
+# 常用汉字和英文单词，组成随机标题和摘要
+CJK_CHARS = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所"
+    "民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那"
+    "社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通"
+    "并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区"
+    "强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清"
+)
+LATIN_WORDS = [
+    "python", "rust", "agent", "model", "open", "source", "release", "benchmark", "database", "search", "index",
+    "notion", "telegram", "twitter", "llm", "gpu", "cuda", "paper", "dataset", "training", "inference", "api",
+    "cloud", "kernel", "linux", "compiler", "vector", "embedding", "prompt", "reasoning", "vision", "audio",
+]
+TAGS = ["AI", "编程", "工具", "论文", "开源", "产品", "设计", "教程", "新闻", "观点"]
+
+
+def random_text(rng, cjk_chars, latin_words):
+    """生成由若干中文片段和英文单词交替组成的文本"""
+    parts = []
+    for _ in range(rng.randint(cjk_chars // 8, cjk_chars // 4)):
+        parts.append("".join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 8))))
+    parts.extend(rng.choice(LATIN_WORDS) for _ in range(latin_words))
+    rng.shuffle(parts)
+    return " ".join(parts)
+
+
+def make_entries(count, seed):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"page-{i}",
+            "title": random_text(rng, 24, 2),
+            "summary": random_text(rng, 160, 6),
+            "tags": rng.sample(TAGS, rng.randint(1, 3)),
+            "key_points": [random_text(rng, 40, 1) for _ in range(3)],
+            "source": rng.choice(["X", "GitHub", "arXiv", "example.com"]),
+            "status": "未处理",
+        }
+        for i in range(count)
+    ]
+
+
+def make_queries(rng, count):
+    """单字、单个常见英文词、中英文多词三类查询"""
+    return {
+        "单字": [rng.choice(CJK_CHARS) for _ in range(count)],
+        "常见词": [rng.choice(LATIN_WORDS) for _ in range(count)],
+        "多词": [
+            f"{rng.choice(LATIN_WORDS)} {rng.choice(LATIN_WORDS)} {rng.choice(CJK_CHARS)}{rng.choice(CJK_CHARS)}"
+            for _ in range(count)
+        ],
+    }
+
+
+def percentile(values, pct):
+    """计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量本地搜索索引的重建耗时和查询延迟")
+    parser.add_argument("--entries", type=int, default=50000, help="条目数量")
+    parser.add_argument("--queries", type=int, default=200, help="每类查询的次数")
+    parser.add_argument("--target-ms", type=float, default=10.0, help="查询 p50 目标（毫秒）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries, args.seed)
+    index = SearchIndex()
+    start = time.perf_counter()
+    index.load(entries)
+    print(f"重建索引: {len(entries)} 条, {time.perf_counter() - start:.1f} 秒")
+
+    failed = False
+    print(f"{'查询':<8}{'次数':>6}{'匹配(中位)':>12}{'p50(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}")
+    for kind, queries in make_queries(random.Random(args.seed + 1), args.queries).items():
+        samples = []
+        matches = []
+        for query in queries:
+            start = time.perf_counter()
+            total, _ = index.search(query)
+            samples.append((time.perf_counter() - start) * 1000)
+            matches.append(total)
+        p50 = statistics.median(samples)
+        failed = failed or p50 > args.target_ms
+        print(f"{kind:<8}{len(samples):>6}{statistics.median(matches):>12.0f}"
+              f"{p50:>10.2f}{percentile(samples, 99):>10.2f}{max(samples):>10.2f}")
+
+    if failed:
+        print(f"查询 p50 超过目标 {args.target_ms:.0f}ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,20 @@
+"""
+测试环境：填充占位环境变量以便导入配置，本地数据库文件写到临时目录，不访问真实服务
+"""
+
+import os
+import tempfile
+
+_data_dir = tempfile.mkdtemp(prefix="bot-tests-")
+
+for var in ['TELEGRAM_BOT_TOKEN', 'NOTION_API_TOKEN', 'NOTION_DATABASE_ID', 'DEEPSEEK_API_KEY', 'TARGET_CHAT_ID']:
+    os.environ.setdefault(var, 'test')
+
+for var, name in [
+    ('LLM_CACHE_PATH', 'llm_cache.db'),
+    ('TWEET_CACHE_PATH', 'tweet_cache.db'),
+    ('INGEST_QUEUE_PATH', 'ingest_queue.db'),
+    ('CHECK_IN_LOG_PATH', 'check_in_log.db'),
+    ('NOTION_REPLICA_PATH', 'notion_replica.db'),
+]:
+    os.environ[var] = os.path.join(_data_dir, name)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import httpx
+
+from app.common.rate_limiter import PriorityRateLimiter
+from app.services import notion_service
+from app.services.notion_service import NotionManager
+
+
+def make_page(page_id, status):
+    return {
+        "id": page_id,
+        "last_edited_time": "2024-01-01T00:00:00.000Z",
+        "properties": {
+            "标题": {"title": [{"text": {"content": page_id}}]},
+            "是否提醒": {"checkbox": True},
+            "今日是否打卡": {"status": {"name": status}},
+        },
+    }
+
+
+class FakeNotion:
+    """模拟数据库查询（每页 2 条，按游标翻页）和页面更新；patch_statuses 为各页面依次返回的状态码"""
+
+    def __init__(self, statuses, patch_statuses=None):
+        self.pages = {page_id: make_page(page_id, status) for page_id, status in statuses.items()}
+        self.patch_statuses = {page_id: list(codes) for page_id, codes in (patch_statuses or {}).items()}
+        self.patches = []
+        self.queries = 0
+
+    def handler(self, request):
+        if request.method == "POST" and request.url.path.endswith("/query"):
+            self.queries += 1
+            start = int(json.loads(request.content).get("start_cursor") or 0)
+            # 查询结果不按筛选条件过滤，模拟结果中仍包含状态已是'否'的页面
+            ids = sorted(self.pages)
+            results = [self.pages[page_id] for page_id in ids[start:start + 2]]
+            more = start + 2 < len(ids)
+            return httpx.Response(200, json={"results": results, "has_more": more, "next_cursor": str(start + 2) if more else None})
+
+        page_id = request.url.path.rsplit("/", 1)[-1]
+        self.patches.append(page_id)
+        codes = self.patch_statuses.get(page_id)
+        if codes:
+            code = codes.pop(0)
+            return httpx.Response(code, headers={"Retry-After": "0"}, text="conflict")
+        page = self.pages[page_id]
+        page["properties"].update(json.loads(request.content)["properties"])
+        return httpx.Response(200, json=page)
+
+
+def make_manager(notion):
+    manager = NotionManager(local_state=False)
+    manager.transport._client = httpx.AsyncClient(
+        base_url="https://api.notion.com/v1", transport=httpx.MockTransport(notion.handler)
+    )
+    # 429 直接交给批量更新重试（传输层自身的 429 重试见 test_rate_limiter）
+    manager.transport.max_retries = 0
+    manager.transport.rate_limiter = PriorityRateLimiter(rate=1000, burst=100)
+    return manager
+
+
+def test_reset_skips_pages_already_reset_and_retries_conflicts(monkeypatch):
+    monkeypatch.setattr(notion_service, "BULK_RETRY_BASE_DELAY", 0)
+    notion = FakeNotion(
+        {"p1": "是", "p2": "否", "p3": "是", "p4": "否", "p5": "是"},
+        patch_statuses={"p1": [409, 429], "p3": [429]},
+    )
+    manager = make_manager(notion)
+    reports = []
+
+    async def on_progress(progress):
+        reports.append(progress)
+
+    try:
+        result = asyncio.run(manager.reset_daily_check_in_status_async(on_progress=on_progress))
+    finally:
+        asyncio.run(manager.aclose())
+
+    assert result == {"success": True, "reset_count": 3, "failed_entries": []}
+    assert sorted(notion.patches) == ["p1", "p1", "p1", "p3", "p3", "p5"]
+    assert all(manager._get_property_value(page, "今日是否打卡", "status") == "否" for page in notion.pages.values())
+    # 有更新时重新扫描一次，第二轮没有新的页面需要更新
+    assert notion.queries == 6
+    assert reports[-1] == {"matched": 5, "updated": 3, "skipped": 2, "failed": 0}
+
+
+def test_pages_failing_every_attempt_are_reported(monkeypatch):
+    monkeypatch.setattr(notion_service, "BULK_RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(notion_service, "BULK_PROGRESS_INTERVAL", 0)
+    notion = FakeNotion({"p1": "是", "p2": "是"}, patch_statuses={"p2": [409, 409, 409], "p1": [400]})
+    manager = make_manager(notion)
+    reports = []
+
+    async def on_progress(progress):
+        reports.append(progress)
+
+    try:
+        result = asyncio.run(manager.bulk_update_async(
+            {"今日是否打卡": {"status": {"name": "否"}}}, concurrency=1, max_attempts=3, on_progress=on_progress
+        ))
+    finally:
+        asyncio.run(manager.aclose())
+
+    # 400 不重试，409 重试到 max_attempts
+    assert notion.patches == ["p1", "p2", "p2", "p2"]
+    assert result["success"]
+    assert (result["updated"], result["failed"]) == (0, 2)
+    assert sorted(result["failed_entries"]) == ["p1", "p2"]
+    # 每处理完一个页面报告一次，结束时再报告一次
+    assert [report["failed"] for report in reports] == [1, 2, 2]
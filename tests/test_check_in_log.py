@@ -0,0 +1,68 @@
+from datetime import date, timedelta
+
+from app.core.check_in_log import CheckInLog
+
+
+def days_ago(days):
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+def test_record_is_idempotent_per_day(tmp_path):
+    log = CheckInLog(str(tmp_path / "check_ins.db"))
+
+    assert log.record("p1", baseline=5, day="2024-01-01") == (True, 6)
+    assert log.record("p1", baseline=5, day="2024-01-01") == (False, 6)
+    # 基数只在第一次打卡时记录
+    assert log.record("p1", baseline=0, day="2024-01-02") == (True, 7)
+
+    assert log.has_page("p1")
+    assert not log.has_page("p2")
+    assert log.count("p2") is None
+    assert log.counts(["p1", "p2"]) == {"p1": 7}
+
+
+def test_unsynced_counts_until_marked(tmp_path):
+    log = CheckInLog(str(tmp_path / "check_ins.db"))
+    log.record("p1", baseline=2, day="2024-01-01")
+    log.record("p2", baseline=0, day="2024-01-01")
+
+    assert sorted(log.unsynced()) == [("p1", 3), ("p2", 1)]
+    assert log.unsynced(["p2"]) == [("p2", 1)]
+
+    log.mark_synced("p1", 3)
+    assert log.unsynced() == [("p2", 1)]
+    log.record("p1", day="2024-01-02")
+    assert sorted(log.unsynced()) == [("p1", 4), ("p2", 1)]
+
+
+def test_stats_compute_streaks(tmp_path):
+    log = CheckInLog(str(tmp_path / "check_ins.db"))
+    for days in (1, 2, 3, 10, 11, 12, 13, 40):
+        log.record("p1", day=days_ago(days))
+
+    stats = log.stats("p1")
+    # 今天尚未打卡时连续天数截至昨天
+    assert stats == {
+        "count": 8,
+        "streak": 3,
+        "longest_streak": 4,
+        "last_day": days_ago(1),
+        "last_30_days": 7,
+    }
+
+    log.record("p1", day=days_ago(0))
+    assert log.stats("p1")["streak"] == 4
+    assert log.history("p1", days=5) == [days_ago(day) for day in (0, 1, 2, 3)]
+
+
+def test_streak_resets_after_a_missed_day(tmp_path):
+    log = CheckInLog(str(tmp_path / "check_ins.db"))
+    log.record("p1", day=days_ago(2))
+    log.record("p1", day=days_ago(3))
+
+    stats = log.stats("p1")
+    assert stats["streak"] == 0
+    assert stats["longest_streak"] == 2
+    assert log.stats("missing") == {
+        "count": 0, "streak": 0, "longest_streak": 0, "last_day": None, "last_30_days": 0
+    }
@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from app.core.job_queue import IngestQueue, JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED
+
+
+def make_queue(tmp_path, **kwargs):
+    kwargs.setdefault("workers", 1)
+    kwargs.setdefault("max_attempts", 3)
+    kwargs.setdefault("retry_base_delay", 10)
+    return IngestQueue(path=str(tmp_path / "queue.db"), **kwargs)
+
+
+def test_claim_in_order_and_mark_running(tmp_path):
+    queue = make_queue(tmp_path)
+    first, second = queue.enqueue(["https://a.example", "https://b.example"], chat_id=1, message_id=2)
+
+    job, _ = queue._claim()
+    assert job["id"] == first
+    assert job["status"] == JOB_RUNNING
+    assert job["attempts"] == 1
+    assert queue.get_job(first)["status"] == JOB_RUNNING
+
+    job, _ = queue._claim()
+    assert job["id"] == second
+    assert queue._claim() == (None, None)
+    assert [job["url"] for job in queue.get_message_jobs(1, 2)] == ["https://a.example", "https://b.example"]
+
+
+def test_retry_backs_off_then_dead_letters(tmp_path):
+    queue = make_queue(tmp_path, max_attempts=2)
+    [job_id] = queue.enqueue(["https://a.example"])
+
+    job, _ = queue._claim()
+    before = time.time()
+    assert queue._retry(job, "boom") is True
+    retried = queue.get_job(job_id)
+    assert retried["status"] == JOB_PENDING
+    assert retried["next_run_at"] >= before + 10
+    assert retried["last_error"] == "boom"
+
+    # 重试时间未到，不能领取；返回距离到期的等待时间
+    job, wait_seconds = queue._claim()
+    assert job is None
+    assert 0 < wait_seconds <= 10
+
+    queue._conn.execute("UPDATE jobs SET next_run_at = 0 WHERE id = ?", (job_id,))
+    job, _ = queue._claim()
+    assert job["attempts"] == 2
+    assert queue._retry(job, "boom again", {"status": "error"}) is False
+
+    assert queue.get_job(job_id)["status"] == JOB_FAILED
+    [dead] = queue.get_dead_letters()
+    assert dead["job_id"] == job_id
+    assert dead["attempts"] == 2
+    assert dead["last_error"] == "boom again"
+    assert queue.stats() == {JOB_FAILED: 1, "dead_letters": 1}
+
+
+def test_recover_requeues_running_jobs(tmp_path):
+    queue = make_queue(tmp_path)
+    [job_id] = queue.enqueue(["https://a.example"])
+    queue._claim()
+    queue.close()
+
+    # 进程重启：运行中的任务重新置为待处理，已执行的次数保留
+    queue = make_queue(tmp_path)
+    assert queue.recover() == 1
+    job, _ = queue._claim()
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+
+
+def test_prune_keeps_recent_and_unfinished_jobs(tmp_path):
+    queue = make_queue(tmp_path, retention=60)
+    old, recent, pending = queue.enqueue(["https://a.example", "https://b.example", "https://c.example"])
+    for job_id in (old, recent):
+        queue._complete({"id": job_id}, {"status": "saved"})
+    queue._conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 120, old))
+
+    assert queue.prune() == 1
+    assert queue.get_job(old) is None
+    assert queue.get_job(recent)["status"] == JOB_DONE
+    assert queue.get_job(pending)["status"] == JOB_PENDING
+
+
+def test_workers_run_handler_and_retry_errors(tmp_path):
+    queue = make_queue(tmp_path, workers=2, retry_base_delay=0)
+    calls = {}
+
+    async def handler(job):
+        calls[job["url"]] = calls.get(job["url"], 0) + 1
+        if job["url"] == "https://flaky.example" and job["attempts"] == 1:
+            return {"status": "error", "error": "temporary", "retryable": True}
+        if job["url"] == "https://broken.example":
+            return {"status": "error", "error": "permanent", "retryable": False}
+        return {"status": "saved", "page_id": job["url"]}
+
+    async def run():
+        finished = asyncio.Event()
+
+        async def on_complete(job):
+            stats = queue.stats()
+            if not stats.get(JOB_PENDING) and not stats.get(JOB_RUNNING):
+                finished.set()
+
+        queue.enqueue(["https://ok.example", "https://flaky.example", "https://broken.example"])
+        await queue.start(handler, on_complete=on_complete)
+        await asyncio.wait_for(finished.wait(), 5)
+        await queue.stop()
+
+    asyncio.run(run())
+
+    assert calls == {"https://ok.example": 1, "https://flaky.example": 2, "https://broken.example": 1}
+    assert queue.stats() == {JOB_DONE: 2, JOB_FAILED: 1, "dead_letters": 1}
+    assert queue.get_dead_letters()[0]["url"] == "https://broken.example"
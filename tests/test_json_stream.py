@@ -0,0 +1,51 @@
+import asyncio
+import json
+
+import httpx
+
+from app.common.json_stream import JsonFieldStream
+from app.services.llm_client import DeepSeekClient
+
+
+def test_fields_are_returned_as_soon_as_they_complete():
+    stream = JsonFieldStream()
+    text = '{"title": "开源\\"模型\\"", "tags": ["AI", "工具"], "summary": "一段摘要", "meta": {"title": "内层"}}'
+
+    completed = [stream.feed(text[i:i + 7]) for i in range(0, len(text), 7)]
+
+    assert [fields for fields in completed if fields] == [{"title": '开源"模型"'}, {"summary": "一段摘要"}]
+    assert stream.fields == {"title": '开源"模型"', "summary": "一段摘要"}
+
+
+def test_invalid_json_yields_no_fields():
+    stream = JsonFieldStream()
+    assert stream.feed("```json\n{\"title\": ") == {}
+    assert stream.feed("未完成") == {}
+    assert stream.fields == {}
+
+
+def test_streamed_completion_reports_deltas():
+    content = json.dumps({"title": "标题", "summary": "摘要"}, ensure_ascii=False)
+    chunks = [content[:8], content[8:20], content[20:]]
+    body = "".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': chunk}}]})}\n\n" for chunk in chunks
+    ) + ": keep-alive\n\ndata: [DONE]\n\n"
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+    client = DeepSeekClient("key")
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    deltas = []
+
+    async def run():
+        return await client.complete({"messages": [{"role": "user", "content": "hi"}]}, on_delta=deltas.append)
+
+    try:
+        result = asyncio.run(run())
+    finally:
+        asyncio.run(client.aclose())
+
+    assert result == content
+    assert deltas == [None] + chunks
@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+import httpx
+
+from app.common import sqlite_cache
+from app.common.sqlite_cache import SQLiteCache, make_cache_key
+from app.core.content_processor import ContentProcessor
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_make_cache_key_separates_parts():
+    assert make_cache_key("1", "model", "web", "text") == make_cache_key("1", "model", "web", "text")
+    assert make_cache_key("ab", "c") != make_cache_key("a", "bc")
+
+
+def test_cache_expires_entries(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sqlite_cache.time, "time", clock)
+    cache = SQLiteCache(str(tmp_path / "cache.db"), "results", ttl=60, max_entries=10)
+
+    cache.set("key", {"title": "标题"})
+    assert cache.get("key") == {"title": "标题"}
+    clock.now += 61
+    assert cache.get("key") is None
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sqlite_cache.time, "time", clock)
+    cache = SQLiteCache(str(tmp_path / "cache.db"), "results", ttl=3600, max_entries=2)
+
+    for key in ("a", "b"):
+        clock.now += 1
+        cache.set(key, key)
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("c", "c")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+
+
+def test_analysis_cache_skips_repeated_requests(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        content = {"title": "标题", "summary": "摘要", "key_points": ["要点"], "tags": ["AI"]}
+        return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(content)}}]})
+
+    processor = ContentProcessor()
+    processor.llm_cache = SQLiteCache(str(tmp_path / "llm.db"), "llm_results", ttl=3600, max_entries=10)
+    processor.llm_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    webpage = {"title": "网页", "content": "内容 " * 60, "url": "https://example.com/a", "source": "example.com"}
+
+    async def run():
+        first = await processor.analyze_content_async(webpage["url"], dict(webpage))
+        # 只有空白不同的内容命中同一条缓存
+        second = await processor.analyze_content_async(
+            webpage["url"], dict(webpage, content="内容\n\n" * 60)
+        )
+        return first, second
+
+    try:
+        first, second = asyncio.run(run())
+    finally:
+        processor.shutdown()
+
+    assert len(requests) == 1
+    assert first["title"] == second["title"] == "标题"
+    assert processor.llm_cache.stats()["hits"] == 1
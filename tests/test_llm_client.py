@@ -0,0 +1,153 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.content_processor import ContentProcessor
+from app.services import llm_client
+from app.services.llm_client import (
+    BREAKER_CLOSED,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeepSeekClient,
+    LLMConnectionError,
+    LLMError,
+)
+
+PAYLOAD = {"messages": [{"role": "user", "content": "hi"}]}
+
+
+def completion(content):
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def make_client(handler, **kwargs):
+    client = DeepSeekClient("key", retry_base_delay=0, **kwargs)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_breaker_opens_after_threshold_and_recovers_on_probe():
+    async def run():
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05)
+        probes = []
+
+        async def probe(result):
+            probes.append(result)
+            return result
+
+        breaker.record_failure()
+        assert breaker.state == BREAKER_CLOSED
+        breaker.record_failure()
+        assert breaker.state == BREAKER_OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.before_request(lambda: probe(True))
+        assert probes == []
+
+        # 冷却结束后探测失败：继续熔断，冷却时间加倍
+        await asyncio.sleep(0.06)
+        with pytest.raises(CircuitOpenError) as error:
+            await breaker.before_request(lambda: probe(False))
+        assert breaker.state == BREAKER_OPEN
+        assert error.value.retry_in > 0.05
+
+        # 探测成功后恢复，冷却时间复位
+        await asyncio.sleep(0.11)
+        await breaker.before_request(lambda: probe(True))
+        return breaker, probes
+
+    breaker, probes = asyncio.run(run())
+    assert probes == [False, True]
+    assert breaker.state == BREAKER_CLOSED
+    assert breaker.failures == 0
+    assert breaker.opened == 2
+
+
+def test_half_open_requests_share_one_probe():
+    async def run():
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.record_failure()
+        calls = []
+
+        async def probe():
+            calls.append(breaker.state)
+            await asyncio.sleep(0.01)
+            return True
+
+        await asyncio.gather(*(breaker.before_request(probe) for _ in range(3)))
+        return calls, breaker.state
+
+    calls, state = asyncio.run(run())
+    assert calls == [BREAKER_HALF_OPEN]
+    assert state == BREAKER_CLOSED
+
+
+def test_malformed_response_is_retried():
+    responses = [httpx.Response(200, text="not json"), httpx.Response(503), completion('{"title": "标题"}')]
+
+    def handler(request):
+        return responses.pop(0)
+
+    client = make_client(handler, max_attempts=3)
+    try:
+        result = asyncio.run(client.complete(PAYLOAD))
+    finally:
+        asyncio.run(client.aclose())
+
+    assert result == '{"title": "标题"}'
+    assert (client.requests, client.retries, client.failures) == (3, 2, 2)
+    assert client.breaker.state == BREAKER_CLOSED
+
+
+def test_errors_report_attempts(monkeypatch):
+    monkeypatch.setattr(llm_client, "DEEPSEEK_BREAKER_THRESHOLD", 100)
+    client = make_client(lambda request: httpx.Response(500), max_attempts=3)
+    with pytest.raises(LLMConnectionError) as error:
+        asyncio.run(client.complete(PAYLOAD))
+    assert error.value.attempts == 3
+
+    # 认证失败等错误不重试
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(401)))
+    with pytest.raises(LLMError) as error:
+        asyncio.run(client.complete(PAYLOAD))
+    assert not isinstance(error.value, LLMConnectionError)
+    assert error.value.attempts == 1
+    asyncio.run(client.aclose())
+
+
+def test_open_breaker_rejects_without_sending(monkeypatch):
+    monkeypatch.setattr(llm_client, "DEEPSEEK_BREAKER_THRESHOLD", 2)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(502)
+
+    client = make_client(handler, max_attempts=5)
+    with pytest.raises(CircuitOpenError) as error:
+        asyncio.run(client.complete(PAYLOAD))
+    asyncio.run(client.aclose())
+
+    assert len(requests) == 2
+    assert error.value.attempts == 2
+    assert client.stats()["rejected"] == 1
+
+
+def test_analysis_timeout_reports_real_attempts(monkeypatch):
+    monkeypatch.setattr(llm_client, "DEEPSEEK_BREAKER_THRESHOLD", 100)
+
+    def handler(request):
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    processor = ContentProcessor()
+    processor.llm_client = make_client(handler, max_attempts=2)
+    processor.llm_cache = None
+    webpage = {"title": "网页", "content": "内容 " * 60, "url": "https://example.com/a", "source": "example.com"}
+    try:
+        result = asyncio.run(processor.analyze_content_async(webpage["url"], webpage))
+    finally:
+        processor.shutdown()
+
+    assert "共发送 2 次请求均未完成" in result["key_points"]
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from app.core.content_processor import ContentProcessor
+from app.core.pipeline import (
+    STAGE_ANALYZING,
+    STAGE_FETCHING,
+    STAGE_SAVING,
+    STATUS_DUPLICATE,
+    STATUS_ERROR,
+    STATUS_SAVED,
+    LinkPipeline,
+)
+
+WEBPAGE = {"title": "网页", "content": "内容 " * 60, "url": "https://example.com/a", "source": "example.com"}
+
+
+class FakeNotionManager:
+    def __init__(self, existing=None):
+        self.existing = existing or {}
+        self.saved = []
+
+    async def find_entry_by_link_async(self, link):
+        return self.existing.get(link)
+
+    async def add_content_to_database_async(self, data):
+        self.saved.append(data)
+        return {"success": True, "page_id": "page-1"}
+
+
+def make_processor(handler, monkeypatch, fetch_delay=0.0):
+    processor = ContentProcessor()
+    processor.llm_cache = None
+    processor.llm_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    fetched = []
+
+    def fetch_webpage_content(url):
+        # 抓取是阻塞调用，必须在线程池中执行
+        fetched.append(url)
+        time.sleep(fetch_delay)
+        return dict(WEBPAGE, url=url)
+
+    monkeypatch.setattr(processor, "fetch_webpage_content", fetch_webpage_content)
+    return processor, fetched
+
+
+def analysis(request):
+    content = {"title": "标题", "summary": "摘要", "key_points": ["要点"], "tags": ["AI"]}
+    return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(content)}}]})
+
+
+def test_blocking_fetch_does_not_block_the_event_loop(monkeypatch):
+    processor, fetched = make_processor(analysis, monkeypatch, fetch_delay=0.3)
+    notion = FakeNotionManager()
+    pipeline = LinkPipeline(processor, notion, two_phase=False)
+    stages = []
+
+    async def on_stage(stage):
+        stages.append(stage)
+
+    async def run():
+        ticks = 0
+        task = asyncio.create_task(pipeline.process("https://example.com/a", on_stage=on_stage))
+        while not task.done():
+            await asyncio.sleep(0.01)
+            ticks += 1
+        return task.result(), ticks
+
+    try:
+        result, ticks = asyncio.run(run())
+    finally:
+        processor.shutdown()
+
+    assert result["status"] == STATUS_SAVED
+    assert result["page_id"] == "page-1"
+    assert stages == [STAGE_FETCHING, STAGE_ANALYZING, STAGE_SAVING]
+    assert fetched == ["https://example.com/a"]
+    assert notion.saved[0]["title"] == "标题"
+    # 抓取期间事件循环仍在处理其他任务
+    assert ticks >= 10
+
+
+def test_duplicates_are_detected_before_fetching(monkeypatch):
+    processor, fetched = make_processor(analysis, monkeypatch)
+    existing = {"id": "page-0", "title": "已保存"}
+    notion = FakeNotionManager({"https://example.com/a": existing})
+    pipeline = LinkPipeline(processor, notion, two_phase=False)
+
+    try:
+        result = asyncio.run(pipeline.process("https://example.com/a"))
+    finally:
+        processor.shutdown()
+
+    assert result == {"url": "https://example.com/a", "status": STATUS_DUPLICATE, "existing": existing}
+    assert fetched == []
+
+
+def test_analysis_errors_are_not_saved(monkeypatch):
+    processor, _ = make_processor(lambda request: httpx.Response(401, text="unauthorized"), monkeypatch)
+    notion = FakeNotionManager()
+    pipeline = LinkPipeline(processor, notion, two_phase=False)
+
+    try:
+        result = asyncio.run(pipeline.process("https://example.com/a"))
+    finally:
+        processor.shutdown()
+
+    assert result["status"] == STATUS_ERROR
+    assert result["error_stage"] == "analyze"
+    assert notion.saved == []
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import httpx
+
+from app.common.rate_limiter import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_NORMAL,
+    PriorityRateLimiter,
+)
+from app.services.notion_transport import NotionTransport, notion_priority
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    async def run():
+        limiter = PriorityRateLimiter(rate=50, burst=1)
+        await limiter.acquire()
+        order = []
+
+        async def acquire(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        tasks = [
+            asyncio.create_task(acquire(name, priority))
+            for name, priority in [
+                ("background", PRIORITY_BACKGROUND),
+                ("normal-1", PRIORITY_NORMAL),
+                ("interactive", PRIORITY_INTERACTIVE),
+                ("normal-2", PRIORITY_NORMAL),
+            ]
+        ]
+        await asyncio.sleep(0)
+        assert limiter.queue_depth() == {PRIORITY_INTERACTIVE: 1, PRIORITY_NORMAL: 2, PRIORITY_BACKGROUND: 1}
+        await asyncio.gather(*tasks)
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["interactive", "normal-1", "normal-2", "background"]
+    assert stats["granted"] == {PRIORITY_INTERACTIVE: 1, PRIORITY_NORMAL: 3, PRIORITY_BACKGROUND: 1}
+
+
+def test_cancelled_waiters_do_not_consume_tokens():
+    async def run():
+        limiter = PriorityRateLimiter(rate=20, burst=1)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        start = time.monotonic()
+        await limiter.acquire(PRIORITY_BACKGROUND)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.09
+
+
+def test_pause_holds_tokens_until_retry_after():
+    async def run():
+        limiter = PriorityRateLimiter(rate=1000, burst=5)
+        limiter.pause(0.2)
+        start = time.monotonic()
+        await limiter.acquire(PRIORITY_INTERACTIVE)
+        return time.monotonic() - start, limiter.stats()["throttled"]
+
+    waited, throttled = asyncio.run(run())
+    assert waited >= 0.19
+    assert throttled == 1
+
+
+def test_transport_retries_rate_limited_requests():
+    responses = [
+        httpx.Response(429, headers={"Retry-After": "0.1"}),
+        httpx.Response(200, json={"ok": True}),
+    ]
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return responses.pop(0)
+
+    transport = NotionTransport("token")
+    transport._client = httpx.AsyncClient(base_url="https://api.notion.com/v1", transport=httpx.MockTransport(handler))
+
+    async def run():
+        with notion_priority(PRIORITY_INTERACTIVE):
+            return await transport.request("GET", "/users/me")
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        transport.close()
+
+    assert response.json() == {"ok": True}
+    assert calls == ["/v1/users/me", "/v1/users/me"]
+    assert transport.rate_limiter.throttled == 1
+    assert transport.rate_limiter.granted[PRIORITY_INTERACTIVE] == 2
@@ -0,0 +1,113 @@
+import math
+import random
+import threading
+
+from app.core import search_index
+from app.core.search_index import SearchIndex, tokenize
+
+
+def test_tokenize_splits_cjk_into_bigrams_and_words():
+    assert tokenize("开源模型 GPT-4o 发布") == ["开源", "源模", "模型", "发布", "gpt-4o"]
+    assert tokenize("猫 和 狗") == ["猫", "和", "狗"]
+    assert tokenize("") == []
+
+
+def test_single_char_query_matches_inside_longer_segments():
+    index = SearchIndex()
+    index.load([
+        {"id": "p1", "title": "开源模型发布", "summary": "", "status": "未处理"},
+        {"id": "p2", "title": "数据库索引", "summary": "", "status": "未处理"},
+    ])
+
+    total, results = index.search("模")
+    assert total == 1
+    assert results[0]["id"] == "p1"
+
+
+def test_title_matches_rank_above_summary_matches():
+    index = SearchIndex()
+    index.load([
+        {"id": "summary", "title": "周报", "summary": "介绍 rust 编译器"},
+        {"id": "title", "title": "rust 编译器", "summary": "周报"},
+        {"id": "other", "title": "python", "summary": "周报"},
+    ])
+
+    total, results = index.search("rust")
+    assert total == 2
+    assert [result["id"] for result in results] == ["title", "summary"]
+
+
+def test_add_and_remove_update_index():
+    index = SearchIndex()
+    index.load([{"id": "p1", "title": "向量数据库"}])
+    index.add({"id": "p1", "title": "图数据库"})
+    index.add({"id": "p2", "title": "向量检索"})
+
+    assert [result["id"] for result in index.search("向量")[1]] == ["p2"]
+    index.remove("p2")
+    assert index.search("向量") == (0, [])
+    assert len(index) == 1
+
+
+def test_load_keeps_key_points_missing_from_synced_entries():
+    index = SearchIndex()
+    index.add({"id": "p1", "title": "标题", "key_points": ["推理加速"]})
+    index.load([{"id": "p1", "title": "标题"}])
+
+    assert index.search("推理")[1][0]["id"] == "p1"
+
+
+def test_changes_during_load_are_replayed(monkeypatch):
+    index = SearchIndex()
+    started = threading.Event()
+    resume = threading.Event()
+    entry_weights = search_index._entry_weights
+
+    def slow_weights(entry):
+        if entry["id"] == "old":
+            started.set()
+            resume.wait(5)
+        return entry_weights(entry)
+
+    monkeypatch.setattr(search_index, "_entry_weights", slow_weights)
+    loader = threading.Thread(target=index.load, args=([{"id": "old", "title": "旧条目"}, {"id": "gone", "title": "删除"}],))
+    loader.start()
+    assert started.wait(5)
+    # 重建期间的增删在替换索引时重放
+    index.add({"id": "new", "title": "新条目"})
+    index.remove("gone")
+    resume.set()
+    loader.join(5)
+
+    assert index.search("条目")[0] == 2
+    assert index.search("删除") == (0, [])
+
+
+def test_multi_term_search_matches_exhaustive_scoring():
+    rng = random.Random(7)
+    chars = "模型数据训练推理开源发布工具论文"
+    words = ["rust", "python", "agent", "gpu", "llm"]
+
+    def text(size):
+        parts = ["".join(rng.choice(chars) for _ in range(rng.randint(2, 5))) for _ in range(size)]
+        parts.extend(rng.sample(words, 2))
+        return " ".join(parts)
+
+    index = SearchIndex()
+    index.load([{"id": f"p{i}", "title": text(2), "summary": text(8), "tags": ["AI"]} for i in range(300)])
+    data = index._data
+
+    for query in ["rust 模型", "agent gpu 推理", "开源 llm 数据 训练", "模"]:
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = data.postings.get(term, {})
+            idf = math.log(1 + (len(data.docs) - len(postings) + 0.5) / (len(postings) + 0.5))
+            for page_id, weight in postings.items():
+                scores[page_id] = scores.get(page_id, 0.0) + idf * weight
+        expected = sorted(scores.values(), reverse=True)
+        for offset, limit in ((0, 10), (10, 5), (0, 1)):
+            total, results = index.search(query, offset, limit)
+            assert total == len(scores)
+            got = [result["score"] for result in results]
+            assert len(got) == len(expected[offset:offset + limit])
+            assert all(math.isclose(a, b) for a, b in zip(got, expected[offset:offset + limit]))
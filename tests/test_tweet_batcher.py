@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.tweet_batcher import TweetBatcher
+
+
+class RecordingLookup:
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+        self._lock = threading.Lock()
+
+    def __call__(self, tweet_ids):
+        with self._lock:
+            self.batches.append(sorted(tweet_ids))
+        if self.error:
+            raise self.error
+        return {tweet_id: {"id": tweet_id} for tweet_id in tweet_ids if tweet_id != "missing"}
+
+
+def test_concurrent_requests_share_one_batch():
+    lookup = RecordingLookup()
+    batcher = TweetBatcher(lookup, linger=0.1)
+
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(batcher.fetch, ["1", "2", 3, "1", "missing"]))
+
+    assert results == [{"id": "1"}, {"id": "2"}, {"id": "3"}, {"id": "1"}, None]
+    assert lookup.batches == [["1", "2", "3", "missing"]]
+    assert batcher.stats() == {"batches": 1, "requested": 4, "failed_batches": 0, "average_size": 4.0}
+
+
+def test_full_batches_are_sent_immediately():
+    lookup = RecordingLookup()
+    batcher = TweetBatcher(lookup, linger=0.1, max_batch=2)
+
+    results = batcher.fetch_many(["1", "2", "3"])
+
+    assert results == {"1": {"id": "1"}, "2": {"id": "2"}, "3": {"id": "3"}}
+    # 凑满的批次在调用线程中立即执行，剩余的ID等待窗口结束
+    assert lookup.batches == [["1", "2"], ["3"]]
+
+
+def test_lookup_errors_reach_every_caller():
+    lookup = RecordingLookup(error=RuntimeError("rate limited"))
+    batcher = TweetBatcher(lookup, linger=0.05)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(batcher.fetch, tweet_id) for tweet_id in ("1", "2")]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result()
+
+    assert batcher.stats()["failed_batches"] == 1
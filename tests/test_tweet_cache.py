@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from app.common.sqlite_cache import SQLiteCache
+from app.core import url_index
+from app.core.url_index import resolve_short_url
+from app.services.tweet_providers import TweetProvider
+from app.services.twitter_service import TwitterAPI
+
+
+def test_short_links_are_resolved_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(url_index, "_short_link_cache", SQLiteCache(str(tmp_path / "links.db"), "short_links", ttl=3600, max_entries=100))
+    heads = []
+
+    def head(url, allow_redirects, timeout):
+        heads.append(url)
+        if url.endswith("broken"):
+            raise ConnectionError("unreachable")
+        return SimpleNamespace(url="https://x.com/someone/status/42")
+
+    monkeypatch.setattr(url_index.requests, "head", head)
+
+    assert resolve_short_url("https://t.co/abc") == "https://x.com/someone/status/42"
+    assert resolve_short_url(" https://t.co/abc ") == "https://x.com/someone/status/42"
+    # 展开失败时返回原链接，不缓存
+    assert resolve_short_url("https://t.co/broken") == "https://t.co/broken"
+    assert resolve_short_url("https://t.co/broken") == "https://t.co/broken"
+    # 不是短链接时不发出请求
+    assert resolve_short_url("https://example.com/a") == "https://example.com/a"
+    assert heads == ["https://t.co/abc", "https://t.co/broken", "https://t.co/broken"]
+
+
+def test_tweets_are_cached_by_id(tmp_path, monkeypatch):
+    api = TwitterAPI()
+    api.tweet_cache = SQLiteCache(str(tmp_path / "tweets.db"), "tweets", ttl=3600, max_entries=100)
+    fetched = []
+
+    def fetch(tweet_id, url):
+        fetched.append(tweet_id)
+        return {"title": "推文", "content": "推文内容", "url": url, "source": "X"}
+
+    monkeypatch.setattr(api, "_providers", lambda: [TweetProvider("fake", fetch)])
+    try:
+        first = api.get_tweet_data("https://twitter.com/someone/status/42")
+        second = api.get_tweet_data("https://x.com/someone/status/42?s=20")
+        api.get_tweet_data("https://x.com/someone/status/43")
+    finally:
+        api.shutdown()
+
+    assert fetched == ["42", "43"]
+    assert second["content"] == first["content"]
+    # 命中缓存时保留本次请求的链接
+    assert second["url"] == "https://x.com/someone/status/42?s=20"
+
+
+def test_invalid_tweets_are_not_cached(tmp_path, monkeypatch):
+    api = TwitterAPI()
+    api.tweet_cache = SQLiteCache(str(tmp_path / "tweets.db"), "tweets", ttl=3600, max_entries=100)
+    fetched = []
+
+    def fetch(tweet_id, url):
+        fetched.append(tweet_id)
+        return {"title": "推文", "content": " ", "url": url}
+
+    monkeypatch.setattr(api, "_providers", lambda: [TweetProvider("fake", fetch)])
+    try:
+        assert api.get_tweet_data("https://x.com/someone/status/42") is None
+        assert api.get_tweet_data("https://x.com/someone/status/42") is None
+    finally:
+        api.shutdown()
+
+    assert fetched == ["42", "42"]
+    assert api.tweet_cache.stats()["size"] == 0
@@ -0,0 +1,104 @@
+import threading
+import time
+
+from app.services.tweet_providers import STATE_RATE_LIMITED, HedgedFetcher, ProviderRateLimited, TweetProvider
+
+
+def tweet(name):
+    return {"title": name, "content": f"来自 {name} 的推文"}
+
+
+def provider(name, result=None, error=None, calls=None):
+    def fetch(tweet_id, url):
+        if calls is not None:
+            calls.append(name)
+        if error is not None:
+            raise error
+        return result if result is not None else tweet(name)
+    return TweetProvider(name, fetch)
+
+
+def wait_until(condition, timeout=2.0):
+    # 请求结果在 Future 的回调中记录，可能晚于 fetch 返回
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_slow_provider_is_hedged():
+    fetcher = HedgedFetcher(hedge_delay=0.05)
+    release = threading.Event()
+    slow = TweetProvider("slow", lambda tweet_id, url: release.wait(2) and tweet("slow"))
+    try:
+        start = time.monotonic()
+        result = fetcher.fetch([slow, provider("fast")], "1", "https://x.com/i/status/1")
+        elapsed = time.monotonic() - start
+    finally:
+        release.set()
+        fetcher.shutdown()
+
+    assert result["title"] == "fast"
+    assert elapsed < 1
+    assert fetcher.stats()["hedges"] == 1
+
+
+def test_failed_provider_falls_through_without_waiting():
+    fetcher = HedgedFetcher(hedge_delay=5)
+    calls = []
+    providers = [
+        provider("broken", error=RuntimeError("boom"), calls=calls),
+        provider("empty", result={"content": " "}, calls=calls),
+        provider("ok", calls=calls),
+    ]
+    try:
+        start = time.monotonic()
+        result = fetcher.fetch(providers, "1", "https://x.com/i/status/1")
+        elapsed = time.monotonic() - start
+    finally:
+        fetcher.shutdown()
+
+    assert result["title"] == "ok"
+    assert calls == ["broken", "empty", "ok"]
+    assert elapsed < 1
+    assert fetcher.stats()["hedges"] == 0
+
+
+def test_all_providers_failing_returns_none():
+    fetcher = HedgedFetcher(hedge_delay=0.05)
+    try:
+        result = fetcher.fetch([provider("a", error=ValueError("bad")), provider("b", result={})], "1", "url")
+    finally:
+        fetcher.shutdown()
+
+    assert result is None
+    assert fetcher.stats()["failed"] == 1
+
+
+def test_unreliable_providers_are_ranked_last():
+    fetcher = HedgedFetcher(hedge_delay=5)
+    flaky = provider("flaky", error=RuntimeError("boom"))
+    healthy = provider("healthy")
+    try:
+        fetcher.fetch([flaky, healthy], "1", "url")
+        assert wait_until(lambda: fetcher.stats()["providers"]["healthy"]["success"] == 1)
+        assert [item.name for item in fetcher.order([flaky, healthy])] == ["healthy", "flaky"]
+    finally:
+        fetcher.shutdown()
+
+
+def test_rate_limited_provider_is_skipped_until_retry_after():
+    fetcher = HedgedFetcher(hedge_delay=5)
+    limited = provider("limited", error=ProviderRateLimited("429", retry_after=60))
+    backup = provider("backup")
+    try:
+        assert fetcher.fetch([limited, backup], "1", "url")["title"] == "backup"
+        assert wait_until(lambda: not fetcher.is_available("limited"))
+        assert [item.name for item in fetcher.order([limited, backup])] == ["backup"]
+        assert fetcher.stats()["providers"]["limited"]["health"]["state"] == STATE_RATE_LIMITED
+
+        # 全部不可用时仍按恢复时间排序后全部使用
+        fetcher.report_quota("backup", 0, reset_after=120)
+        assert [item.name for item in fetcher.order([backup, limited])] == ["limited", "backup"]
+    finally:
+        fetcher.shutdown()
@@ -0,0 +1,59 @@
+import pytest
+
+from app.core.url_index import SeenUrlIndex, canonicalize_url, extract_tweet_id
+
+
+@pytest.mark.parametrize("url", [
+    "https://twitter.com/someone/status/1234567890?s=20&t=abc",
+    "https://x.com/someone/status/1234567890/photo/1",
+    "https://mobile.twitter.com/i/web/status/1234567890",
+    "https://fxtwitter.com/someone/status/1234567890",
+    "https://nitter.example.org/someone/status/1234567890#m",
+])
+def test_tweet_links_use_tweet_id(url):
+    assert extract_tweet_id(url) == "1234567890"
+    assert canonicalize_url(url) == "https://x.com/i/status/1234567890"
+
+
+def test_non_tweet_twitter_links_are_not_tweets():
+    assert extract_tweet_id("https://x.com/someone") is None
+    assert extract_tweet_id("https://example.com/someone/status/1") is None
+
+
+def test_canonicalize_strips_tracking_params():
+    url = "http://www.Example.com:80/post/?utm_source=x&b=2&fbclid=abc&a=1#top"
+    assert canonicalize_url(url) == "https://example.com/post?a=1&b=2"
+
+
+def test_canonicalize_keeps_content_params():
+    assert canonicalize_url("https://example.com/?ref=main&source=feed") == (
+        "https://example.com/?ref=main&source=feed"
+    )
+
+
+def test_host_specific_tracking_params():
+    assert canonicalize_url("https://youtu.be/abc?si=xyz&t=10") == "https://youtu.be/abc?t=10"
+    assert canonicalize_url("https://example.com/abc?si=xyz") == "https://example.com/abc?si=xyz"
+
+
+def test_seen_url_index_tracks_page_urls():
+    index = SeenUrlIndex()
+    index.load([
+        {"id": "p1", "title": "一", "url": "https://example.com/a?utm_medium=mail"},
+        {"id": "p2", "title": "二", "url": "https://x.com/u/status/42"},
+        {"id": "p3", "title": "无链接", "url": None},
+    ])
+
+    assert index.ready
+    assert len(index) == 2
+    assert index.lookup("http://www.example.com/a/") == {"id": "p1", "title": "一"}
+    assert index.lookup("https://twitter.com/other/status/42")["id"] == "p2"
+
+    # 条目的链接改变时旧链接不再命中
+    index.add("https://example.com/b", "p1", "一")
+    assert index.lookup("https://example.com/a") is None
+    assert index.lookup("https://example.com/b")["id"] == "p1"
+
+    index.remove_page("p1")
+    assert index.lookup("https://example.com/b") is None
+    assert len(index) == 1
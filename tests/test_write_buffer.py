@@ -0,0 +1,127 @@
+import asyncio
+
+import httpx
+
+from app.services.notion_write_buffer import WriteBehindBuffer
+
+
+class FakeTransport:
+    """按页面字典模拟 Notion 页面读写，PATCH 的属性名直接对应条目字段"""
+
+    def __init__(self, page, patch_statuses=()):
+        self.page = page
+        self.patch_statuses = list(patch_statuses)
+        self.patches = []
+
+    async def request(self, method, path, json=None):
+        if method == "GET":
+            return httpx.Response(200, json=self.page)
+        self.patches.append(json["properties"])
+        status = self.patch_statuses.pop(0) if self.patch_statuses else 200
+        if status != 200:
+            return httpx.Response(status, text="error")
+        for name, value in json["properties"].items():
+            self.page[name] = value["multi_select"] if name == "标签" else value
+        self.page["last_edited_time"] += "+"
+        return httpx.Response(200, json=self.page)
+
+
+class FakeManager:
+    def __init__(self, page, **kwargs):
+        self.transport = FakeTransport(page, **kwargs)
+        self.recorded = []
+
+    async def _fetch_entry_async(self, page_id):
+        return self._page_to_entry(self.transport.page)
+
+    def _page_to_entry(self, page):
+        entry = {key: value for key, value in page.items() if key != "标签"}
+        entry["tags"] = [tag["name"] for tag in page.get("标签", [])]
+        return entry
+
+    def _record_page(self, page):
+        self.recorded.append(page["id"])
+
+    def _forget_page(self, page_id):
+        pass
+
+
+def make_page():
+    return {"id": "p1", "last_edited_time": "t0", "status": "未处理", "remind": "否", "标签": [{"name": "AI"}]}
+
+
+def test_changes_are_coalesced_into_one_write():
+    manager = FakeManager(make_page())
+    buffer = WriteBehindBuffer(manager, delay=60)
+
+    async def scenario():
+        await buffer.enqueue_property("p1", "status", "status", "处理中", "处理中")
+        await buffer.enqueue_property("p1", "status", "status", "已处理", "已处理")
+        await buffer.enqueue_property("p1", "remind", "remind", "是", "是")
+        await buffer.enqueue_tag("p1", "工具")
+        overlaid = buffer.overlay(manager._page_to_entry(manager.transport.page))
+        await buffer.flush_all()
+        return overlaid
+
+    overlaid = asyncio.run(scenario())
+    assert overlaid["status"] == "已处理"
+    assert overlaid["tags"] == ["AI", "工具"]
+    assert manager.transport.patches == [{
+        "status": "已处理",
+        "remind": "是",
+        "标签": {"multi_select": [{"name": "AI"}, {"name": "工具"}]},
+    }]
+    assert buffer.stats() == {"pending": 0, "queued": 4, "writes": 1, "conflicts": 0, "failed": 0}
+    assert manager.recorded == ["p1"]
+
+
+def test_concurrent_remote_edits_are_kept():
+    manager = FakeManager(make_page())
+    buffer = WriteBehindBuffer(manager, delay=60)
+
+    async def scenario():
+        await buffer.enqueue_property("p1", "status", "status", "已处理", "已处理")
+        await buffer.enqueue_property("p1", "remind", "remind", "是", "是")
+        # 写入前其他客户端修改了状态
+        manager.transport.page.update(status="已归档", last_edited_time="t1")
+        await buffer.flush_all()
+
+    asyncio.run(scenario())
+    assert manager.transport.patches == [{"remind": "是"}]
+    assert manager.transport.page["status"] == "已归档"
+    assert buffer.conflicts == 1
+
+
+def test_unchanged_values_skip_the_write():
+    manager = FakeManager(make_page())
+    buffer = WriteBehindBuffer(manager, delay=60)
+
+    async def scenario():
+        await buffer.enqueue_property("p1", "status", "status", "未处理", "未处理")
+        await buffer.enqueue_tag("p1", "AI")
+        await buffer.flush_all()
+
+    asyncio.run(scenario())
+    assert manager.transport.patches == []
+    assert buffer.stats()["pending"] == 0
+
+
+def test_failed_writes_are_retried_then_dropped():
+    manager = FakeManager(make_page(), patch_statuses=[500, 200])
+    buffer = WriteBehindBuffer(manager, delay=60)
+
+    async def scenario():
+        await buffer.enqueue_property("p1", "status", "status", "已处理", "已处理")
+        await buffer.flush_all()
+
+    asyncio.run(scenario())
+    assert len(manager.transport.patches) == 2
+    assert manager.transport.page["status"] == "已处理"
+    assert (buffer.writes, buffer.failed) == (1, 0)
+
+    manager = FakeManager(make_page(), patch_statuses=[500, 500, 500])
+    buffer = WriteBehindBuffer(manager, delay=60)
+    asyncio.run(scenario())
+    assert len(manager.transport.patches) == 3
+    assert buffer.failed == 1
+    assert buffer.stats()["pending"] == 0